@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON parsing/rendering cost per endpoint for long conversation histories
+
+Compares the stdlib codec with orjson for:
+- request parsing of a /next_action_flex body
+- response rendering of the resulting ActionPlan
+- the full in-process round trip through /next_action_flex and /next_action
+
+Usage:
+    python benchmarks/bench_codec.py [--sizes 10,100,1000] [--requests 200]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MOCK_LLM", "true")
+
+import httpx
+
+from app.main import app
+from src.utils import codec
+
+
+def make_history(n):
+    return [
+        {
+            "role": "customer" if i % 2 == 0 else "agent",
+            "text": f"Message {i}: we're looking at the Balmoral cot bed in sage — could you share dimensions and lead times? £1,450 seems fine.",
+            "channel": "WhatsApp",
+            "ts": f"2024-01-{1 + i % 28:02d}T10:{i % 60:02d}:00Z",
+            "meta": {"thread_key": "ann@example.com-Website", "subject": "Balmoral enquiry"},
+        }
+        for i in range(n)
+    ]
+
+
+def flex_body(n):
+    return {"zoho_id": "Z1", "name": "Ann Lee", "email": "ann@example.com", "interests": ["cot bed"], "thread_key": "t-1", "history": make_history(n)}
+
+
+def nested_body(n):
+    return {
+        "lead": {"zoho_id": "Z1", "name": "Ann Lee", "email": "ann@example.com", "source": "Website", "interests": ["cot bed"]},
+        "state": {"intent": "general", "preferred_channel": "WhatsApp", "history": make_history(n)},
+        "metadata": {"thread_key": "t-1"},
+    }
+
+
+def time_it(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+async def time_endpoint(path, raw, repeat):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"content-type": "application/json"}
+        await client.post(path, content=raw, headers=headers)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            resp = await client.post(path, content=raw, headers=headers)
+            assert resp.status_code == 200, resp.text
+        return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    codecs = ["json"] + (["orjson"] if codec.orjson is not None else [])
+    # log_debug() prints on every plan; keep the report readable
+    real_stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    rows = []
+    try:
+        for n in [int(s) for s in args.sizes.split(",")]:
+            flex_raw = codec._std_dumps(flex_body(n))
+            nested_raw = codec._std_dumps(nested_body(n))
+            for name in codecs:
+                codec.set_codec(name)
+                parse_us = time_it(lambda: codec.decode(nested_raw), args.requests)
+                plan = codec.decode(nested_raw)  # stand-in payload of the same shape/size
+                render_us = time_it(lambda: codec.FastJSONResponse(plan), args.requests)
+                flex_us = asyncio.run(time_endpoint("/api/v1/next_action_flex", flex_raw, args.requests))
+                next_us = asyncio.run(time_endpoint("/api/v1/next_action", nested_raw, args.requests))
+                rows.append((n, len(nested_raw), name, parse_us, render_us, flex_us, next_us))
+    finally:
+        sys.stdout = real_stdout
+
+    print(f"{'history':>7} {'bytes':>9} {'codec':>7} {'parse µs':>9} {'render µs':>10} {'/next_action_flex µs':>21} {'/next_action µs':>16}")
+    for n, size, name, parse_us, render_us, flex_us, next_us in rows:
+        print(f"{n:>7} {size:>9,} {name:>7} {parse_us:>9.1f} {render_us:>10.1f} {flex_us:>21.1f} {next_us:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark wire size and CPU cost of gzip/brotli for planning payloads
+
+For each history size reports raw vs gzip vs br bytes for the /next_action
+request body, compression time, and the transfer time saved on a slow link
+(default 2 Mbit/s, roughly a congested n8n -> API hop).
+
+Usage:
+    python benchmarks/bench_compression.py [--sizes 10,100,1000] [--mbps 2]
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api import compression
+from src.utils import codec
+
+from bench_codec import nested_body
+
+
+def time_it(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000")
+    parser.add_argument("--mbps", type=float, default=2.0)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+    bytes_per_ms = args.mbps * 1e6 / 8 / 1000
+
+    rows = []
+    for n in [int(s) for s in args.sizes.split(",")]:
+        raw = codec._std_dumps(nested_body(n))
+        variants = [("raw", raw, 0.0)]
+        packed, us = time_it(lambda: gzip.compress(raw, 6), args.requests)
+        variants.append(("gzip", packed, us))
+        if compression.brotli is not None:
+            packed, us = time_it(lambda: compression.brotli.compress(raw, quality=4), args.requests)
+            variants.append(("br", packed, us))
+        for name, body, cpu_us in variants:
+            saved_ms = (len(raw) - len(body)) / bytes_per_ms - cpu_us / 1000
+            rows.append((n, name, len(body), cpu_us, saved_ms))
+
+    print(f"{'history':>7} {'codec':>5} {'bytes':>10} {'cpu µs':>9} {'saved ms @ %.0f Mbit/s' % args.mbps:>22}")
+    for n, name, size, cpu_us, saved_ms in rows:
+        print(f"{n:>7} {name:>5} {size:>10,} {cpu_us:>9.1f} {saved_ms:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark decision history pages as lead_decisions grows
+
+Fills a scratch decisions.db with N rows, then times the first page and a page
+deep into the result set (reached by cursor) for each listing, and compares
+with LIMIT/OFFSET at the same depth.
+
+Usage:
+    python benchmarks/bench_decision_queries.py [--rows 1000000] [--leads 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.decision_log import INSERT_DECISION, DecisionReader, connect
+
+
+def fill(path, rows, leads):
+    conn = connect(path)
+    rng = random.Random(7)
+    batch = []
+    for i in range(rows):
+        day, sec = divmod(i * 86400 * 180 // rows, 86400)
+        ts = f"2024-{1 + day // 30:02d}-{1 + day % 30 % 28:02d} {sec // 3600:02d}:{sec // 60 % 60:02d}:{sec % 60:02d}.000"
+        batch.append((f"Z{rng.randrange(leads)}", "Email", 5, rng.random() < 0.1, "", "{}", ts))
+        if len(batch) == 50_000:
+            with conn:
+                conn.executemany(INSERT_DECISION, batch)
+            batch = []
+    with conn:
+        conn.executemany(INSERT_DECISION, batch)
+    conn.close()
+
+
+def time_ms(fn, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--leads", type=int, default=20_000)
+    parser.add_argument("--depth", type=int, default=20, help="pages of 50 to skip for the deep page")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "decisions.db")
+        started = time.perf_counter()
+        fill(path, args.rows, args.leads)
+        print(f"filled {args.rows:,} rows in {time.perf_counter() - started:.1f}s")
+        reader = DecisionReader(path)
+        conn = reader._conn()
+
+        listings = {
+            "by lead": {"zoho_id": "Z42"},
+            "time window": {"since": "2024-03-01", "until": "2024-04-01"},
+            "handoffs": {"to_agent": True},
+        }
+        print(f"{'listing':<12} {'page':>6} {'first ms':>9} {'deep ms':>9} {'offset ms':>10}")
+        for name, filters in listings.items():
+            first = time_ms(lambda: reader.list(limit=50, **filters))
+            cursor, pages = None, 0
+            for pages in range(1, args.depth + 1):
+                _, next_cursor = reader.list(limit=50, cursor=cursor, **filters)
+                if next_cursor is None:
+                    break
+                cursor = next_cursor
+            deep = time_ms(lambda: reader.list(limit=50, cursor=cursor, **filters))
+            sql, params = reader._keyset_sql(filters.get("zoho_id"), filters.get("to_agent"), filters.get("since"), filters.get("until"), None)
+            offset_sql = sql.replace("LIMIT ?", "LIMIT ? OFFSET ?").replace("SELECT id", "SELECT *")
+            offset = time_ms(lambda: conn.execute(offset_sql, params + [50, 50 * pages]).fetchall())
+            print(f"{name:<12} {pages:>6} {first:>9.3f} {deep:>9.3f} {offset:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
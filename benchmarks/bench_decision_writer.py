@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark write-behind decision persistence against inline inserts
+
+Reports the request-path cost of DecisionWriter.submit() versus an inline
+INSERT + COMMIT per decision, and the writer thread's sustained rows/s.
+
+Usage:
+    python benchmarks/bench_decision_writer.py [--rows 20000] [--batch 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.decision_log import INSERT_DECISION, DecisionWriter, connect, utc_timestamp
+
+LEAD_DATA = {
+    "endpoint": "/next_action",
+    "lead": {"zoho_id": "Z1", "name": "Ann Lee", "email": "ann@example.com", "source": "Website"},
+    "plan": {"action": "send_message", "channel": "Email", "metadata": {"priority": 5, "ai_notes": "Follow up on cot bed"}},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inline_rows = min(args.rows, 2000)
+        conn = connect(os.path.join(tmp, "inline.db"))
+        started = time.perf_counter()
+        for i in range(inline_rows):
+            with conn:
+                conn.execute(INSERT_DECISION, (f"Z{i}", "Email", 5, False, "", str(LEAD_DATA), utc_timestamp()))
+        inline_us = (time.perf_counter() - started) / inline_rows * 1e6
+        conn.close()
+
+        writer = DecisionWriter(os.path.join(tmp, "behind.db"), max_queue=args.rows, batch_size=args.batch).start()
+        started = time.perf_counter()
+        for i in range(args.rows):
+            writer.submit(f"Z{i}", "Email", 5, False, "", LEAD_DATA)
+        submit_us = (time.perf_counter() - started) / args.rows * 1e6
+        writer.close()
+        total = time.perf_counter() - started
+
+    print(f"inline INSERT+COMMIT per request : {inline_us:8.1f} µs")
+    print(f"write-behind submit per request  : {submit_us:8.1f} µs")
+    print(f"writer throughput                : {writer.written / total:8,.0f} rows/s ({writer.batches} batches, {writer.dropped} dropped)")
+
+
+if __name__ == "__main__":
+    main()
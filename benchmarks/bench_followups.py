@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the follow-up scheduler with a large number of pending timers
+
+Schedules --timers follow-ups (default one million) spread over --days,
+persists them, reschedules/cancels a slice, reloads the heap from SQLite as
+on a restart, then fires a due batch through a no-op sink. Prints per-op
+costs, flush/reload times and the process RSS.
+
+Usage:
+    python benchmarks/bench_followups.py [--timers 1000000] [--due 20000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.followups import FollowupScheduler
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def planned(lead, state, metadata):
+    return {"action": "send_message", "metadata": {"ai_notes": "bench"}}
+
+
+async def run(path, timers, days, due, batch):
+    rng = random.Random(7)
+    fired = []
+
+    async def sink(items):
+        fired.extend(items)
+
+    # a huge flush interval: the benchmark flushes explicitly to time it
+    scheduler = await FollowupScheduler(path, precompute_seconds=0, flush_interval=3600, batch_size=batch,
+                                        planner=planned, sink=sink).start()
+    now = time.time()
+    lead = {"zoho_id": "", "first_name": "Ann", "source": "Website", "preferred_channel": "Email"}
+
+    started = time.perf_counter()
+    for i in range(timers):
+        scheduler.schedule(f"Z{i}", now + 60 + rng.random() * days * 86400, {**lead, "zoho_id": f"Z{i}"})
+    elapsed = time.perf_counter() - started
+    print(f"schedule      {timers:>9,} timers  {elapsed * 1e6 / timers:>7.2f} us/op")
+
+    started = time.perf_counter()
+    await scheduler._flush()
+    print(f"persist       {timers:>9,} rows    {time.perf_counter() - started:>7.2f} s")
+
+    ops = timers // 10
+    started = time.perf_counter()
+    for _ in range(ops):
+        i = rng.randrange(timers)
+        if rng.random() < 0.5:
+            scheduler.cancel(f"Z{i}")
+        else:
+            scheduler.schedule(f"Z{i}", now + 60 + rng.random() * days * 86400)
+    elapsed = time.perf_counter() - started
+    print(f"resched/cancel {ops:>8,} ops     {elapsed * 1e6 / ops:>7.2f} us/op")
+    await scheduler._flush()
+    print(f"pending {len(scheduler):,}, heap entries {len(scheduler._fire_heap):,}, RSS {rss_mb():,.0f} MB")
+    await scheduler.close()
+
+    started = time.perf_counter()
+    scheduler = await FollowupScheduler(path, precompute_seconds=0, flush_interval=3600, batch_size=batch,
+                                        planner=planned, sink=sink).start()
+    print(f"reload        {len(scheduler):>9,} timers  {time.perf_counter() - started:>7.2f} s")
+
+    # make `due` of them due now and let the scheduler loop fire them
+    for i in range(due):
+        scheduler.schedule(f"Z{i}", now - 1)
+    await scheduler._flush()
+    started = time.perf_counter()
+    scheduler._wake.set()
+    while len(fired) < due:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    print(f"fire          {due:>9,} due     {due / elapsed:>7,.0f}/s (batches of {batch})")
+    await scheduler.close()
+    print(f"peak RSS {rss_mb():,.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--timers", type=int, default=1_000_000)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--due", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(os.path.join(tmp, "followups.db"), args.timers, args.days, args.due, args.batch))
+
+
+if __name__ == "__main__":
+    main()
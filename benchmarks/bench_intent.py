@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark the inbound intent classifier: coverage, accuracy and latency
+
+Coverage is the share of a realistic inbound sample that /respond can answer
+without calling plan_next_action/OpenAI.
+
+Usage:
+    python benchmarks/bench_intent.py [--iterations 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.intent import classify
+
+# (message, expected last_outcome or None when it should reach the LLM)
+SAMPLE = [
+    ("STOP", "opt_out"),
+    ("Stop", "opt_out"),
+    ("unsubscribe", "opt_out"),
+    ("Please remove me from your list", "opt_out"),
+    ("Not interested thank you", "opt_out"),
+    ("No thanks, we already bought one", "opt_out"),
+    ("Please don't message me again", "opt_out"),
+    ("call me tomorrow", "wants_call"),
+    ("Can you call me after 6pm?", "wants_call"),
+    ("Could someone ring me about the wardrobe", "wants_call"),
+    ("I'd prefer a call to be honest", "wants_call"),
+    ("Give me a ring on this number", "wants_call"),
+    ("busy at the moment", "busy"),
+    ("I'm driving, will get back to you", "busy"),
+    ("Not a good time sorry", "busy"),
+    ("Swamped this week, talk later", "busy"),
+    ("how much is the Balmoral cot", "asked_price"),
+    ("How much for the cot bed in grey?", "asked_price"),
+    ("What's the price of the Windsor wardrobe", "asked_price"),
+    ("Could you send me a quote for the nursery set", "asked_price"),
+    ("Do the prices include delivery?", "asked_price"),
+    ("Is the Savoy dresser available in sage?", None),
+    ("We're expecting in March, what do you recommend?", None),
+    ("Thanks, that's lovely", None),
+    ("Can I visit the Chelsea showroom on Saturday?", None),
+    ("What are the dimensions of the cot?", None),
+    ("Do you do custom fabrics?", None),
+    ("maybe tomorrow", None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    confident = correct = labelled = 0
+    for text, expected in SAMPLE:
+        match = classify(text)
+        hit = match.outcome if match.confident else None
+        confident += hit is not None
+        if expected is not None:
+            labelled += 1
+            correct += hit == expected
+        elif hit is not None:
+            print(f"⚠️  false positive: {text!r} -> {hit}")
+
+    texts = [t for t, _ in SAMPLE]
+    timings = []
+    for i in range(args.iterations):
+        text = texts[i % len(texts)]
+        t0 = time.perf_counter()
+        classify(text)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+
+    def pct(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+    print(f"🎯 coverage: {confident}/{len(SAMPLE)} messages answered without the LLM ({confident / len(SAMPLE):.0%})")
+    print(f"✅ accuracy on labelled replies: {correct}/{labelled}")
+    print(f"⏱️  classify latency: p50 {pct(0.50):.1f}µs  p99 {pct(0.99):.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
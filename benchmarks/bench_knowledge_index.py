@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark the BM25 knowledge index on a synthetic 50k-document pack
+
+Usage:
+    python benchmarks/bench_knowledge_index.py [--docs 50000] [--queries 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.knowledge_index import KnowledgeIndex
+
+COLLECTIONS = ["Balmoral", "Windsor", "Kensington", "Savoy", "Chelsea", "Mayfair", "Belgravia", "Richmond"]
+PRODUCTS = ["cot bed", "cot", "wardrobe", "dresser", "changing unit", "nursing chair", "rocking chair", "moses basket", "bookcase", "toy box"]
+FINISHES = ["white", "grey", "oak", "walnut", "beech", "sage", "blush", "natural"]
+FILLER = ("solid hardwood frame hand finished in our workshop with non toxic paint adjustable base "
+          "converts to junior bed soft close drawers custom fabrics available delivery and assembly included").split()
+
+QUERIES = [
+    "how much is the balmoral cot",
+    "what are the dimensions of the windsor wardrobe",
+    "lead time for a grey crib",
+    "do you deliver the savoy dresser",
+    "price of oak nursing chair",
+    "kensington changing unit size",
+]
+
+
+def make_documents(n, seed=7):
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        collection, product, finish = rng.choice(COLLECTIONS), rng.choice(PRODUCTS), rng.choice(FINISHES)
+        docs.append({
+            "id": f"doc-{i}",
+            "title": f"{collection} {product.title()} in {finish}",
+            "text": " ".join(rng.choices(FILLER, k=40)),
+            "price": f"£{rng.randint(300, 4000):,}",
+            "dimensions": f"{rng.randint(60, 200)} x {rng.randint(40, 120)} cm",
+            "lead_time": f"{rng.randint(2, 12)} weeks",
+        })
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    docs = make_documents(args.docs)
+
+    started = time.perf_counter()
+    index = KnowledgeIndex(docs)
+    build_s = time.perf_counter() - started
+    del docs
+
+    timings = []
+    for i in range(args.queries):
+        query = QUERIES[i % len(QUERIES)]
+        t0 = time.perf_counter()
+        index.search(query, k=args.k)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+
+    def pct(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+    print(f"📚 documents: {index.n_docs:,}  terms: {len(index.term_ids):,}")
+    print(f"🏗️  build: {build_s:.2f}s  postings + term dictionary: {index.memory_bytes() / 1e6:.1f} MB")
+    print(f"🔎 query latency over {args.queries:,} queries: p50 {pct(0.50):.0f}µs  p95 {pct(0.95):.0f}µs  p99 {pct(0.99):.0f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-request cost of metrics instrumentation
+
+"primitives" times the individual hot-path operations. "request" drives a
+trivial ASGI app directly, with and without MetricsMiddleware, and adds the
+stage timers a planning request goes through (parse, conversation, mock_plan,
+record, serialize), to give the total overhead per request.
+
+Usage:
+    python benchmarks/bench_metrics.py [--iterations 200000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api.metrics import MetricsMiddleware, observe_parse
+from src.services.metrics import CACHE_REQUESTS, HTTP_REQUESTS, REGISTRY, stage
+
+PLANNING_STAGES = ("conversation", "mock_plan", "record", "serialize")
+
+
+def per_op_us(fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def primitives(iterations):
+    hist = HTTP_REQUESTS.labels("/bench", "POST", "200")
+
+    def timed_stage():
+        with stage("bench"):
+            pass
+
+    return {
+        "counter inc (labels + inc)": per_op_us(lambda: CACHE_REQUESTS.labels("bench", "hit").inc(), iterations),
+        "histogram observe (child)": per_op_us(lambda: hist.observe(0.0123), iterations),
+        "histogram observe (labels)": per_op_us(lambda: HTTP_REQUESTS.labels("/bench", "POST", "200").observe(0.0123), iterations),
+        "stage timer": per_op_us(timed_stage, iterations),
+    }
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def instrumented_endpoint(scope, receive, send):
+    observe_parse()
+    for name in PLANNING_STAGES:
+        with stage(name):
+            pass
+    await endpoint(scope, receive, send)
+
+
+async def drive(app, iterations):
+    scope = {"type": "http", "method": "POST", "path": "/api/v1/next_action", "app": None}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"{'primitive':<30} {'µs/op':>8}")
+    for name, us in primitives(args.iterations).items():
+        print(f"{name:<30} {us:>8.3f}")
+
+    loop = asyncio.new_event_loop()
+    bare = loop.run_until_complete(drive(endpoint, args.iterations))
+    wrapped = loop.run_until_complete(drive(MetricsMiddleware(instrumented_endpoint, enabled=True), args.iterations))
+    loop.close()
+    print()
+    print(f"{'request':<30} {'µs/req':>8}")
+    print(f"{'bare ASGI app':<30} {bare:>8.3f}")
+    print(f"{'middleware + 5 stages':<30} {wrapped:>8.3f}")
+    print(f"{'overhead':<30} {wrapped - bare:>8.3f}")
+
+    REGISTRY.render()  # first scrape imports the collectors' modules
+    started = time.perf_counter()
+    body = REGISTRY.render()
+    print(f"\nscrape: {len(body)} bytes in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-request CPU saved by the trusted ActionPlan fast path
+
+"validated" is the previous path: ActionPlan(**plan), then FastAPI revalidates
+it against response_model and renders it with JSONResponse.
+"trusted" is the current path: ActionPlan.trusted(plan).model_dump_json().
+
+Usage:
+    python benchmarks/bench_plan_fastpath.py [--iterations 5000]
+"""
+
+import argparse
+import asyncio
+import copy
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app.main import app
+from src.api.agent import ActionMessage, ActionPlan
+from src.services.llm_service import _mock_action_plan
+
+
+def planner_output(history_len):
+    history = [{"role": "customer", "text": f"Message {i} about the Balmoral cot bed", "channel": "WhatsApp"} for i in range(history_len)]
+    lead = {"zoho_id": "Z1", "name": "Ann Lee", "email": "ann@example.com", "source": "Website", "interests": ["cot bed"]}
+    real_stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        return _mock_action_plan(lead, {"preferred_channel": "Email", "history": history}, {"thread_key": "t-1"})
+    finally:
+        sys.stdout = real_stdout
+
+
+def response_field(path):
+    return next(r for r in app.routes if getattr(r, "path", "") == path).response_field
+
+
+async def validated(plan, field):
+    plan = dict(plan)
+    plan["message"] = ActionMessage(**plan["message"])
+    content = await serialize_response(field=field, response_content=ActionPlan(**plan), is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def trusted(plan, field):
+    return ActionPlan.trusted(plan).model_dump_json()
+
+
+def cpu_us(fn, plan, field, iterations):
+    loop = asyncio.new_event_loop()
+    plans = [copy.deepcopy(plan) for _ in range(iterations)]
+    started = time.process_time()
+    for p in plans:
+        loop.run_until_complete(fn(p, field))
+    elapsed = time.process_time() - started
+    loop.close()
+    return elapsed / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5_000)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<20} {'validated µs':>13} {'trusted µs':>11} {'saved µs':>9}")
+    for path in ("/api/v1/next_action", "/api/v1/next_action_flex"):
+        field = response_field(path)
+        plan = planner_output(5)
+        slow = cpu_us(validated, plan, field, args.iterations)
+        fast = cpu_us(trusted, plan, field, args.iterations)
+        print(f"{path.rsplit('/', 1)[-1]:<20} {slow:>13.1f} {fast:>11.1f} {slow - fast:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
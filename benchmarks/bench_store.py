@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark the memory and Redis conversation/idempotency stores
+
+Measures per-operation latency and throughput at a given concurrency for:
+- merge of one new turn into a conversation that already holds N turns
+- merge of a resent full history (de-duplication path)
+- idempotency put + get
+
+Redis numbers come from --redis-url when given, otherwise from the in-process
+RESP stand-in in tests/resp_server.py (pure Python: it shows round trips and
+pipelining, not real Redis server cost).
+
+Usage:
+    python benchmarks/bench_store.py [--sizes 10,100] [--ops 2000] [--concurrency 16] [--redis-url redis://...]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path for imports
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "tests"))
+
+import redis.asyncio as aioredis
+
+from resp_server import RespServer
+from src.services.conversation_store import MemoryConversationStore
+from src.services.idempotency import MemoryIdempotencyStore, StoredResponse
+from src.services.redis_backend import RedisConversationStore, RedisIdempotencyStore
+
+
+def turn(i):
+    return {"role": "customer" if i % 2 == 0 else "agent", "text": f"Message {i} about the Balmoral cot bed in sage", "channel": "WhatsApp", "ts": str(i)}
+
+
+async def run(op, ops, concurrency):
+    latencies = []
+    counter = iter(range(ops))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            await op(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return ops / elapsed, statistics.median(latencies) * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6
+
+
+async def bench_backend(name, conv_store, idem_store, sizes, ops, concurrency):
+    rows = []
+    threads = 64
+    for n in sizes:
+        history = [turn(i) for i in range(n)]
+        for t in range(threads):
+            await conv_store.merge(f"bench-{n}-{t}", {"history": history})
+        rows.append((name, f"merge new turn (history {n})", *await run(
+            lambda i: conv_store.merge(f"bench-{n}-{i % threads}", {"intent": "general"}, [turn(n + i)]), ops, concurrency)))
+        rows.append((name, f"merge resent history ({n})", *await run(
+            lambda i: conv_store.merge(f"bench-{n}-{i % threads}", {"history": history[-20:]}), ops, concurrency)))
+    record = StoredResponse(200, [(b"content-type", b"application/json")], b'{"plan_id":"x"}' * 40, "f")
+
+    async def idem(i):
+        await idem_store.put(f"k{i}", record)
+        await idem_store.get(f"k{i}")
+
+    rows.append((name, "idempotency put+get", *await run(idem, ops, concurrency)))
+    return rows
+
+
+async def main_async(args):
+    sizes = [int(s) for s in args.sizes.split(",")]
+    rows = await bench_backend("memory", MemoryConversationStore(max_turns=max(sizes) + args.ops), MemoryIdempotencyStore(), sizes, args.ops, args.concurrency)
+
+    server = None
+    url = args.redis_url
+    if not url:
+        server = await RespServer().start()
+        url = server.url
+    client = aioredis.Redis(connection_pool=aioredis.ConnectionPool.from_url(url, max_connections=args.concurrency))
+    try:
+        rows += await bench_backend(
+            "redis" if args.redis_url else "redis*",
+            RedisConversationStore(client, max_turns=max(sizes) + args.ops, prefix="bench:"),
+            RedisIdempotencyStore(client, prefix="bench:"),
+            sizes, args.ops, args.concurrency,
+        )
+    finally:
+        await client.aclose()
+        if server is not None:
+            await server.stop()
+
+    print(f"{'backend':>8} {'operation':<30} {'ops/s':>9} {'p50 µs':>9} {'p99 µs':>9}")
+    for name, op, throughput, p50, p99 in rows:
+        print(f"{name:>8} {op:<30} {throughput:>9,.0f} {p50:>9.1f} {p99:>9.1f}")
+    if server is not None:
+        print("* in-process RESP stand-in; pass --redis-url for a real server")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,100")
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--redis-url", default=os.getenv("BENCH_REDIS_URL"))
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Payload corpus for the benchmark suite
+
+Leads and conversations shaped like the ones n8n sends from Zoho: web
+enquiries with and without interests, in-person leads (Harrods, in store,
+showrooms), WhatsApp/Phone/Email preferences and conversation histories of
+HISTORY_SIZES turns. Everything is generated from a fixed seed so runs are
+comparable with the stored baselines.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+HISTORY_SIZES = (0, 5, 25, 100)
+
+LEADS: List[Dict[str, Any]] = [
+    {"zoho_id": "B1001", "name": "Ann Lee", "email": "ann.lee@example.com", "phone": "+447700900101",
+     "source": "Website", "interests": ["cot bed"], "city": "London", "country": "UK"},
+    {"zoho_id": "B1002", "name": "Priya Shah", "email": "priya@example.co.uk", "source": "Instagram",
+     "interests": ["nursery interior design"], "country": "UK"},
+    {"zoho_id": "B1003", "name": "Omar Haddad", "phone": "+971501234567", "source": "WhatsApp",
+     "city": "Dubai", "country": "UAE"},
+    {"zoho_id": "B1004", "name": "Chloe Martin", "email": "chloe.martin@example.fr", "source": "Website",
+     "notes": "Looking for a wardrobe and changing table for a March due date", "country": "France"},
+    {"zoho_id": "B1005", "name": "Sofia Rossi", "email": "sofia@example.it", "phone": "+393331234567",
+     "source": "Harrods", "interests": ["Balmoral cot bed"], "country": "Italy"},
+    {"zoho_id": "B1006", "name": "James O'Neill", "email": "james@example.ie", "source": "In-Store",
+     "city": "London", "country": "UK"},
+    {"zoho_id": "B1007", "name": "Mei Chen", "email": "mei.chen@example.com", "phone": "+85291234567",
+     "source": "Chelsea Showroom", "interests": ["rocking chair", "cot bed"], "country": "Hong Kong"},
+    {"zoho_id": "B1008", "name": "", "email": "hello@example.com", "source": "Email", "country": "UK"},
+]
+
+IN_PERSON_LEADS = [lead for lead in LEADS if lead["source"] in ("Harrods", "In-Store", "Chelsea Showroom")]
+
+WEBHOOK_EPOCH = datetime(2026, 9, 30, 10, 0, tzinfo=timezone(timedelta(hours=1)))
+
+CHANNELS = ("Email", "WhatsApp", "Phone")
+
+TOPICS = ("cot bed", "nursery interior design", "Balmoral cot bed", "wardrobe", "your enquiry", "")
+
+CUSTOMER_TURNS = (
+    "Hi, do you have the Balmoral cot bed in white?",
+    "How much is the cot bed with the mattress?",
+    "We're due in March, what are the lead times at the moment?",
+    "Could you send a few nursery design ideas?",
+    "Thanks! Can I see it in the Chelsea showroom?",
+    "Is the wardrobe available with a hanging rail?",
+    "Sorry for the slow reply, we've been busy with the move",
+    "Do you deliver to Dubai?",
+)
+
+AGENT_TURNS = (
+    "Hi! Yes, the Balmoral comes in white and stone. Would you like the dimensions?",
+    "Happy to help. I'll send over a shortlist with pricing this afternoon.",
+    "Lead times are around 8-10 weeks for made-to-order pieces.",
+    "Here's a moodboard to get you started, let me know what you think.",
+)
+
+INBOUND = (
+    "How much is the cot bed?",
+    "Please stop messaging me",
+    "Can you call me tomorrow morning?",
+    "We're busy this week, maybe next week",
+    "Do you have the Balmoral in white? And what are the dimensions?",
+    "Thanks, we loved the moodboard, could you send the rocking chair options too?",
+)
+
+
+def history(size: int, seed: int = 0, channel: str = "WhatsApp") -> List[Dict[str, Any]]:
+    """`size` alternating customer/agent turns, oldest first, ending on a customer turn."""
+    rng = random.Random(f"{seed}-{size}")
+    turns = []
+    for i in range(size):
+        role = "customer" if (size - i) % 2 == 1 else "agent"
+        text = rng.choice(CUSTOMER_TURNS if role == "customer" else AGENT_TURNS)
+        turns.append({"role": role, "text": text, "channel": channel, "ts": f"2026-09-{1 + i // 8:02d}T{9 + i % 8:02d}:15:00Z"})
+    return turns
+
+
+def planner_inputs(size: int) -> List[tuple]:
+    """(lead, state, metadata) triples for the planner functions, one per lead."""
+    inputs = []
+    for i, lead in enumerate(LEADS):
+        channel = CHANNELS[i % len(CHANNELS)]
+        state = {"intent": "general", "history": history(size, i, channel)}
+        if i % 2:
+            state["preferred_channel"] = channel
+        if i % 3 == 0:
+            state["last_outcome"] = "no_reply"
+        inputs.append((dict(lead), state, {"source": lead["source"]}))
+    return inputs
+
+
+def message_inputs() -> List[tuple]:
+    """(what, first_name, channel) triples for _generate_deterministic_message."""
+    return [(topic, first, channel) for topic in TOPICS for first in ("Ann", "there") for channel in CHANNELS]
+
+
+def in_person_inputs() -> List[tuple]:
+    """(lead, state, channel) triples for get_in_person_followup."""
+    inputs = []
+    for lead in IN_PERSON_LEADS:
+        for channel in CHANNELS:
+            inputs.append((dict(lead), {"preferred_channel": channel}, None))
+        inputs.append((dict(lead), {"channel": "wa"}, "WhatsApp"))
+    return inputs
+
+
+def next_action_bodies(size: int) -> List[Dict[str, Any]]:
+    return [{"lead": lead, "state": state, "metadata": metadata} for lead, state, metadata in planner_inputs(size)]
+
+
+def flex_bodies(size: int) -> List[Dict[str, Any]]:
+    """Flat n8n-style bodies (no "lead" wrapper), as /next_action_flex receives them."""
+    bodies = []
+    for lead, state, _ in planner_inputs(size):
+        body = {k: v for k, v in lead.items() if k != "source"}
+        body.update(intent=state["intent"], history=state["history"], subject="Website enquiry")
+        bodies.append(body)
+    return bodies
+
+
+def respond_bodies(size: int) -> List[Dict[str, Any]]:
+    bodies = []
+    for i, (lead, state, _) in enumerate(planner_inputs(size)):
+        bodies.append({
+            "zoho_id": lead["zoho_id"],
+            "incoming_text": INBOUND[i % len(INBOUND)],
+            "channel": CHANNELS[i % len(CHANNELS)],
+            "timestamp": "2026-09-30T10:00:00Z",
+            "state": {"history": state["history"]},
+        })
+    return bodies
+
+
+def lead_bodies() -> List[Dict[str, Any]]:
+    """Bodies for /lead and /process_lead (every corpus lead has the email or phone /lead requires)."""
+    return [dict(lead, first_name=(lead["name"] or "there").split()[0]) for lead in LEADS]
+
+
+def webhook_record(i: int) -> Dict[str, Any]:
+    """A Zoho workflow webhook record; `i` makes every delivery distinct so none is deduplicated."""
+    lead = LEADS[i % len(LEADS)]
+    return {
+        "id": lead["zoho_id"],
+        "Full_Name": lead["name"],
+        "Email": lead.get("email"),
+        "Mobile": lead.get("phone"),
+        "Lead_Source": lead["source"],
+        "Country": lead.get("country"),
+        "Modified_Time": (WEBHOOK_EPOCH + timedelta(seconds=i)).isoformat(),
+    }
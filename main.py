@@ -1,10 +1,43 @@
 from fastapi import FastAPI
+from src.api.admission import AdmissionMiddleware
 from src.api.agent import router as agent_router
+from src.api.compression import CompressionMiddleware
+from src.api.decisions import router as decisions_router
+from src.api.followups import router as followups_router
+from src.api.idempotency import IdempotencyMiddleware
+from src.api.metrics import MetricsMiddleware
+from src.api.metrics import router as metrics_router
+from src.api.profiling import ProfilingMiddleware
+from src.api.profiling import router as profiling_router
+from src.api.tracing import TracingMiddleware
+from src.utils.codec import FastJSONResponse
 
-app = FastAPI(title="Lead Follow-up AI Agent", version="1.0.0")
+app = FastAPI(title="Lead Follow-up AI Agent", version="1.0.0", default_response_class=FastJSONResponse)
+
+# Replay retried planning requests (Idempotency-Key / thread_key + body hash)
+app.add_middleware(IdempotencyMiddleware)
+
+# Inflate gzip request bodies, negotiate br/gzip responses
+app.add_middleware(CompressionMiddleware)
+
+# Shed planning requests with 503 + Retry-After before any work is done on them
+app.add_middleware(AdmissionMiddleware)
+
+# Sample the event loop's stack for requests carrying the profiling secret
+app.add_middleware(ProfilingMiddleware)
+
+# Root span for sampled requests (traceparent in, traceparent / x-trace-id out)
+app.add_middleware(TracingMiddleware)
+
+# Outermost: time every request, shed ones included
+app.add_middleware(MetricsMiddleware)
 
 # Mount routes
 app.include_router(agent_router)
+app.include_router(decisions_router)
+app.include_router(followups_router)
+app.include_router(metrics_router)
+app.include_router(profiling_router)
 
 # Optional root
 @app.get("/")
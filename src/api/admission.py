@@ -0,0 +1,59 @@
+"""
+Admission middleware for the planning endpoints
+
+Outermost middleware apart from metrics: a shed request is answered with 503 and Retry-After
+before its body is read, inflated, validated or de-duplicated. /health, the
+decision history and every other cheap endpoint pass straight through.
+"""
+
+import logging
+
+from src.services.admission import Rejected, get_admission_controller
+from src.utils.codec import encode
+
+logger = logging.getLogger(__name__)
+
+ADMITTED_PATHS = frozenset({
+    "/api/v1/next_action",
+    "/api/v1/next_action_flex",
+    "/api/v1/respond",
+    "/api/v1/lead",
+    "/api/v1/process_lead",
+})
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware: holds an admission slot for the lifetime of a planning request."""
+
+    def __init__(self, app, controller=None, paths=ADMITTED_PATHS):
+        self.app = app
+        self.controller = controller if controller is not None else get_admission_controller()
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        try:
+            admitted_at = await self.controller.acquire()
+        except Rejected as e:
+            await self._send_unavailable(send, e)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(admitted_at)
+
+    @staticmethod
+    async def _send_unavailable(send, rejected: Rejected) -> None:
+        body = encode({"detail": "Server is at capacity, retry later.", "reason": rejected.reason})
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(rejected.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
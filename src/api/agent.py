@@ -4,19 +4,178 @@ Sales Rep Agent API for Lead Follow-up AI Agent
 Handles lead analysis and next action planning for sales representatives.
 """
 
-import json
+import asyncio
+import hashlib
+import hmac
 import logging
+import os
 from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl
 from uuid import uuid4
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel, EmailStr, Field, field_validator
 
-from src.services.llm_service import analyze_lead, plan_next_action
+from src.api.metrics import observe_parse
+from src.services.admission import get_admission_controller
+from src.services.conversation_store import get_conversation_store, history_summary
+from src.services.decision_log import get_decision_writer, record_decision, record_plan
+from src.services.database import close_database, database_enabled, get_database
+from src.services.decision_retention import get_retention_manager, retention_enabled
+from src.services.followups import followups_enabled, get_followup_scheduler, record_followup
+from src.services.ingest import STATE_KEYS, WebhookIngestor, build_ingestor, ingest_enabled, lead_from_webhook
+from src.services.intent import classify_inbound
+from src.services.llm_service import _intent_action_plan, analyze_lead, plan_next_action
+from src.services.metrics import stage
+from src.services.packs import get_pack_loader
+from src.services.readiness import get_readiness_probe
+from src.services.redis_backend import close_redis
+from src.services.tracing import SPAN_KIND_INTERNAL, annotate, get_tracer
+from src.services.webhooks import emit, get_webhook_dispatcher
+from src.services.zoho_writeback import get_zoho_writeback, record_writeback, writeback_enabled
+from src.utils.codec import FastJSONResponse, decode
 
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/api/v1", tags=["lead"])
+router = APIRouter(prefix="/api/v1", tags=["lead"], default_response_class=FastJSONResponse)
+
+
+@router.on_event("startup")
+async def _warm_packs():
+    # Reads the shared disk copy only; network refreshes run in the background
+    get_pack_loader().warm()
+
+
+@router.on_event("shutdown")
+async def _close_packs():
+    get_pack_loader().close()
+
+
+@router.on_event("shutdown")
+async def _close_redis():
+    await close_redis()
+
+
+@router.on_event("startup")
+async def _start_loop_monitor():
+    get_admission_controller().monitor.start()
+
+
+@router.on_event("shutdown")
+async def _stop_loop_monitor():
+    await get_admission_controller().monitor.stop()
+
+
+@router.on_event("startup")
+async def _connect_database():
+    if database_enabled():
+        await get_database().connect()
+
+
+@router.on_event("shutdown")
+async def _close_database():
+    await close_database()
+
+
+@router.on_event("startup")
+async def _start_decision_writer():
+    get_decision_writer().start()
+
+
+@router.on_event("shutdown")
+async def _flush_decisions():
+    # Drains whatever is still queued; runs off the event loop
+    await asyncio.to_thread(get_decision_writer().close)
+
+
+@router.on_event("startup")
+async def _start_retention():
+    if retention_enabled():
+        get_retention_manager().start()
+
+
+@router.on_event("shutdown")
+async def _stop_retention():
+    await asyncio.to_thread(get_retention_manager().stop)
+
+
+@router.on_event("startup")
+async def _start_followups():
+    if followups_enabled():
+        await get_followup_scheduler().start()
+
+
+@router.on_event("shutdown")
+async def _stop_followups():
+    await get_followup_scheduler().close()
+
+
+@router.on_event("startup")
+async def _start_webhooks():
+    dispatcher = get_webhook_dispatcher()
+    if dispatcher.enabled:
+        dispatcher.start()
+
+
+@router.on_event("shutdown")
+async def _stop_webhooks():
+    # after the follow-up scheduler, which posts through the shared client
+    await get_webhook_dispatcher().close()
+
+
+@router.on_event("startup")
+async def _start_zoho_writeback():
+    if writeback_enabled():
+        get_zoho_writeback().start()
+
+
+@router.on_event("shutdown")
+async def _flush_zoho_writeback():
+    await get_zoho_writeback().close()
+
+
+_ingestor: Optional[WebhookIngestor] = None
+
+
+@router.on_event("startup")
+async def _start_ingestor():
+    global _ingestor
+    if ingest_enabled() and _ingestor is None:
+        _ingestor = build_ingestor(_plan_from_webhook).start()
+
+
+@router.on_event("shutdown")
+async def _stop_ingestor():
+    global _ingestor
+    if _ingestor is not None:
+        await _ingestor.close()
+        _ingestor = None
+
+
+@router.on_event("startup")
+async def _start_trace_exporter():
+    exporter = get_tracer().exporter
+    if exporter is not None:
+        exporter.start()
+
+
+@router.on_event("shutdown")
+async def _flush_trace_exporter():
+    exporter = get_tracer().exporter
+    if exporter is not None:
+        await exporter.close()
+
+
+@router.on_event("startup")
+async def _start_readiness():
+    probe = get_readiness_probe()
+    probe.register_queue("ingest", lambda: _ingestor.stats() if _ingestor is not None else None)
+    probe.start()
+
+
+@router.on_event("shutdown")
+async def _stop_readiness():
+    await get_readiness_probe().stop()
 
 
 # ---- Legacy models for backwards compatibility ----
@@ -130,10 +289,77 @@ class ActionPlan(BaseModel):
     log: Optional[str] = None
     store: Dict[str, Any] = {}  # write-backs to CRM e.g. {decision_channel, decision_priority, ai_notes}
 
+    @classmethod
+    def trusted(cls, plan: Dict[str, Any]) -> "ActionPlan":
+        """
+        Build from a plan dict produced by our own planner, skipping validation.
+
+        Only for internal plans: request bodies and anything else untrusted still
+        go through the normal validating constructors.
+        """
+        message = plan.get("message")
+        if isinstance(message, dict):
+            message = ActionMessage.model_construct(
+                subject=message.get("subject"),
+                body=message.get("body"),
+                whatsapp_text=message.get("whatsapp_text"),
+            )
+        elif message is not None and not isinstance(message, ActionMessage):
+            message = ActionMessage.model_construct(subject=None, body=str(message), whatsapp_text=None)
+        return cls.model_construct(
+            plan_id=str(plan.get("plan_id") or uuid4()),
+            action=plan.get("action") or "wait",
+            channel=plan.get("channel"),
+            message=message,
+            metadata=plan.get("metadata") or {},
+            log=plan.get("log"),
+            store=plan.get("store") or {},
+        )
+
+
+async def _merge_conversation(thread_key: Optional[str], sent_state: Dict[str, Any], new_turns=()):
+    """
+    Merge what the client sent into the stored conversation for thread_key.
+
+    Returns (state for the planner, (history_seen, history_last)). Without a
+    thread_key the request is planned statelessly from what was sent.
+    """
+    defaults = LeadState().model_dump()
+    with stage("conversation"):
+        if not thread_key:
+            history = list(sent_state.get("history") or []) + list(new_turns)
+            return {**defaults, **sent_state, "history": history}, history_summary(history)
+        conv = await get_conversation_store().merge(thread_key, sent_state, new_turns)
+        return {**defaults, **sent_state, **conv.as_state()}, conv.summary()
+
+
+def _stamp_history(plan: Dict[str, Any], summary) -> None:
+    plan_metadata = plan.setdefault("metadata", {})
+    plan_metadata["history_seen"], plan_metadata["history_last"] = summary
+
+
+def _record_plan(endpoint: str, lead: Dict[str, Any], state: Dict[str, Any], metadata: Optional[Dict[str, Any]], plan: Dict[str, Any]) -> None:
+    """Log the decision, (re)schedule the lead's follow-up, queue the CRM write-back and push handoffs to n8n."""
+    plan_metadata = plan.get("metadata") or {}
+    annotate(thread_key=plan_metadata.get("thread_key"), zoho_id=lead.get("zoho_id"), action=plan.get("action"), endpoint=endpoint)
+    with stage("record"):
+        record_plan(endpoint, lead, plan)
+        record_followup(lead, state, metadata, plan)
+        record_writeback(lead, plan)
+    if plan.get("action") == "handoff" or plan_metadata.get("to_agent") is True:
+        emit("handoff", {"endpoint": endpoint, "zoho_id": lead.get("zoho_id"), "thread_key": plan_metadata.get("thread_key"), "plan": plan})
+
+
+def _plan_response(plan: Dict[str, Any]) -> Response:
+    # Returning a Response skips FastAPI's response_model revalidation; the plan is serialized exactly once
+    with stage("serialize"):
+        return Response(ActionPlan.trusted(plan).model_dump_json(), media_type="application/json")
+
 
 # ---- Legacy endpoint for backwards compatibility ----
 @router.post("/lead", response_model=LeadDecision)
 async def process_lead(lead: LeadIn):
+    observe_parse()
     # Require at least one contact method
     if not (lead.email or lead.phone):
         raise HTTPException(status_code=400, detail="Provide email or phone.")
@@ -167,7 +393,7 @@ async def process_lead(lead: LeadIn):
         channel = "Unknown"
 
     # Fill required fields with sensible defaults
-    return LeadDecision(
+    result = LeadDecision(
         zoho_id=lead.zoho_id,
         channel=channel,
         priority=int(decision.get("priority", 5)),
@@ -178,6 +404,12 @@ async def process_lead(lead: LeadIn):
         source=lead.source,
         thread_key=lead.thread_key,
     )
+    record_decision(
+        result.zoho_id, result.channel, result.priority, result.to_agent, result.notes,
+        {"endpoint": "/lead", "lead": lead.model_dump(), "decision": decision},
+    )
+    emit("lead.analyzed", result.model_dump())
+    return result
 
 
 # ---- New Sales Rep Agent endpoints ----
@@ -187,15 +419,18 @@ async def next_action(payload: LeadRequest):
     Determine the next action in a lead's journey.
     Returns action plan with thread_key passed through unchanged.
     """
-
+    observe_parse()
     try:
         lead_dict = payload.lead.model_dump()
-        state_dict = (payload.state or LeadState()).model_dump()
 
         # Extract thread_key from metadata with explicit key existence check
         metadata_dict = payload.metadata or {}
         thread_key = metadata_dict.get("thread_key", "")
 
+        # Only fields the client actually sent override the stored conversation
+        sent_state = payload.state.model_dump(exclude_unset=True) if payload.state else {}
+        state_dict, summary = await _merge_conversation(thread_key, sent_state)
+
         logger.info(f"[/next_action] Extracted thread_key: {thread_key}")
         logger.info(f"[/next_action] Metadata: {metadata_dict}")
 
@@ -205,19 +440,6 @@ async def next_action(payload: LeadRequest):
         plan.setdefault("action", "wait")  # Default action if LLM doesn't provide one
         plan.setdefault("channel", None)
 
-        # Handle message as ActionMessage object
-        message_data = plan.get("message", {})
-        if isinstance(message_data, dict):
-            plan["message"] = ActionMessage(
-                subject=message_data.get("subject"),
-                body=message_data.get("body"),
-                whatsapp_text=message_data.get("whatsapp_text"),
-            )
-        elif message_data is None:
-            plan["message"] = None
-        else:
-            plan["message"] = ActionMessage(body=str(message_data))
-
         # Ensure metadata is a dictionary and include required fields
         plan_metadata = plan.setdefault("metadata", {})
         plan_metadata.setdefault("thread_key", thread_key)
@@ -228,6 +450,7 @@ async def next_action(payload: LeadRequest):
         plan_metadata.setdefault("country", lead_dict.get("country"))
 
         plan.setdefault("store", {})
+        _stamp_history(plan, summary)
 
         logger.info(
             f"[/next_action] Extracted thread_key: {thread_key}, Outgoing thread_key: {plan_metadata.get('thread_key')}"
@@ -235,7 +458,8 @@ async def next_action(payload: LeadRequest):
         logger.info(f"[/next_action] Source: {lead_dict.get('source')}, Country: {lead_dict.get('country')}")
         logger.info(f"[/next_action] Metadata: {metadata_dict}")
 
-        return ActionPlan(**plan)
+        _record_plan("/next_action", lead_dict, state_dict, metadata_dict, plan)
+        return _plan_response(plan)
     except HTTPException:
         raise
     except Exception as e:
@@ -249,36 +473,121 @@ class RespondIn(BaseModel):
     incoming_text: str
     channel: str  # WhatsApp | Email | etc.
     timestamp: Optional[str] = None
+    thread_key: Optional[str] = None  # when set, only the new turn needs sending; history comes from the store
     state: Optional[LeadState] = LeadState()
 
 
 @router.post("/respond", response_model=ActionPlan)
 async def respond(inbound: RespondIn):
+    observe_parse()
     try:
         minimal_lead = {"zoho_id": inbound.zoho_id}
-        state = (inbound.state or LeadState()).model_dump()
-        state["history"] = (state.get("history") or []) + [
-            {"role": "customer", "text": inbound.incoming_text, "channel": inbound.channel, "ts": inbound.timestamp}
-        ]
-        plan = await plan_next_action(minimal_lead, state)
+        metadata = {"thread_key": inbound.thread_key} if inbound.thread_key else None
+        sent_state = inbound.state.model_dump(exclude_unset=True) if inbound.state else {}
+        turn = {"role": "customer", "text": inbound.incoming_text, "channel": inbound.channel, "ts": inbound.timestamp}
+        state, summary = await _merge_conversation(inbound.thread_key, sent_state, [turn])
+        # Common replies (stop / call me / busy / how much) skip the LLM entirely
+        intent = classify_inbound(inbound.incoming_text)
+        if intent.confident:
+            # A follow-up goes back over the channel the customer replied on unless they prefer another
+            intent_state = dict(state, preferred_channel=state.get("preferred_channel") or inbound.channel)
+            plan = _intent_action_plan(minimal_lead, intent_state, intent.outcome, intent.confidence, metadata)
+        else:
+            plan = await plan_next_action(minimal_lead, state, metadata)
         plan.setdefault("plan_id", inbound.plan_id or str(uuid4()))
-        return ActionPlan(**plan)
+        _stamp_history(plan, summary)
+        _record_plan("/respond", minimal_lead, state, metadata, plan)
+        return _plan_response(plan)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lead processing failed: {e}")
 
 
+# ---- Zoho webhook ingestion ----
+def _webhook_records(raw: bytes, content_type: str) -> List[Dict[str, Any]]:
+    if "application/x-www-form-urlencoded" in content_type:
+        return [dict(parse_qsl(raw.decode("utf-8", errors="replace")))]
+    body = decode(raw)
+    if isinstance(body, dict) and isinstance(body.get("data"), list):
+        body = body["data"]
+    records = body if isinstance(body, list) else [body]
+    if not all(isinstance(r, dict) for r in records):
+        raise ValueError("expected a JSON object, a list of objects or {\"data\": [...]}")
+    return records
+
+
+@router.post("/zoho/webhook", status_code=202)
+async def zoho_webhook(request: Request):
+    """
+    Take a Zoho workflow webhook and ack at once; planning happens in the background.
+
+    Repeated deliveries of the same edit are dropped, and bursts of edits to one
+    lead are planned once. Plans are pushed to n8n as "plan" webhook events.
+    """
+    secret = os.getenv("ZOHO_WEBHOOK_TOKEN")
+    if secret:
+        sent = request.headers.get("x-zoho-webhook-token") or request.query_params.get("token") or ""
+        if not hmac.compare_digest(sent, secret):
+            raise HTTPException(status_code=401, detail="Invalid webhook token")
+    ingestor = _ingestor
+    if ingestor is None:
+        raise HTTPException(status_code=503, detail="Zoho webhook ingestion is disabled (ZOHO_INGEST_ENABLED)")
+    raw = await request.body()
+    try:
+        records = _webhook_records(raw, request.headers.get("content-type", ""))
+        # Stable across workers and restarts, unlike hash() of bytes
+        fingerprint = hashlib.blake2b(raw, digest_size=16).digest()
+        outcomes = [ingestor.accept(record, fingerprint=fingerprint) for record in records]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid webhook payload: {e}")
+    if "refused" in outcomes:
+        return FastJSONResponse({"status": "busy"}, status_code=503, headers={"Retry-After": str(max(1, int(ingestor.debounce)))})
+    return FastJSONResponse({"status": outcomes[0] if len(outcomes) == 1 else outcomes}, status_code=202)
+
+
+async def _plan_from_webhook(payload: Dict[str, Any]) -> None:
+    """Plan a lead edited in Zoho (debounced) and push the plan to n8n."""
+    # Background work: sampled as its own trace, there is no request to continue
+    tracer = get_tracer()
+    root = tracer.start_trace("zoho.webhook.plan", kind=SPAN_KIND_INTERNAL)
+    try:
+        lead = lead_from_webhook(payload)
+        thread_key = lead.pop("thread_key", None)
+        if not thread_key and (lead.get("email") or lead.get("source")):
+            thread_key = f"{lead.get('email') or 'Unknown'}-{lead.get('source') or 'Unknown'}"
+        metadata = {"thread_key": thread_key} if thread_key else {}
+        sent_state = {key: lead.pop(key) for key in STATE_KEYS if key in lead}
+        state, summary = await _merge_conversation(thread_key, sent_state)
+        plan = await plan_next_action(lead, state, metadata)
+        plan.setdefault("plan_id", str(uuid4()))
+        plan.setdefault("action", "wait")
+        plan.setdefault("metadata", {}).setdefault("thread_key", thread_key)
+        _stamp_history(plan, summary)
+        _record_plan("/zoho/webhook", lead, state, metadata, plan)
+        emit("plan", {"zoho_id": lead.get("zoho_id"), "thread_key": thread_key, "plan": plan})
+    finally:
+        if root is not None:
+            tracer.end_trace(root)
+
+
 @router.get("/health")
 async def health():
     return {"status": "ok"}
 
 
+@router.get("/ready")
+async def ready():
+    # Serves the background probe's cached snapshot; no dependency is touched here
+    is_ready, body = await get_readiness_probe().current()
+    return Response(content=body, status_code=200 if is_ready else 503, media_type="application/json")
+
+
 @router.post("/debug_echo_any")
 async def debug_echo_any(req: Request):
     raw = await req.body()
     try:
-        parsed = await req.json()
+        parsed = decode(raw)
     except Exception:
         parsed = None
     return {
@@ -294,14 +603,14 @@ async def next_action_flex(req: Request):
     if not raw or not raw.strip():
         raise HTTPException(status_code=400, detail="Empty request body; send JSON.")
 
-    ctype = (req.headers.get("content-type") or "").lower()
+    # Parse as JSON whatever the content-type says (n8n is not always consistent)
     try:
-        if "application/json" in ctype:
-            body = json.loads(raw)
-        else:
-            body = json.loads(raw)  # last-ditch
+        body = decode(raw)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="JSON body must be an object.")
+    observe_parse()
 
     try:
         if "lead" not in body:
@@ -318,7 +627,9 @@ async def next_action_flex(req: Request):
             }
             if isinstance(lead["interests"], str):
                 lead["interests"] = [lead["interests"]]
-            state = {"intent": body.get("intent") or "general"}
+            state = {}
+            if body.get("intent"):
+                state["intent"] = body["intent"]
             if body.get("thread_key"):
                 state["thread_key"] = body["thread_key"]
             if body.get("subject"):
@@ -334,6 +645,7 @@ async def next_action_flex(req: Request):
             state = body.get("state") or {"intent": "general"}
             metadata = body.get("metadata") or {}
 
+        state, summary = await _merge_conversation(metadata.get("thread_key"), state)
         plan = await plan_next_action(lead, state, metadata)
         if not isinstance(plan, dict):
             raise ValueError("plan_next_action did not return a dict")
@@ -360,11 +672,10 @@ async def next_action_flex(req: Request):
         store.setdefault("thread_key", meta.get("thread_key") or state.get("thread_key") or "")
         store.setdefault("subject", meta.get("subject") or state.get("subject") or "")
 
-        plan["metadata"]["history_seen"] = len(hist)
-        if hist:
-            plan["metadata"]["history_last"] = last.get("text") or ""
+        _stamp_history(plan, summary)
 
-        return ActionPlan(**plan)
+        _record_plan("/next_action_flex", lead, state, metadata, plan)
+        return _plan_response(plan)
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,243 @@
+"""
+Compression middleware
+
+Responses: negotiated Brotli (when the brotli package is installed) or gzip for
+bodies of at least COMPRESS_MIN_SIZE bytes.
+
+Requests: bodies sent with Content-Encoding: gzip to the planning endpoints are
+inflated before the app sees them. The inflated size is capped at
+COMPRESS_MAX_INFLATED bytes (413 beyond it) so a small decompression bomb
+cannot exhaust memory.
+"""
+
+import json
+import logging
+import os
+import zlib
+from typing import Any, Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DECOMPRESS_PATHS = frozenset({"/api/v1/next_action", "/api/v1/next_action_flex", "/api/v1/respond"})
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+
+def _parse_accept_encoding(value: str) -> Dict[str, float]:
+    accepted = {}
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.lower()] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header (br preferred on ties)."""
+    accepted = _parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = []
+    if brotli is not None:
+        candidates.append(("br", accepted.get("br", wildcard)))
+    candidates.append(("gzip", accepted.get("gzip", wildcard)))
+    best = max(candidates, key=lambda c: c[1])
+    return best[0] if best[1] > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=level)
+        else:
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware for negotiated response compression and gzip request bodies."""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: Optional[int] = None,
+        max_inflated: Optional[int] = None,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        decompress_paths=DECOMPRESS_PATHS,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+        self.max_inflated = max_inflated if max_inflated is not None else int(os.getenv("COMPRESS_MAX_INFLATED", str(10 * 1024 * 1024)))
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+        self.decompress_paths = decompress_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.lower(): v for k, v in scope.get("headers", [])}
+        content_encoding = headers.get(b"content-encoding", b"").decode("latin-1").strip().lower()
+        if content_encoding and content_encoding != "identity" and scope["path"] in self.decompress_paths:
+            if content_encoding not in ("gzip", "x-gzip"):
+                await self._error(send, 415, f"Unsupported Content-Encoding '{content_encoding}'.")
+                return
+            try:
+                body = await self._inflate(receive)
+            except _TooLarge:
+                await self._error(send, 413, f"Decompressed body exceeds {self.max_inflated} bytes.")
+                return
+            except (zlib.error, EOFError, OSError):
+                await self._error(send, 400, "Malformed gzip request body.")
+                return
+            scope = dict(scope)
+            scope["headers"] = [
+                (k, v) for k, v in scope["headers"] if k.lower() not in (b"content-encoding", b"content-length")
+            ] + [(b"content-length", str(len(body)).encode())]
+            receive = self._replay(body, receive)
+
+        # Without an acceptable encoding nothing is compressed, but Vary is still set on negotiable responses
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        level = self.levels[encoding] if encoding else 0
+        await self.app(scope, receive, _CompressingSend(send, encoding, level, self.minimum_size))
+
+    async def _inflate(self, receive) -> bytes:
+        # wbits 47 = accept zlib or gzip headers; max_length caps each step so output never exceeds the limit
+        inflater = zlib.decompressobj(47)
+        out: List[bytes] = []
+        size = 0
+        more = True
+        while more:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            more = message.get("more_body", False)
+            data = message.get("body", b"")
+            while data:
+                chunk = inflater.decompress(data, self.max_inflated - size + 1)
+                size += len(chunk)
+                if size > self.max_inflated:
+                    raise _TooLarge()
+                out.append(chunk)
+                data = inflater.unconsumed_tail
+        tail = inflater.flush()
+        size += len(tail)
+        if size > self.max_inflated:
+            raise _TooLarge()
+        if not inflater.eof:
+            raise EOFError("truncated gzip stream")
+        out.append(tail)
+        return b"".join(out)
+
+    @staticmethod
+    def _replay(body: bytes, receive):
+        delivered = False
+
+        async def replay_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay_receive
+
+    @staticmethod
+    async def _error(send, status: int, detail: str) -> None:
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class _TooLarge(Exception):
+    pass
+
+
+class _CompressingSend:
+    """
+    Wraps send(): decides on the first body chunk whether compression is worth it.
+
+    Every negotiable response (compressible type, not already encoded) gets
+    Vary: Accept-Encoding, compressed or not, so shared caches key on it.
+    With encoding None nothing is compressed.
+    """
+
+    def __init__(self, send, encoding: Optional[str], level: int, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self.start: Optional[Dict[str, Any]] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = {k.lower(): v for k, v in message.get("headers", [])}
+            ctype = headers.get(b"content-type", b"").decode("latin-1")
+            if b"content-encoding" in headers or not ctype.startswith(COMPRESSIBLE_TYPES):
+                self.passthrough = True
+            else:
+                self.start = {**message, "headers": list(message.get("headers", [])) + [(b"vary", b"Accept-Encoding")]}
+                self.passthrough = self.encoding is None
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            if self.passthrough or (not more and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            self.compressor = _Compressor(self.encoding, self.level)
+            headers = [(k, v) for k, v in start.get("headers", []) if k.lower() != b"content-length"]
+            headers.append((b"content-encoding", self.encoding.encode()))
+            if not more:
+                compressed = self.compressor.compress(body) + self.compressor.flush()
+                headers.append((b"content-length", str(len(compressed)).encode()))
+                await self.send({**start, "headers": headers})
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            await self.send({**start, "headers": headers})
+
+        if self.passthrough:
+            await self.send(message)
+            return
+        data = self.compressor.compress(body)
+        if not more:
+            data += self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more})
@@ -0,0 +1,70 @@
+"""
+Decision history API
+
+Read-only listing of lead_decisions for agents (a lead's past decisions) and
+ops (recent handoffs, time windows). Pages are newest first and use keyset
+pagination: pass the returned next_cursor back as ?cursor= for the next page.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+from src.services.decision_log import get_decision_reader
+from src.utils.codec import FastJSONResponse
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/v1", tags=["decisions"], default_response_class=FastJSONResponse)
+
+MAX_PAGE = 500
+
+
+class DecisionItem(BaseModel):
+    id: int
+    zoho_id: str
+    channel: str
+    priority: int
+    to_agent: bool
+    notes: Optional[str] = None
+    created_at: str
+    lead_data: Optional[Any] = None
+
+
+class DecisionPage(BaseModel):
+    items: List[DecisionItem]
+    next_cursor: Optional[str] = None
+
+
+async def _page(**filters) -> Dict[str, Any]:
+    try:
+        items, next_cursor = await asyncio.to_thread(get_decision_reader().list, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/leads/{zoho_id}/decisions", response_model=DecisionPage)
+async def lead_decisions(
+    zoho_id: str,
+    limit: int = Query(50, ge=1, le=MAX_PAGE),
+    cursor: Optional[str] = None,
+    include_data: bool = False,
+):
+    """Past decisions for one lead, newest first."""
+    return await _page(zoho_id=zoho_id, limit=limit, cursor=cursor, include_data=include_data)
+
+
+@router.get("/decisions", response_model=DecisionPage)
+async def list_decisions(
+    since: Optional[str] = Query(None, description="Inclusive lower bound, ISO-8601 (UTC)"),
+    until: Optional[str] = Query(None, description="Exclusive upper bound, ISO-8601 (UTC)"),
+    to_agent: Optional[bool] = Query(None, description="true: handoffs only, false: automated only"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE),
+    cursor: Optional[str] = None,
+    include_data: bool = False,
+):
+    """Decisions in a time window and/or filtered by to_agent, newest first."""
+    return await _page(since=since, until=until, to_agent=to_agent, limit=limit, cursor=cursor, include_data=include_data)
@@ -0,0 +1,57 @@
+"""
+Follow-up API
+
+Pull side of the follow-up scheduler (used when FOLLOWUPS_WEBHOOK_URL is not
+set): n8n polls /followups/due and gets each due follow-up once, with its
+precomputed plan. DELETE cancels a lead's pending follow-up, e.g. when an
+agent takes over outside the planner.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+from src.services.followups import get_followup_scheduler
+from src.utils.codec import FastJSONResponse
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/v1", tags=["followups"], default_response_class=FastJSONResponse)
+
+MAX_BATCH = 1000
+
+
+class FollowupItem(BaseModel):
+    zoho_id: str
+    thread_key: Optional[str] = None
+    due_at: str
+    lead: Optional[Dict[str, Any]] = None
+    plan: Optional[Dict[str, Any]] = None
+
+
+class FollowupBatch(BaseModel):
+    items: List[FollowupItem]
+    pending: int
+
+
+def _scheduler():
+    scheduler = get_followup_scheduler()
+    if not scheduler.running:
+        raise HTTPException(status_code=503, detail="Follow-up scheduler is not running (FOLLOWUPS_ENABLED)")
+    return scheduler
+
+
+@router.get("/followups/due", response_model=FollowupBatch)
+async def due_followups(limit: int = Query(100, ge=1, le=MAX_BATCH)):
+    """Follow-ups that are due, oldest first; each is handed out once."""
+    scheduler = _scheduler()
+    return {"items": scheduler.take_ready(limit), "pending": len(scheduler)}
+
+
+@router.delete("/followups/{zoho_id}")
+async def cancel_followup(zoho_id: str):
+    """Cancel a lead's pending follow-up."""
+    if not _scheduler().cancel(zoho_id):
+        raise HTTPException(status_code=404, detail=f"No pending follow-up for {zoho_id}")
+    return {"zoho_id": zoho_id, "cancelled": True}
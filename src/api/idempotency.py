@@ -0,0 +1,142 @@
+"""
+Idempotency middleware for the planning endpoints
+
+Retries of /next_action, /next_action_flex and /respond replay the first
+successful response instead of generating a new plan_id, calling OpenAI again
+and messaging the customer twice.
+
+Only requests carrying an Idempotency-Key header are de-duplicated; two
+identical bodies without one are two requests (a customer can legitimately
+send "yes" twice). A duplicate that arrives while the first request is still
+running waits for it rather than recomputing.
+"""
+
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from src.services.idempotency import StoredResponse, build_idempotency_store
+from src.services.metrics import cache_result
+
+logger = logging.getLogger(__name__)
+
+PLANNING_PATHS = frozenset({"/api/v1/next_action", "/api/v1/next_action_flex", "/api/v1/respond"})
+
+REPLAY_HEADER = (b"idempotent-replayed", b"true")
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware: buffers the request body, replays stored responses, de-duplicates in-flight work."""
+
+    def __init__(self, app, store=None, paths=PLANNING_PATHS):
+        self.app = app
+        self.store = store if store is not None else build_idempotency_store()
+        self.paths = paths
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        header_key = self._header(scope, b"idempotency-key")
+        if not header_key:
+            await self.app(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = f"{scope['path']}:key:{header_key}"
+
+        # A retry of a request that is still running waits for it (it may fail, then the next one runs)
+        while key in self._inflight:
+            stored = await asyncio.shield(self._inflight[key])
+            if stored is not None:
+                cache_result("idempotency", "hit")
+                await self._answer(stored, fingerprint, send)
+                return
+
+        # Registered before the first await, so concurrent retries can't both miss a shared store
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        result: Optional[StoredResponse] = None
+        try:
+            result = await self.store.get(key)
+            cache_result("idempotency", "miss" if result is None else "hit")
+            if result is not None:
+                await self._answer(result, fingerprint, send)
+                return
+            result = await self._run(scope, body, receive, send, fingerprint)
+            if result is not None:
+                await self.store.put(key, result)
+        finally:
+            self._inflight.pop(key, None)
+            future.set_result(result)
+
+    async def _answer(self, stored: StoredResponse, fingerprint: str, send) -> None:
+        if stored.fingerprint != fingerprint:
+            await self._send_conflict(send)
+        else:
+            await self._replay(stored, send)
+
+    async def _run(self, scope, body: bytes, receive, send, fingerprint: str) -> Optional[StoredResponse]:
+        """Run the endpoint, streaming to the client while capturing a successful response."""
+        delivered = False
+
+        async def replay_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = 0
+        headers: List[Any] = []
+        chunks: List[bytes] = []
+
+        async def capture_send(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, replay_receive, capture_send)
+        if 200 <= status < 300:
+            return StoredResponse(status, [(bytes(k), bytes(v)) for k, v in headers], b"".join(chunks), fingerprint)
+        return None
+
+    async def _replay(self, stored: StoredResponse, send) -> None:
+        await send({"type": "http.response.start", "status": stored.status, "headers": stored.headers + [REPLAY_HEADER]})
+        await send({"type": "http.response.body", "body": stored.body})
+
+    async def _send_conflict(self, send) -> None:
+        body = b'{"detail":"Idempotency-Key was already used with a different request body."}'
+        await send({
+            "type": "http.response.start",
+            "status": 422,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    def _header(scope, name: bytes) -> Optional[str]:
+        for k, v in scope.get("headers", []):
+            if k.lower() == name:
+                return v.decode("latin-1").strip() or None
+        return None
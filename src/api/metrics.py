@@ -0,0 +1,82 @@
+"""
+Request metrics middleware and the /metrics endpoint
+
+Requests are labelled with their route template (/api/v1/leads/{zoho_id}/decisions,
+not the raw path) so lead ids don't turn into time series. Requests answered
+before routing (admission shedding, idempotent replays) fall back to the path
+when it is a fixed route, and "unmatched" otherwise.
+"""
+
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Response
+
+from src.services.metrics import HTTP_REQUESTS, PLANNER_STAGES, REGISTRY, metrics_enabled
+from src.services.tracing import record_since_start
+
+router = APIRouter(tags=["metrics"])
+
+# perf_counter() when the current request entered the middleware; lets handlers time what ran before them
+_request_started: ContextVar[Optional[float]] = ContextVar("request_started", default=None)
+
+
+def observe_parse() -> None:
+    """Record the 'parse' stage: body read, inflate, de-dup and validation, up to handler entry."""
+    started = _request_started.get()
+    if started is not None:
+        PLANNER_STAGES.labels("parse").observe(perf_counter() - started)
+    record_since_start("planner.parse")
+
+
+class RouteTemplates:
+    """Route template for a finished request's scope; built from the app's routes on first use."""
+
+    def __init__(self):
+        self._endpoints: Optional[Dict[object, str]] = None
+        self._static: frozenset = frozenset()
+
+    def __call__(self, scope) -> str:
+        if self._endpoints is None:
+            routes = [r for r in getattr(scope.get("app"), "routes", ()) if hasattr(r, "endpoint")]
+            self._endpoints = {r.endpoint: r.path for r in routes}
+            self._static = frozenset(r.path for r in routes if "{" not in r.path)
+        endpoint = scope.get("endpoint")
+        if endpoint is not None and endpoint in self._endpoints:
+            return self._endpoints[endpoint]
+        return scope["path"] if scope["path"] in self._static else "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: one histogram observation per HTTP request."""
+
+    def __init__(self, app, enabled: Optional[bool] = None):
+        self.app = app
+        self.enabled = metrics_enabled() if enabled is None else enabled
+        self._route = RouteTemplates()
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = perf_counter()
+        token = _request_started.set(started)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_started.reset(token)
+            HTTP_REQUESTS.labels(self._route(scope), scope["method"], str(status)).observe(perf_counter() - started)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,87 @@
+"""
+Profiling middleware and profile download
+
+A request carrying `x-profile-token: <PROFILE_SECRET>` runs under the sampling
+profiler. Its response carries `x-profile: /api/v1/profiles/<name>`, or
+`x-profile: rate-limited` when another profile is running or one was taken
+too recently. Every other request passes straight through.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from src.services.profiling import RequestProfiler, get_request_profiler
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = b"x-profile-token"
+PROFILES_PATH = "/api/v1/profiles/"
+
+router = APIRouter(prefix="/api/v1", tags=["profiling"])
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: profiles requests that present the profiling secret."""
+
+    def __init__(self, app, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler or get_request_profiler()
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        token = None
+        for name, value in scope.get("headers") or ():
+            if name == TOKEN_HEADER:
+                token = value.decode("latin-1")
+                break
+        if token is None or scope["path"].startswith(PROFILES_PATH) or not profiler.authorized(token):
+            await self.app(scope, receive, send)
+            return
+        if not profiler.acquire():
+            await self.app(scope, receive, self._with_header(send, b"rate-limited"))
+            return
+
+        name = profiler.new_name(scope["method"], scope["path"])
+        sampler = profiler.sampler().start()
+        try:
+            await self.app(scope, receive, self._with_header(send, (PROFILES_PATH + name).encode()))
+        finally:
+            sampler.stop()
+            try:
+                await asyncio.to_thread(profiler.write, name, sampler)
+            except Exception as e:
+                logger.error(f"Writing request profile {name} failed: {e}")
+            finally:
+                profiler.release()
+
+    @staticmethod
+    def _with_header(send, value: bytes):
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers") or []) + [(b"x-profile", value)]}
+            await send(message)
+
+        return send_wrapper
+
+
+@router.get("/profiles/{name}", include_in_schema=False)
+async def download_profile(name: str, request: Request):
+    profiler = get_request_profiler()
+    if not profiler.authorized(request.headers.get("x-profile-token")):
+        raise HTTPException(status_code=403, detail="Profiling token required.")
+    path = profiler.path_for(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No such profile (it may still be being written).")
+
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+
+    media_type = "application/json" if name.endswith(".json") else "text/plain; charset=utf-8"
+    return Response(await asyncio.to_thread(read), media_type=media_type)
@@ -0,0 +1,63 @@
+"""
+Tracing middleware
+
+Opens the root span of a sampled request, continuing the caller's trace from a
+W3C traceparent header, and returns traceparent / x-trace-id on the response
+so n8n executions can be matched to traces. Unsampled requests pass straight
+through.
+"""
+
+from typing import Optional
+
+from src.api.metrics import RouteTemplates
+from src.services.tracing import Tracer, get_tracer
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware: root span per sampled HTTP request."""
+
+    def __init__(self, app, tracer: Optional[Tracer] = None):
+        self.app = app
+        self.tracer = tracer
+        self._route = RouteTemplates()
+
+    async def __call__(self, scope, receive, send):
+        tracer = self.tracer or get_tracer()
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+        traceparent = None
+        for name, value in scope.get("headers") or ():
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        root = tracer.start_trace(f"{scope['method']} {scope['path']}", traceparent)
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+        root.attributes["http.method"] = scope["method"]
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers") or [])
+                headers.append((b"traceparent", root.traceparent.encode()))
+                headers.append((b"x-trace-id", root.trace_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            route = self._route(scope)
+            root.name = f"{scope['method']} {route}"
+            root.attributes["http.route"] = route
+            root.attributes["http.status_code"] = status
+            if status >= 500 and root.error is None:
+                root.error = f"HTTP {status}"
+            tracer.end_trace(root)
@@ -0,0 +1,415 @@
+"""
+Offline backfill for Lead Follow-up AI Agent
+
+Streams a Zoho CSV/JSONL export through the deterministic planner on a
+process pool and writes the decisions to decisions.db or a JSONL file.
+
+Usage:
+    python -m src.cli.backfill leads.csv --out decisions.db --workers 8
+    python -m src.cli.backfill leads.jsonl --out plans.jsonl --resume
+    python -m src.cli.backfill leads.csv --out decisions.db --llm
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.services.decision_log import ensure_schema
+from src.services.llm_service import _mock_action_plan, _mock_response, analyze_lead, plan_next_action
+
+# Zoho export headers (normalised to snake_case) -> planner field names
+FIELD_ALIASES = {
+    "record_id": "zoho_id",
+    "lead_id": "zoho_id",
+    "id": "zoho_id",
+    "zoho_id": "zoho_id",
+    "full_name": "name",
+    "lead_name": "name",
+    "name": "name",
+    "first_name": "first_name",
+    "last_name": "last_name",
+    "email": "email",
+    "phone": "phone",
+    "mobile": "phone",
+    "lead_source": "source",
+    "source": "source",
+    "city": "city",
+    "country": "country",
+    "description": "notes",
+    "notes": "notes",
+    "interest": "interest",
+    "interests": "interests",
+    "subject": "subject",
+    "preferred_channel": "preferred_channel",
+    "last_outcome": "last_outcome",
+    "thread_key": "thread_key",
+}
+
+STATE_FIELDS = {"preferred_channel", "last_outcome"}
+
+
+def normalize_record(raw: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """
+    Map one export row onto the (lead, state, metadata) dicts the planner expects.
+
+    JSONL rows already shaped like a /next_action payload ({"lead": ..., "state": ...})
+    are passed through unchanged.
+    """
+    if isinstance(raw.get("lead"), dict):
+        return raw["lead"], raw.get("state") or {"intent": "general"}, raw.get("metadata") or {}
+
+    lead: Dict[str, Any] = {}
+    state: Dict[str, Any] = {"intent": "general"}
+    metadata: Dict[str, Any] = {}
+    for key, value in raw.items():
+        if key is None or value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                continue
+        field = FIELD_ALIASES.get(key.strip().lower().replace(" ", "_").replace("-", "_"))
+        if not field:
+            continue
+        if field in STATE_FIELDS:
+            state[field] = value
+        elif field == "thread_key":
+            metadata["thread_key"] = value
+        else:
+            lead[field] = value
+
+    # Zoho multi-select picklists export as "a;b" strings
+    interests = lead.get("interests")
+    if isinstance(interests, str):
+        lead["interests"] = [s.strip() for s in interests.replace(";", ",").split(",") if s.strip()]
+
+    last_name = lead.pop("last_name", None)
+    if "name" not in lead and (lead.get("first_name") or last_name):
+        lead["name"] = " ".join(p for p in (lead.get("first_name"), last_name) if p)
+
+    if isinstance(raw.get("history"), list):
+        state["history"] = raw["history"]
+
+    return lead, state, metadata
+
+
+def iter_records(path: str, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Stream rows from a CSV or JSONL export without loading the whole file."""
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    if fmt == "csv":
+        # Zoho exports are UTF-8 with a BOM
+        with open(path, newline="", encoding="utf-8-sig") as fh:
+            yield from csv.DictReader(fh)
+    else:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def _init_worker(use_llm: bool) -> None:
+    # log_debug() prints on every plan; keep worker stdout quiet
+    sys.stdout = open(os.devnull, "w")
+    if not use_llm:
+        os.environ["MOCK_LLM"] = "true"
+
+
+async def _enrich(items: List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    results = []
+    for lead, state, metadata in items:
+        decision = await analyze_lead(lead)
+        plan = await plan_next_action(lead, state, metadata)
+        results.append((decision, plan))
+    return results
+
+
+def _plan_chunk(rows: List[Dict[str, Any]], sink_format: str, use_llm: bool) -> Tuple[List[Any], int, int]:
+    """
+    Run the planner over one chunk inside a worker process.
+
+    Output is pre-serialised here so the parent process only does I/O.
+
+    Returns:
+        (outputs, rows_in, rows_skipped) where outputs are JSONL lines or
+        lead_decisions row tuples depending on sink_format
+    """
+    items = []
+    skipped = 0
+    for raw in rows:
+        lead, state, metadata = normalize_record(raw)
+        if not lead.get("zoho_id"):
+            skipped += 1
+            continue
+        items.append((lead, state, metadata))
+
+    if use_llm:
+        results = asyncio.run(_enrich(items))
+    else:
+        results = [(_mock_response(lead), _mock_action_plan(lead, state, metadata)) for lead, state, metadata in items]
+
+    outputs: List[Any] = []
+    for (lead, _state, _metadata), (decision, plan) in zip(items, results):
+        plan_meta = plan.get("metadata") or {}
+        record = {
+            "zoho_id": lead["zoho_id"],
+            "channel": plan.get("channel") or decision.get("channel") or "Unknown",
+            "priority": int(plan_meta.get("priority", decision.get("priority", 5))),
+            "to_agent": bool(plan_meta.get("to_agent", decision.get("to_agent", False))),
+            "notes": plan_meta.get("ai_notes") or decision.get("notes") or "",
+        }
+        if sink_format == "jsonl":
+            outputs.append(json.dumps({**record, "lead": lead, "decision": decision, "plan": plan}, default=str) + "\n")
+        else:
+            lead_data = json.dumps({"lead": lead, "decision": decision, "plan": plan}, default=str)
+            outputs.append((record["zoho_id"], record["channel"], record["priority"], record["to_agent"], record["notes"], lead_data))
+    return outputs, len(rows), skipped
+
+
+class JsonlSink:
+    """Appends JSONL output; a sidecar checkpoint records rows done and the committed byte offset."""
+
+    format = "jsonl"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.checkpoint_path = f"{path}.ckpt"
+        self._fh = None
+
+    def open(self, resume: bool) -> int:
+        rows_done, offset = 0, 0
+        if resume and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as fh:
+                ckpt = json.load(fh)
+            rows_done, offset = int(ckpt["rows_done"]), int(ckpt["offset"])
+        self._fh = open(self.path, "r+b" if resume and os.path.exists(self.path) else "wb")
+        # Drop anything written after the last checkpoint (e.g. a crash mid-chunk)
+        self._fh.truncate(offset)
+        self._fh.seek(offset)
+        return rows_done
+
+    def write(self, lines: List[str], rows_done: int) -> None:
+        self._fh.write("".join(lines).encode("utf-8"))
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"rows_done": rows_done, "offset": self._fh.tell()}, fh)
+        os.replace(tmp, self.checkpoint_path)
+
+    def close(self) -> None:
+        if self._fh:
+            self._fh.close()
+
+
+class SqliteSink:
+    """Inserts into lead_decisions; the checkpoint is committed in the same transaction as each chunk."""
+
+    format = "sqlite"
+
+    def __init__(self, path: str, source_key: str):
+        self.path = path
+        self.source_key = source_key
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def open(self, resume: bool) -> int:
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        ensure_schema(conn)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS backfill_checkpoints ("
+            "source TEXT PRIMARY KEY, rows_done INTEGER NOT NULL, updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP))"
+        )
+        conn.commit()
+        self._conn = conn
+        if not resume:
+            with conn:
+                conn.execute("DELETE FROM backfill_checkpoints WHERE source = ?", (self.source_key,))
+            return 0
+        row = conn.execute("SELECT rows_done FROM backfill_checkpoints WHERE source = ?", (self.source_key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def write(self, rows: List[tuple], rows_done: int) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO lead_decisions (zoho_id, channel, priority, to_agent, notes, lead_data) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO backfill_checkpoints (source, rows_done, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+                (self.source_key, rows_done),
+            )
+
+    def close(self) -> None:
+        if self._conn:
+            self._conn.close()
+
+
+def open_sink(out_path: str, input_path: str):
+    """Pick a sink from the output extension: .db/.sqlite -> lead_decisions, anything else -> JSONL."""
+    if out_path.lower().endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteSink(out_path, os.path.abspath(input_path))
+    return JsonlSink(out_path)
+
+
+def _chunked(records: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Progress:
+    """Throttled progress/throughput reporter (stderr)."""
+
+    def __init__(self, every: float = 5.0, start_row: int = 0):
+        self.every = every
+        self.start_row = start_row
+        self.rows = 0
+        self.written = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        self._last = self.started
+
+    def update(self, rows: int, written: int, skipped: int) -> None:
+        self.rows += rows
+        self.written += written
+        self.skipped += skipped
+        now = time.monotonic()
+        if self.every and now - self._last >= self.every:
+            self._last = now
+            self.report()
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def report(self, final: bool = False) -> None:
+        label = "done" if final else "progress"
+        print(
+            f"[backfill] {label}: {self.start_row + self.rows:,} rows "
+            f"({self.written:,} written, {self.skipped:,} skipped) at {self.rate:,.0f} rows/s",
+            file=sys.stderr,
+        )
+
+
+def run_backfill(
+    input_path: str,
+    out_path: str,
+    fmt: Optional[str] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 500,
+    use_llm: bool = False,
+    resume: bool = False,
+    progress_every: float = 5.0,
+) -> Dict[str, Any]:
+    """
+    Plan every row of a Zoho export and write the results in chunks.
+
+    Chunks are planned out of order across the pool but committed strictly in
+    input order, so the checkpoint is always a clean prefix of the input.
+
+    Args:
+        input_path: Zoho CSV or JSONL export
+        out_path: decisions.db (or any .db/.sqlite) or a .jsonl file
+        fmt: "csv" or "jsonl"; inferred from the extension when omitted
+        workers: process count (defaults to os.cpu_count())
+        chunk_size: rows per task sent to a worker
+        use_llm: enrich with analyze_lead/plan_next_action (OpenAI) instead of mock logic only
+        resume: continue from the last checkpoint instead of starting over
+        progress_every: seconds between progress lines (0 disables)
+
+    Returns:
+        Summary dict with rows, written, skipped, resumed_from, seconds and rows_per_sec
+    """
+    workers = workers or os.cpu_count() or 1
+    sink = open_sink(out_path, input_path)
+    start_row = sink.open(resume)
+    records = iter_records(input_path, fmt)
+    for _ in islice(records, start_row):
+        pass
+
+    progress = Progress(progress_every, start_row)
+    rows_done = start_row
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(use_llm,)) as pool:
+            chunks = _chunked(records, chunk_size)
+            # Bounded in-flight window keeps memory flat on arbitrarily large exports
+            max_in_flight = workers * 2
+            in_flight: Dict[Any, int] = {}
+            finished: Dict[int, Tuple[List[Any], int, int]] = {}
+            next_submit = next_commit = 0
+            exhausted = False
+            while True:
+                while not exhausted and len(in_flight) < max_in_flight:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    in_flight[pool.submit(_plan_chunk, chunk, sink.format, use_llm)] = next_submit
+                    next_submit += 1
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished[in_flight.pop(future)] = future.result()
+                while next_commit in finished:
+                    outputs, rows_in, skipped = finished.pop(next_commit)
+                    rows_done += rows_in
+                    sink.write(outputs, rows_done)
+                    progress.update(rows_in, len(outputs), skipped)
+                    next_commit += 1
+    finally:
+        sink.close()
+
+    if progress_every:
+        progress.report(final=True)
+    return {
+        "rows": progress.rows,
+        "written": progress.written,
+        "skipped": progress.skipped,
+        "resumed_from": start_row,
+        "seconds": round(time.monotonic() - progress.started, 3),
+        "rows_per_sec": round(progress.rate, 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.cli.backfill", description="Backfill planner decisions from a Zoho export.")
+    parser.add_argument("input", help="Zoho CSV or JSONL export")
+    parser.add_argument("--out", default="decisions.db", help="decisions.db (lead_decisions table) or a .jsonl file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="input format (default: from extension)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="rows per worker task")
+    parser.add_argument("--llm", action="store_true", help="enrich with OpenAI analysis (requires OPENAI_API_KEY)")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    summary = run_backfill(
+        args.input,
+        args.out,
+        fmt=args.format,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        use_llm=args.llm,
+        resume=args.resume,
+        progress_every=args.progress_every,
+    )
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
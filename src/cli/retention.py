@@ -0,0 +1,52 @@
+"""
+Decision retention maintenance for Lead Follow-up AI Agent
+
+Runs one retention pass (partition, archive, incremental vacuum) outside the
+server, looks up a lead's archived decisions, or converts an existing
+decisions.db to incremental auto-vacuum.
+
+Usage:
+    python -m src.cli.retention --once
+    python -m src.cli.retention --lookup Z123
+    python -m src.cli.retention --convert-vacuum
+"""
+
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+from src.services.decision_retention import RetentionManager, get_retention_manager, lookup_archived
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.cli.retention", description="Partition, archive and vacuum lead_decisions.")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--once", action="store_true", help="run one retention pass and print its stats")
+    action.add_argument("--lookup", metavar="ZOHO_ID", help="print a lead's archived decisions as JSONL")
+    action.add_argument("--convert-vacuum", action="store_true", help="one-off full VACUUM enabling incremental vacuum (blocks writers)")
+    parser.add_argument("--db", help="decisions database (default: DECISIONS_DB)")
+    parser.add_argument("--archive-dir", help="archive directory (default: DECISIONS_ARCHIVE_DIR)")
+    args = parser.parse_args(argv)
+
+    defaults = get_retention_manager()
+    manager = RetentionManager(
+        path=args.db or defaults.path,
+        archive_dir=args.archive_dir or defaults.archive_dir,
+        hot_months=defaults.hot_months,
+        archive_after_days=defaults.archive_after_days,
+        chunk=defaults.chunk,
+    )
+    if args.lookup:
+        for record in lookup_archived(manager.path, manager.archive_dir, args.lookup):
+            print(json.dumps(record))
+    elif args.convert_vacuum:
+        manager.convert_to_incremental_vacuum()
+        print(json.dumps({"converted": manager.path}))
+    else:
+        print(json.dumps(manager.run_once()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Admission control for the planning endpoints
+
+During campaign blasts requests pile up behind slow OpenAI calls until clients
+time out, and every queued request has already cost memory and a validation
+pass. The controller bounds that work:
+
+- at most ADMISSION_MAX_INFLIGHT planning requests run at once
+- up to ADMISSION_MAX_QUEUE more wait for a slot, first come first served,
+  for at most ADMISSION_MAX_QUEUE_WAIT seconds
+- a request is refused straight away (no queueing) when the queue is full,
+  when the expected wait already exceeds ADMISSION_MAX_QUEUE_WAIT, or when
+  event-loop lag is above ADMISSION_MAX_LOOP_LAG
+
+Refusals carry a Retry-After estimated from recent service times, so the work
+that is accepted keeps a bounded latency.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = 0.2
+
+
+class Rejected(Exception):
+    """Raised by AdmissionController.acquire() when a request is shed."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up: the event loop's scheduling lag."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.lag = 0.0  # most recent sample, seconds
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self.lag = 0.0
+            self._task = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - expected)
+            self.max_lag = max(self.max_lag, self.lag)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_inflight: int = 64,
+        max_queue: int = 128,
+        max_queue_wait: float = 2.0,
+        max_loop_lag: float = 0.5,
+        monitor: Optional[LoopLagMonitor] = None,
+    ):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.max_loop_lag = max_loop_lag
+        self.monitor = monitor if monitor is not None else LoopLagMonitor()
+        self.inflight = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+        self.service_time = 0.0  # EWMA seconds per admitted request
+        self.queue_wait = 0.0  # EWMA seconds spent queued (0 for requests that got a slot at once)
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, position: Optional[int] = None) -> float:
+        """Seconds until a slot frees up for the request at this queue position (default: a new arrival)."""
+        ahead = self.queued if position is None else position
+        return self.service_time * (ahead + 1) / max(1, self.max_inflight)
+
+    def retry_after(self) -> int:
+        return min(60, max(1, math.ceil(self.expected_wait())))
+
+    def _reject(self, reason: str) -> Rejected:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        if sum(self.rejected.values()) % 100 == 1:
+            logger.warning(f"Shedding planning requests ({reason}); in flight {self.inflight}, queued {self.queued}")
+        return Rejected(reason, self.retry_after())
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns the admission time for release(). Raises Rejected when shedding."""
+        self.monitor.start()
+        if self.max_loop_lag and self.monitor.lag > self.max_loop_lag:
+            raise self._reject("loop_lag")
+        started = time.monotonic()
+        if self.inflight < self.max_inflight and not self._waiters:
+            self.inflight += 1
+            return self._admit(started, started)
+        if self.queued >= self.max_queue:
+            raise self._reject("queue_full")
+        if self.service_time and self.expected_wait() > self.max_queue_wait:
+            raise self._reject("queue_wait")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_queue_wait)
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout") from None
+        except asyncio.CancelledError:
+            # client went away; if the slot was handed over at the same moment, pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release(None)
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        return self._admit(started, time.monotonic())
+
+    def _admit(self, arrived: float, admitted: float) -> float:
+        self.admitted += 1
+        self.queue_wait += EWMA_ALPHA * ((admitted - arrived) - self.queue_wait)
+        return admitted
+
+    def release(self, admitted_at: Optional[float]) -> None:
+        """Free a slot, handing it straight to the oldest waiter if there is one."""
+        if admitted_at is not None:
+            self.service_time += EWMA_ALPHA * ((time.monotonic() - admitted_at) - self.service_time)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # slot moves to the waiter; inflight unchanged
+                return
+        self.inflight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "queue_wait_ms": round(self.queue_wait * 1000, 3),
+            "service_time_ms": round(self.service_time * 1000, 3),
+            "loop_lag_ms": round(self.monitor.lag * 1000, 3),
+        }
+
+
+def build_admission_controller() -> AdmissionController:
+    """Controller configured from ADMISSION_MAX_INFLIGHT / _MAX_QUEUE / _MAX_QUEUE_WAIT / _MAX_LOOP_LAG."""
+    return AdmissionController(
+        max_inflight=int(os.getenv("ADMISSION_MAX_INFLIGHT", "64")),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "128")),
+        max_queue_wait=float(os.getenv("ADMISSION_MAX_QUEUE_WAIT", "2.0")),
+        max_loop_lag=float(os.getenv("ADMISSION_MAX_LOOP_LAG", "0.5")),
+    )
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Process-wide controller, configured from the environment on first use."""
+    global _controller
+    if _controller is None:
+        _controller = build_admission_controller()
+    return _controller
@@ -0,0 +1,238 @@
+"""
+Server-side conversation store keyed by thread_key
+
+Clients no longer need to resend the whole LeadState: /next_action and
+/respond may send only the new turn(s) and the server merges them into the
+stored conversation. A client that still sends the full history is fine too -
+turns already stored are recognised and not appended twice.
+
+The store is the single source for history_seen / history_last in plans.
+
+Backends (STORE_BACKEND):
+- memory: per-process LRU with TTL (STORE_TTL), a thread cap (STORE_MAX_THREADS),
+  a per-thread turn cap (STORE_MAX_TURNS) and a total memory cap (STORE_MAX_BYTES)
+- redis: shared by every worker (REDIS_URL); see src/services/redis_backend.py
+- sql: the conversations table in DATABASE_URL; see src/services/database.py
+"""
+
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Collection, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.codec import encode
+
+logger = logging.getLogger(__name__)
+
+# LeadState fields kept alongside the history (client values win when sent)
+STATE_FIELDS = ("intent", "preferred_channel", "last_outcome", "next_follow_up_at", "subject")
+
+# Rough per-turn (including its turn key) and per-thread overhead on top of the encoded turn size
+TURN_OVERHEAD = 120
+THREAD_OVERHEAD = 600
+
+
+def turn_key(turn: Dict[str, Any], position: int) -> bytes:
+    """
+    Identity of a turn for de-duplicating resent history (stable across processes).
+
+    position is the turn's index in the thread. It is only part of the key when
+    the turn has no ts, so a repeated "yes" or "ok" is a new turn, not a resend.
+    """
+    fields = [turn.get(f) for f in ("role", "text", "ts", "channel")]
+    if turn.get("ts") is None:
+        fields.append(position)
+    raw = "\x1f".join(str(f) for f in fields)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest()
+
+
+def unseen_turns(history: Iterable[Any], known: Collection[bytes], seen: int) -> List[Tuple[bytes, Dict[str, Any]]]:
+    """
+    (key, turn) for the turns of a sent history that are not stored yet.
+
+    known holds the keys of the retained history and seen the thread's length.
+    Only turns after the last stored one are candidates; anything older was
+    merged before. Turns without a ts are only recognised when the history is
+    laid out like the stored thread (a full resend, at least seen turns long,
+    and not a lone new turn); otherwise they are new. Fresh turns without a ts
+    are keyed by their position in the stored thread.
+    """
+    turns = [t for t in history if isinstance(t, dict)]
+    aligned = len(turns) >= seen and not (len(turns) == 1 and turns[0].get("ts") is None)
+    known = set(known)
+    start = 0
+    for i in range(len(turns) - 1, -1, -1):
+        if (aligned or turns[i].get("ts") is not None) and turn_key(turns[i], i) in known:
+            start = i + 1
+            break
+    fresh, batch = [], set()
+    for turn in turns[start:]:
+        key = turn_key(turn, seen + len(fresh))
+        if key not in batch:
+            batch.add(key)
+            fresh.append((key, turn))
+    return fresh
+
+
+def history_summary(history: List[Dict[str, Any]], seen: Optional[int] = None) -> Tuple[int, str]:
+    """(history_seen, history_last): number of turns and the last non-empty customer message."""
+    last = ""
+    for turn in reversed(history):
+        if not isinstance(turn, dict):
+            continue
+        if (turn.get("role") or "").lower() in ("customer", "user", ""):
+            text = (turn.get("text") or "").strip()
+            if text:
+                last = text
+                break
+    return (len(history) if seen is None else seen), last
+
+
+class Conversation:
+    """Stored state for one thread_key."""
+
+    __slots__ = ("history", "state", "keys", "seen", "size", "expires_at")
+
+    def __init__(self):
+        self.history: List[Dict[str, Any]] = []
+        self.state: Dict[str, Any] = {}
+        self.keys: List[bytes] = []  # turn keys, aligned with history
+        self.seen = 0  # turns merged over the thread's lifetime (history may be trimmed)
+        self.size = THREAD_OVERHEAD
+        self.expires_at = 0.0
+
+    def summary(self) -> Tuple[int, str]:
+        return history_summary(self.history, self.seen)
+
+    def as_state(self) -> Dict[str, Any]:
+        return {**self.state, "history": list(self.history)}
+
+
+class MemoryConversationStore:
+    """LRU + TTL conversation store bounded by thread count and estimated bytes."""
+
+    def __init__(
+        self,
+        ttl: float = 7 * 24 * 3600,
+        max_threads: int = 50_000,
+        max_turns: int = 200,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._threads: "OrderedDict[str, Conversation]" = OrderedDict()
+
+    async def get(self, thread_key: str) -> Optional[Conversation]:
+        return self._lookup(thread_key)
+
+    async def merge(
+        self,
+        thread_key: str,
+        state: Optional[Dict[str, Any]] = None,
+        new_turns: Iterable[Dict[str, Any]] = (),
+    ) -> Conversation:
+        """
+        Merge a request into the stored conversation and return it.
+
+        state: LeadState fields the client actually sent; its history is
+        de-duplicated against what is stored. new_turns are appended as-is
+        (e.g. the inbound message on /respond, which is new by definition).
+        """
+        conv = self._lookup(thread_key)
+        if conv is None:
+            conv = Conversation()
+            self._threads[thread_key] = conv
+            self.bytes += conv.size
+        state = state or {}
+        for field in STATE_FIELDS:
+            if state.get(field) is not None:
+                conv.state[field] = state[field]
+        for key, turn in unseen_turns(state.get("history") or (), conv.keys, conv.seen):
+            self._append(conv, turn, key)
+        for turn in new_turns:
+            self._append(conv, turn, turn_key(turn, conv.seen))
+        self._trim(conv)
+        conv.expires_at = time.monotonic() + self.ttl
+        self._evict()
+        return conv
+
+    async def delete(self, thread_key: str) -> None:
+        conv = self._threads.pop(thread_key, None)
+        if conv is not None:
+            self.bytes -= conv.size
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    def _lookup(self, thread_key: str) -> Optional[Conversation]:
+        conv = self._threads.get(thread_key)
+        if conv is None:
+            return None
+        if conv.expires_at < time.monotonic():
+            del self._threads[thread_key]
+            self.bytes -= conv.size
+            return None
+        self._threads.move_to_end(thread_key)
+        return conv
+
+    def _append(self, conv: Conversation, turn: Dict[str, Any], key: bytes) -> None:
+        conv.history.append(turn)
+        conv.keys.append(key)
+        conv.seen += 1
+        size = len(encode(turn)) + TURN_OVERHEAD
+        conv.size += size
+        self.bytes += size
+
+    def _trim(self, conv: Conversation) -> None:
+        excess = len(conv.history) - self.max_turns
+        if excess <= 0:
+            return
+        for turn in conv.history[:excess]:
+            size = len(encode(turn)) + TURN_OVERHEAD
+            conv.size -= size
+            self.bytes -= size
+        del conv.history[:excess]
+        del conv.keys[:excess]
+
+    def _evict(self) -> None:
+        while self._threads and (len(self._threads) > self.max_threads or self.bytes > self.max_bytes):
+            _, conv = self._threads.popitem(last=False)
+            self.bytes -= conv.size
+
+
+def build_conversation_store():
+    """Store configured from STORE_BACKEND / STORE_TTL / STORE_MAX_THREADS / STORE_MAX_TURNS / STORE_MAX_BYTES."""
+    backend = os.getenv("STORE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("STORE_TTL", str(7 * 24 * 3600)))
+    if backend == "redis":
+        from src.services.redis_backend import RedisConversationStore, get_redis
+
+        return RedisConversationStore(get_redis(), ttl=ttl, max_turns=int(os.getenv("STORE_MAX_TURNS", "200")))
+    if backend == "sql":
+        from src.services.database import get_database
+
+        return get_database().conversations
+    if backend != "memory":
+        logger.warning(f"Unknown STORE_BACKEND '{backend}', using memory")
+    return MemoryConversationStore(
+        ttl=ttl,
+        max_threads=int(os.getenv("STORE_MAX_THREADS", "50000")),
+        max_turns=int(os.getenv("STORE_MAX_TURNS", "200")),
+        max_bytes=int(os.getenv("STORE_MAX_BYTES", str(256 * 1024 * 1024))),
+    )
+
+
+_store = None
+
+
+def get_conversation_store():
+    """Process-wide conversation store, configured from the environment on first use."""
+    global _store
+    if _store is None:
+        _store = build_conversation_store()
+    return _store
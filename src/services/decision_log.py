@@ -0,0 +1,379 @@
+"""
+Write-behind persistence of decisions into decisions.db (lead_decisions)
+
+Endpoints hand each decision to record_decision()/record_plan(), which only
+does a non-blocking put onto a bounded queue. A dedicated writer thread owns
+the SQLite connection (WAL, synchronous=NORMAL) and drains the queue in
+batched transactions through one prepared INSERT. JSON encoding of lead_data
+also happens on that thread.
+
+If the queue is full the decision is dropped and counted rather than making
+the request wait. close() drains everything still queued (called on shutdown).
+
+Config: DECISIONS_DB (default decisions.db), DECISIONS_QUEUE_SIZE (10000),
+DECISIONS_BATCH_SIZE (500), DECISIONS_FLUSH_INTERVAL seconds (0.2).
+
+DecisionReader serves the history endpoints with keyset pagination on
+(created_at, id), so page N costs the same as page 1 however large the table.
+"""
+
+import base64
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def decisions_ddl(table: str) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table} ("
+        "id INTEGER NOT NULL, zoho_id VARCHAR(100) NOT NULL, channel VARCHAR(50) NOT NULL, "
+        "priority INTEGER NOT NULL, to_agent BOOLEAN NOT NULL, notes TEXT, lead_data TEXT, "
+        "created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME, PRIMARY KEY (id))"
+    )
+
+
+LEAD_DECISIONS_DDL = decisions_ddl("lead_decisions")
+
+# Monthly partitions written by decision_retention: lead_decisions_YYYY_MM, same schema and indexes
+PARTITION_RE = re.compile(r"^lead_decisions_(\d{4})_(\d{2})$")
+
+INSERT_DECISION = (
+    "INSERT INTO lead_decisions (zoho_id, channel, priority, to_agent, notes, lead_data, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+# Every list query is "filter, then newest first by (created_at, id)"; id is the rowid,
+# so each index below already carries it and covers the keyset seek on its own.
+# Index names are ix_<table>_<suffix>.
+DECISION_INDEXES = {
+    "zoho_id": ("zoho_id", "created_at"),
+    "created_at": ("created_at",),
+    "to_agent": ("to_agent", "created_at"),
+}
+
+
+def ensure_schema(conn: sqlite3.Connection, table: str = "lead_decisions") -> None:
+    """Create a decisions table (lead_decisions or a partition) and its indexes if missing."""
+    conn.execute(decisions_ddl(table))
+    for suffix, columns in DECISION_INDEXES.items():
+        name = f"ix_{table}_{suffix}"
+        existing = tuple(row[2] for row in conn.execute(f"PRAGMA index_info({name})"))
+        if existing and existing != columns:
+            # e.g. the original single-column ix_lead_decisions_zoho_id: widen it to include created_at
+            logger.info(f"Rebuilding index {name} on {columns}")
+            conn.execute(f"DROP INDEX {name}")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+
+def partition_tables(conn: sqlite3.Connection) -> List[str]:
+    """Monthly partition tables, newest first."""
+    names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'lead_decisions_%'")]
+    return sorted((n for n in names if PARTITION_RE.match(n)), reverse=True)
+
+
+def connect(path: str, **kwargs) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, **kwargs)
+    # Only takes effect on a new file; existing files need a one-off VACUUM (see decision_retention)
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    ensure_schema(conn)
+    conn.commit()
+    return conn
+
+
+def utc_timestamp() -> str:
+    # Same layout as SQLite's CURRENT_TIMESTAMP, plus milliseconds, so both sort together
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+_STOP = object()
+
+
+class DecisionWriter:
+    """Bounded queue + dedicated writer thread batching inserts into lead_decisions."""
+
+    def __init__(self, path: str = "decisions.db", max_queue: int = 10_000, batch_size: int = 500, flush_interval: float = 0.2):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> "DecisionWriter":
+        if not self.running:
+            self._thread = threading.Thread(target=self._run, name="decision-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, zoho_id: str, channel: str, priority: int, to_agent: bool, notes: str, lead_data: Dict[str, Any]) -> bool:
+        """Queue one decision; never blocks. Returns False if it was dropped."""
+        try:
+            self._queue.put_nowait((zoho_id, channel, priority, to_agent, notes, lead_data, utc_timestamp()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Decision queue full, dropped {self.dropped} decision(s) so far")
+            return False
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        conn = connect(self.path, check_same_thread=False)
+        try:
+            stopping = False
+            while not stopping:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                batch = []
+                while True:
+                    if item is _STOP:
+                        stopping = True  # close() queues this last; keep draining what is ahead of it
+                    else:
+                        batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        self._write(conn, batch)
+                        batch = []
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch) -> None:
+        rows = []
+        for zoho_id, channel, priority, to_agent, notes, lead_data, created_at in batch:
+            try:
+                rows.append((
+                    str(zoho_id or ""), str(channel or "Unknown"), int(priority), bool(to_agent), str(notes or ""),
+                    json.dumps(lead_data, default=str), created_at,
+                ))
+            except (TypeError, ValueError) as e:
+                self.dropped += 1
+                logger.error(f"Could not encode decision for {zoho_id}: {e}")
+        try:
+            # One transaction per batch; sqlite3 reuses the prepared INSERT across executemany rows
+            with conn:
+                conn.executemany(INSERT_DECISION, rows)
+            self.written += len(rows)
+            self.batches += 1
+        except sqlite3.Error as e:
+            self.dropped += len(rows)
+            logger.error(f"Failed to persist {len(rows)} decision(s): {e}")
+
+
+DECISION_COLUMNS = ("id", "zoho_id", "channel", "priority", "to_agent", "notes", "created_at", "lead_data")
+
+
+def encode_cursor(created_at: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Raises ValueError for anything that is not a cursor we issued."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return created_at, int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def normalize_timestamp(value: str) -> str:
+    """Accept ISO-8601 ('2024-01-15T14:30:00Z') and return the stored 'YYYY-MM-DD HH:MM:SS' layout."""
+    return value.strip().replace("T", " ").rstrip("Z")
+
+
+class DecisionReader:
+    """Read side of lead_decisions: one connection per thread, index-driven keyset pages."""
+
+    def __init__(self, path: str = "decisions.db"):
+        self.path = path
+        self._local = threading.local()
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._lock:
+                if not self._ready:
+                    connect(self.path).close()  # schema + indexes, once
+                    self._ready = True
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _keyset_sql(zoho_id, to_agent, since, until, cursor, table: str = "lead_decisions") -> Tuple[str, List[Any]]:
+        where, params = [], []
+        if zoho_id is not None:
+            where.append("zoho_id = ?")
+            params.append(zoho_id)
+        if to_agent is not None:
+            where.append("to_agent = ?")
+            params.append(int(bool(to_agent)))
+        if since:
+            where.append("created_at >= ?")
+            params.append(normalize_timestamp(since))
+        until = normalize_timestamp(until) if until else None
+        position = decode_cursor(cursor) if cursor else None
+        # Only one upper bound, so SQLite seeks straight to it rather than scanning down from `until`
+        if position is not None and (until is None or position[0] < until):
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(position)
+        elif until is not None:
+            where.append("created_at < ?")
+            params.append(until)
+        sql = f"SELECT id FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return sql + " ORDER BY created_at DESC, id DESC LIMIT ?", params
+
+    @staticmethod
+    def _tables(conn: sqlite3.Connection, since: Optional[str], upper: Optional[str]) -> List[str]:
+        """lead_decisions, then the partitions that can overlap [since, upper), newest first."""
+        tables = ["lead_decisions"]
+        for name in partition_tables(conn):
+            month = "-".join(PARTITION_RE.match(name).groups())
+            if since and month < normalize_timestamp(since)[:7]:
+                break
+            if upper and f"{month}-01" >= upper:
+                continue
+            tables.append(name)
+        return tables
+
+    def list(
+        self,
+        zoho_id: Optional[str] = None,
+        to_agent: Optional[bool] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_data: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of decisions, newest first, and the cursor for the next page (None at the end).
+
+        The ids are found by a seek on the covering index for the filter; only
+        the rows of this page are then read from the table. Monthly partitions
+        hold strictly older rows than lead_decisions, so they are read after it,
+        newest first, until the page is full.
+        """
+        conn = self._conn()
+        columns = DECISION_COLUMNS if include_data else DECISION_COLUMNS[:-1]
+        upper = decode_cursor(cursor)[0] if cursor else (normalize_timestamp(until) if until else None)
+        rows: List[tuple] = []
+        conn.execute("BEGIN")  # one snapshot across tables while retention moves rows
+        try:
+            for table in self._tables(conn, since, upper):
+                sql, params = self._keyset_sql(zoho_id, to_agent, since, until, cursor, table)
+                ids = [row[0] for row in conn.execute(sql, params + [limit - len(rows)])]
+                if ids:
+                    rows.extend(conn.execute(
+                        f"SELECT {', '.join(columns)} FROM {table} WHERE id IN ({','.join('?' * len(ids))}) "
+                        "ORDER BY created_at DESC, id DESC",
+                        ids,
+                    ).fetchall())
+                if len(rows) >= limit:
+                    break
+        finally:
+            conn.execute("COMMIT")
+        items = []
+        for row in rows:
+            item = dict(zip(columns, row))
+            item["to_agent"] = bool(item["to_agent"])
+            if include_data:
+                try:
+                    item["lead_data"] = json.loads(item["lead_data"]) if item["lead_data"] else None
+                except ValueError:
+                    pass
+            items.append(item)
+        next_cursor = encode_cursor(rows[-1][columns.index("created_at")], rows[-1][0]) if len(rows) == limit else None
+        return items, next_cursor
+
+    def explain(self, table: str = "lead_decisions", **filters) -> List[str]:
+        """EXPLAIN QUERY PLAN details for the keyset query list() would run against table."""
+        sql, params = self._keyset_sql(
+            filters.get("zoho_id"), filters.get("to_agent"), filters.get("since"), filters.get("until"), filters.get("cursor"), table
+        )
+        return [row[3] for row in self._conn().execute("EXPLAIN QUERY PLAN " + sql, params + [1])]
+
+
+_writer: Optional[DecisionWriter] = None
+_reader: Optional[DecisionReader] = None
+
+
+def get_decision_writer() -> DecisionWriter:
+    """Process-wide writer, configured from the environment on first use (not started)."""
+    global _writer
+    if _writer is None:
+        _writer = DecisionWriter(
+            path=os.getenv("DECISIONS_DB", "decisions.db"),
+            max_queue=int(os.getenv("DECISIONS_QUEUE_SIZE", "10000")),
+            batch_size=int(os.getenv("DECISIONS_BATCH_SIZE", "500")),
+            flush_interval=float(os.getenv("DECISIONS_FLUSH_INTERVAL", "0.2")),
+        )
+    return _writer
+
+
+def get_decision_reader() -> DecisionReader:
+    global _reader
+    if _reader is None:
+        _reader = DecisionReader(os.getenv("DECISIONS_DB", "decisions.db"))
+    return _reader
+
+
+def record_decision(zoho_id: str, channel: str, priority: int, to_agent: bool, notes: str, lead_data: Dict[str, Any]) -> None:
+    """Queue a decision for persistence; a no-op until the writer has been started (app startup)."""
+    writer = _writer
+    if writer is not None and writer.running:
+        writer.submit(zoho_id, channel, priority, to_agent, notes, lead_data)
+
+
+def record_plan(endpoint: str, lead: Dict[str, Any], plan: Dict[str, Any]) -> None:
+    """Queue the decision carried by an ActionPlan dict from /next_action, /next_action_flex or /respond."""
+    writer = _writer
+    if writer is None or not writer.running:
+        return
+    plan_meta = plan.get("metadata") or {}
+    writer.submit(
+        lead.get("zoho_id") or "",
+        plan.get("channel") or "Unknown",
+        plan_meta.get("priority", 5),
+        plan_meta.get("to_agent", False),
+        plan_meta.get("ai_notes") or "",
+        {"endpoint": endpoint, "lead": lead, "plan": plan},
+    )
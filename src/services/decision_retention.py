@@ -0,0 +1,282 @@
+"""
+Retention for lead_decisions: monthly partitions, compressed archives, incremental vacuum
+
+A background thread (started with the app when DECISIONS_RETENTION is on)
+keeps the hot lead_decisions table small:
+
+1. Partition: rows older than the DECISIONS_HOT_MONTHS most recent calendar
+   months move into lead_decisions_YYYY_MM tables (same schema and indexes,
+   ids preserved, so history pages and cursors keep working across them).
+2. Archive: partitions whose month ended more than DECISIONS_ARCHIVE_AFTER_DAYS
+   ago are written to DECISIONS_ARCHIVE_DIR/lead_decisions-YYYY-MM.jsonl.gz and
+   dropped. The file is a series of independent gzip members of ARCHIVE_BLOCK
+   rows; lead_decisions_archive_index maps zoho_id -> (archive, member offset),
+   so a lookup decompresses only the blocks holding that lead.
+3. Vacuum: freed pages are returned with PRAGMA incremental_vacuum in small steps.
+
+Every step is a short transaction of at most DECISIONS_RETENTION_CHUNK rows
+with a pause in between, so the decision writer never waits long for the lock.
+"""
+
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.services.decision_log import DECISION_COLUMNS, PARTITION_RE, connect, ensure_schema, partition_tables
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BLOCK = 1000
+VACUUM_STEP_PAGES = 256
+
+ARCHIVE_INDEX_DDL = (
+    "CREATE TABLE IF NOT EXISTS lead_decisions_archive_index ("
+    "zoho_id TEXT NOT NULL, archive TEXT NOT NULL, block_offset INTEGER NOT NULL, "
+    "PRIMARY KEY (zoho_id, archive, block_offset)) WITHOUT ROWID"
+)
+
+
+def month_start(dt: datetime, months_back: int = 0) -> datetime:
+    year, month = dt.year, dt.month - months_back
+    while month < 1:
+        year, month = year - 1, month + 12
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def next_month(dt: datetime) -> datetime:
+    return datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _ts(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class RetentionManager:
+    def __init__(
+        self,
+        path: str = "decisions.db",
+        archive_dir: str = "archive/decisions",
+        hot_months: int = 2,
+        archive_after_days: int = 365,
+        chunk: int = 2000,
+        pause: float = 0.05,
+        interval: float = 3600,
+    ):
+        self.path = path
+        self.archive_dir = archive_dir
+        self.hot_months = max(1, hot_months)
+        self.archive_after_days = archive_after_days
+        self.chunk = chunk
+        self.pause = pause
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._warned_vacuum = False
+
+    # ---- background loop ----
+    def start(self) -> "RetentionManager":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="decision-retention", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Decision retention run failed: {e}")
+            self._stop.wait(self.interval)
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        now = now or datetime.now(timezone.utc)
+        conn = connect(self.path, check_same_thread=False)
+        try:
+            conn.execute(ARCHIVE_INDEX_DDL)
+            conn.commit()
+            stats = {"partitioned": self.partition(conn, now), "archived": self.archive(conn, now)}
+            stats["vacuumed_pages"] = self.vacuum(conn)
+        finally:
+            conn.close()
+        if any(stats.values()):
+            logger.info(f"Decision retention: {stats}")
+        return stats
+
+    # ---- 1. partition ----
+    def partition(self, conn: sqlite3.Connection, now: datetime) -> int:
+        """Move rows older than the hot window into monthly tables, one short transaction per chunk."""
+        boundary = _ts(month_start(now, self.hot_months - 1))
+        moved = 0
+        while not self._stop.is_set():
+            rows = conn.execute(
+                "SELECT id, substr(created_at, 1, 7) FROM lead_decisions WHERE created_at < ? ORDER BY created_at LIMIT ?",
+                (boundary, self.chunk),
+            ).fetchall()
+            if not rows:
+                break
+            by_month: Dict[str, List[int]] = {}
+            for row_id, month in rows:
+                by_month.setdefault(month, []).append(row_id)
+            columns = ", ".join(DECISION_COLUMNS) + ", updated_at"
+            chunk_moved = 0
+            with conn:
+                for month, ids in by_month.items():
+                    table = "lead_decisions_" + (month or "").replace("-", "_")
+                    if not PARTITION_RE.match(table):
+                        logger.warning(f"Leaving {len(ids)} decision(s) with unparseable created_at in lead_decisions")
+                        continue
+                    marks = ",".join("?" * len(ids))
+                    ensure_schema(conn, table)
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO {table} ({columns}) SELECT {columns} FROM lead_decisions WHERE id IN ({marks})", ids
+                    )
+                    conn.execute(f"DELETE FROM lead_decisions WHERE id IN ({marks})", ids)
+                    chunk_moved += len(ids)
+            moved += chunk_moved
+            if len(rows) < self.chunk or not chunk_moved:
+                break
+            self._stop.wait(self.pause)
+        return moved
+
+    # ---- 2. archive ----
+    def archive(self, conn: sqlite3.Connection, now: datetime) -> int:
+        """Write partitions past the archive age to gzip JSONL plus lookup index, then drop them."""
+        cutoff = now - timedelta(days=self.archive_after_days)
+        archived = 0
+        for table in sorted(partition_tables(conn)):
+            if self._stop.is_set():
+                break
+            year, month = (int(x) for x in PARTITION_RE.match(table).groups())
+            if next_month(datetime(year, month, 1, tzinfo=timezone.utc)) > cutoff:
+                continue
+            archived += self._archive_partition(conn, table, f"{year:04d}-{month:02d}")
+        return archived
+
+    def _archive_partition(self, conn: sqlite3.Connection, table: str, month: str) -> int:
+        os.makedirs(self.archive_dir, exist_ok=True)
+        name = f"lead_decisions-{month}.jsonl.gz"
+        path = os.path.join(self.archive_dir, name)
+        tmp = path + ".tmp"
+        index_rows = set()
+        count = 0
+        last_id = -1
+        with open(tmp, "wb") as fh:
+            while True:
+                rows = conn.execute(
+                    f"SELECT {', '.join(DECISION_COLUMNS)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, ARCHIVE_BLOCK),
+                ).fetchall()
+                if not rows:
+                    break
+                offset = fh.tell()
+                lines = []
+                for row in rows:
+                    record = dict(zip(DECISION_COLUMNS, row))
+                    record["to_agent"] = bool(record["to_agent"])
+                    lines.append(json.dumps(record, default=str))
+                    index_rows.add((record["zoho_id"], name, offset))
+                fh.write(gzip.compress(("\n".join(lines) + "\n").encode("utf-8")))
+                count += len(rows)
+                last_id = rows[-1][0]
+                self._stop.wait(self.pause)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+        with conn:
+            conn.execute("DELETE FROM lead_decisions_archive_index WHERE archive = ?", (name,))
+            conn.executemany("INSERT OR IGNORE INTO lead_decisions_archive_index (zoho_id, archive, block_offset) VALUES (?, ?, ?)", index_rows)
+            conn.execute(f"DROP TABLE {table}")
+        logger.info(f"Archived {count} decision(s) from {table} to {path}")
+        return count
+
+    # ---- 3. vacuum ----
+    def vacuum(self, conn: sqlite3.Connection) -> int:
+        """Return free pages to the OS a few at a time; needs auto_vacuum=INCREMENTAL."""
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            if not self._warned_vacuum:
+                self._warned_vacuum = True
+                logger.warning(
+                    f"{self.path} was created without auto_vacuum=INCREMENTAL; run "
+                    "'python -m src.cli.retention --convert-vacuum' once (a full, blocking VACUUM) to enable it"
+                )
+            return 0
+        freed = 0
+        while not self._stop.is_set():
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free:
+                break
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+            freed += min(free, VACUUM_STEP_PAGES)
+            self._stop.wait(self.pause)
+        return freed
+
+    def convert_to_incremental_vacuum(self) -> None:
+        """One-off full VACUUM so an existing file can use incremental vacuum (blocks writers while it runs)."""
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+
+def lookup_archived(path: str, archive_dir: str, zoho_id: str) -> Iterator[Dict[str, Any]]:
+    """Archived decisions for one lead, decompressing only the gzip members that contain it."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(ARCHIVE_INDEX_DDL)
+        blocks = conn.execute(
+            "SELECT archive, block_offset FROM lead_decisions_archive_index WHERE zoho_id = ? ORDER BY archive, block_offset",
+            (zoho_id,),
+        ).fetchall()
+    finally:
+        conn.close()
+    for archive, offset in blocks:
+        with open(os.path.join(archive_dir, archive), "rb") as fh:
+            fh.seek(offset)
+            inflater = zlib.decompressobj(31)
+            data = b""
+            while not inflater.eof:
+                chunk = fh.read(64 * 1024)
+                if not chunk:
+                    break
+                data += inflater.decompress(chunk)
+        for line in data.decode("utf-8").splitlines():
+            record = json.loads(line)
+            if record["zoho_id"] == zoho_id:
+                yield record
+
+
+_manager: Optional[RetentionManager] = None
+
+
+def get_retention_manager() -> RetentionManager:
+    """Process-wide manager configured from DECISIONS_* env vars (not started)."""
+    global _manager
+    if _manager is None:
+        _manager = RetentionManager(
+            path=os.getenv("DECISIONS_DB", "decisions.db"),
+            archive_dir=os.getenv("DECISIONS_ARCHIVE_DIR", "archive/decisions"),
+            hot_months=int(os.getenv("DECISIONS_HOT_MONTHS", "2")),
+            archive_after_days=int(os.getenv("DECISIONS_ARCHIVE_AFTER_DAYS", "365")),
+            chunk=int(os.getenv("DECISIONS_RETENTION_CHUNK", "2000")),
+            interval=float(os.getenv("DECISIONS_RETENTION_INTERVAL", "3600")),
+        )
+    return _manager
+
+
+def retention_enabled() -> bool:
+    return os.getenv("DECISIONS_RETENTION", "true").lower() in ("1", "true", "yes")
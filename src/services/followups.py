@@ -0,0 +1,490 @@
+"""
+Durable follow-up scheduler
+
+Every plan says when to follow up (metadata.suggested_followup_in_hours, or
+the client's state.next_follow_up_at). Instead of n8n re-calling /next_action
+for every lead on a cron to find out who is due, the service records the due
+time and hands over due follow-ups itself:
+
+- schedule/cancel are O(log n): a min-heap of (due_at, zoho_id) with lazy
+  deletion (a dict holds each lead's current due time; stale heap entries are
+  skipped when popped). Rescheduling a lead simply pushes a new entry.
+- The heap is persisted in the followups table (FOLLOWUPS_DB, default
+  decisions.db) and rebuilt with heapify on startup. Writes are batched and
+  applied every FOLLOWUPS_FLUSH_INTERVAL seconds on a single worker thread,
+  which also serves reads, so they are always seen in order.
+- FOLLOWUPS_PRECOMPUTE_SECONDS (default 600) before a follow-up is due its
+  plan is computed in the background (LLM calls run at "low" priority), so
+  firing is only a read.
+- Due follow-ups are emitted in batches of FOLLOWUPS_BATCH_SIZE, either POSTed
+  to FOLLOWUPS_WEBHOOK_URL ({"followups": [...]}) or queued for
+  GET /api/v1/followups/due. A follow-up is removed from the table only once
+  delivered (at-least-once).
+- Every uvicorn worker loads the whole table, so a due row is claimed in the
+  table (owner, lease_until) before it fires: only the worker whose claim
+  succeeds delivers it. A crashed owner's claim lapses after
+  FOLLOWUPS_LEASE_SECONDS and the row fires again from the next worker that
+  loads it.
+
+A plan whose action is stop or handoff cancels the lead's pending follow-up.
+Opt in with FOLLOWUPS_ENABLED=true.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FOLLOWUPS_DDL = (
+    "CREATE TABLE IF NOT EXISTS followups ("
+    "zoho_id TEXT PRIMARY KEY, thread_key TEXT, due_at REAL NOT NULL, "
+    "lead TEXT, state TEXT, metadata TEXT, plan TEXT, planned_at REAL, owner TEXT, lease_until REAL)"
+)
+# Added after the first release; ALTERed into existing tables on open
+LEASE_COLUMNS = (("owner", "TEXT"), ("lease_until", "REAL"))
+FOLLOWUPS_INDEX = "CREATE INDEX IF NOT EXISTS ix_followups_due_at ON followups (due_at)"
+
+# A reschedule without a lead (e.g. from /respond) keeps the stored lead details
+UPSERT_FOLLOWUP = (
+    "INSERT INTO followups (zoho_id, thread_key, due_at, lead, state, metadata, plan, planned_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, NULL, NULL) ON CONFLICT (zoho_id) DO UPDATE SET "
+    "thread_key = COALESCE(excluded.thread_key, thread_key), due_at = excluded.due_at, "
+    "lead = COALESCE(excluded.lead, lead), state = COALESCE(excluded.state, state), "
+    "metadata = COALESCE(excluded.metadata, metadata), plan = NULL, planned_at = NULL, owner = NULL, lease_until = NULL"
+)
+
+# The row is still the occurrence this worker popped and nobody else holds a live claim on it
+CLAIM_FOLLOWUP = (
+    "UPDATE followups SET owner = ?, lease_until = ? WHERE zoho_id = ? AND due_at = ? "
+    "AND (owner IS NULL OR owner = ? OR lease_until < ?)"
+)
+
+STORE_OPS = {
+    "upsert": UPSERT_FOLLOWUP,
+    "delete": "DELETE FROM followups WHERE zoho_id = ?",
+    # only the occurrence that was delivered; a newer reschedule stays
+    "delivered": "DELETE FROM followups WHERE zoho_id = ? AND due_at = ?",
+    "plan": "UPDATE followups SET plan = ?, planned_at = ? WHERE zoho_id = ? AND due_at = ?",
+}
+
+STOP_ACTIONS = ("stop", "handoff")
+
+Planner = Callable[[Dict[str, Any], Dict[str, Any], Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def parse_due(value: Any) -> Optional[float]:
+    """ISO-8601 timestamp (naive = UTC) or epoch seconds -> epoch seconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def followup_due(plan: Dict[str, Any], state: Optional[Dict[str, Any]], now: Optional[float] = None) -> Optional[float]:
+    """When to follow up after this plan, or None to cancel any pending follow-up."""
+    if (plan.get("action") or "") in STOP_ACTIONS:
+        return None
+    metadata = plan.get("metadata") or {}
+    hours = metadata.get("suggested_followup_in_hours", metadata.get("suggested_follow_up_in_hours"))
+    now = time.time() if now is None else now
+    try:
+        if hours is not None and float(hours) > 0:
+            return now + float(hours) * 3600
+    except (TypeError, ValueError):
+        pass
+    due = parse_due((state or {}).get("next_follow_up_at"))
+    return due if due is not None and due > now else None
+
+
+async def default_planner(lead: Dict[str, Any], state: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan for a lead that has not replied since its last plan."""
+    from src.services.llm_service import plan_next_action
+
+    return await plan_next_action(lead, {**state, "last_outcome": "no_reply"}, {**metadata, "llm_priority": "low"})
+
+
+class _Store:
+    """The followups table; only ever used from the scheduler's single worker thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def open(self) -> List[Tuple[float, str]]:
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(FOLLOWUPS_DDL)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(followups)")}
+        for name, kind in LEASE_COLUMNS:
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE followups ADD COLUMN {name} {kind}")
+        self.conn.execute(FOLLOWUPS_INDEX)
+        self.conn.commit()
+        return self.conn.execute("SELECT due_at, zoho_id FROM followups").fetchall()
+
+    def apply(self, ops: List[Tuple]) -> None:
+        """Apply queued ops in order, one transaction, runs of the same op as one executemany."""
+        with self.conn:
+            for op, group in itertools.groupby(ops, key=lambda o: o[0]):
+                self.conn.executemany(STORE_OPS[op], (args for _, *args in group))
+
+    def claim(self, batch: List[Tuple[str, float]], owner: str, lease: float) -> List[Tuple[str, float]]:
+        """The (zoho_id, due_at) pairs of batch this owner now holds a lease on."""
+        now = time.time()
+        claimed = []
+        with self.conn:
+            for zoho_id, due in batch:
+                if self.conn.execute(CLAIM_FOLLOWUP, (owner, now + lease, zoho_id, due, owner, now)).rowcount:
+                    claimed.append((zoho_id, due))
+        return claimed
+
+    def read(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        rows = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for row in self.conn.execute(
+                f"SELECT zoho_id, thread_key, due_at, lead, state, metadata, plan FROM followups "
+                f"WHERE zoho_id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ):
+                rows[row[0]] = {
+                    "zoho_id": row[0],
+                    "thread_key": row[1],
+                    "due_at": row[2],
+                    "lead": json.loads(row[3]) if row[3] else {"zoho_id": row[0]},
+                    "state": json.loads(row[4]) if row[4] else {},
+                    "metadata": json.loads(row[5]) if row[5] else {},
+                    "plan": json.loads(row[6]) if row[6] else None,
+                }
+        return rows
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class FollowupScheduler:
+    def __init__(
+        self,
+        path: str = "decisions.db",
+        precompute_seconds: float = 600,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        webhook_url: Optional[str] = None,
+        max_ready: int = 10_000,
+        lease_seconds: float = 300,
+        planner: Optional[Planner] = None,
+        sink: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None,
+    ):
+        self.precompute_seconds = precompute_seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.webhook_url = webhook_url
+        self.max_ready = max_ready
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.planner = planner or default_planner
+        self.sink = sink
+        self.fired = 0
+        self.delivery_failures = 0
+        self._store = _Store(path)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._due: Dict[str, float] = {}
+        self._fire_heap: List[Tuple[float, str]] = []
+        self._pre_heap: List[Tuple[float, str, float]] = []  # (due_at - precompute, zoho_id, due_at)
+        self._ops: List[Tuple] = []
+        self._ready: Deque[Dict[str, Any]] = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ---- lifecycle ----
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> "FollowupScheduler":
+        if self.running:
+            return self
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="followups")
+        rows = await self._io(self._store.open)
+        self._load(rows)
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Follow-up scheduler started with {len(self._due)} pending follow-up(s)")
+        return self
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            await self._flush()
+            await self._io(self._store.close)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _load(self, rows: List[Tuple[float, str]]) -> None:
+        loaded = {zoho_id: due for due, zoho_id in rows}
+        loaded.update(self._due)  # scheduled before start(); their upserts are still pending
+        self._due = loaded
+        self._fire_heap = [(due, zoho_id) for zoho_id, due in loaded.items()]
+        heapq.heapify(self._fire_heap)
+        self._pre_heap = [(due - self.precompute_seconds, zoho_id, due) for zoho_id, due in loaded.items()] if self.precompute_seconds > 0 else []
+        heapq.heapify(self._pre_heap)
+
+    async def _io(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # ---- scheduling (called on the request path; no I/O) ----
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def due_at(self, zoho_id: str) -> Optional[float]:
+        return self._due.get(zoho_id)
+
+    def schedule(
+        self,
+        zoho_id: str,
+        due_at: float,
+        lead: Optional[Dict[str, Any]] = None,
+        state: Optional[Dict[str, Any]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        thread_key: Optional[str] = None,
+    ) -> None:
+        self._due[zoho_id] = due_at
+        heapq.heappush(self._fire_heap, (due_at, zoho_id))
+        if self.precompute_seconds > 0:
+            heapq.heappush(self._pre_heap, (due_at - self.precompute_seconds, zoho_id, due_at))
+        dumps = lambda v: json.dumps(v, default=str) if v else None  # noqa: E731
+        self._ops.append(("upsert", zoho_id, thread_key, due_at, dumps(lead), dumps(state), dumps(metadata)))
+        if len(self._fire_heap) > 2 * len(self._due) + 1024:
+            self._compact()  # stale entries from reschedules; amortised O(1) per schedule
+        if self._wake is not None and any(h and h[0][1] == zoho_id for h in (self._fire_heap, self._pre_heap)):
+            self._wake.set()  # earlier than anything else pending
+
+    def _compact(self) -> None:
+        self._fire_heap = [(due, z) for due, z in self._fire_heap if self._due.get(z) == due]
+        heapq.heapify(self._fire_heap)
+        self._pre_heap = [e for e in self._pre_heap if self._due.get(e[1]) == e[2]]
+        heapq.heapify(self._pre_heap)
+
+    def cancel(self, zoho_id: str) -> bool:
+        """Delete the lead's follow-up; True if this worker had it pending."""
+        # Always deleted: another worker may hold it in its heap
+        self._ops.append(("delete", zoho_id))
+        return self._due.pop(zoho_id, None) is not None
+
+    # ---- pull endpoint ----
+    def take_ready(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Hand out up to limit due follow-ups; they are deleted once taken."""
+        items = []
+        while self._ready and len(items) < limit:
+            item = self._ready.popleft()
+            items.append(item)
+            self._ops.append(("delivered", item["zoho_id"], item["due_ts"]))
+        if items and self._wake is not None:
+            self._wake.set()  # room in the ready queue, and flush the deletes soon
+        return [self._public(i) for i in items]
+
+    @property
+    def ready(self) -> int:
+        return len(self._ready)
+
+    # ---- background loop ----
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._flush()
+                await self._precompute()
+                await self._fire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Follow-up scheduler tick failed: {e}")
+            self._wake.clear()
+            # a timer rather than wait_for, which can swallow close()'s cancel if the event fires at the same time
+            timer = asyncio.get_running_loop().call_later(self._sleep_for(), self._wake.set)
+            try:
+                await self._wake.wait()
+            finally:
+                timer.cancel()
+
+    def _sleep_for(self) -> float:
+        now = time.time()
+        heaps = (self._pre_heap,) if self._pull_full() else (self._fire_heap, self._pre_heap)
+        nxt = [h[0][0] for h in heaps if h]
+        until = min(nxt) - now if nxt else self.flush_interval
+        return max(0.0, min(self.flush_interval, until))
+
+    def _pull_full(self) -> bool:
+        return self.webhook_url is None and self.sink is None and len(self._ready) >= self.max_ready
+
+    async def _flush(self) -> None:
+        if self._ops:
+            ops, self._ops = self._ops, []
+            await self._io(self._store.apply, ops)
+
+    def _pop_due(self, heap: List[Tuple], now: float, limit: int) -> List[Tuple[str, float]]:
+        """Pop up to limit entries keyed <= now; entries are (key, zoho_id[, due_at])."""
+        taken = []
+        while heap and heap[0][0] <= now and len(taken) < limit:
+            entry = heapq.heappop(heap)
+            zoho_id, due = entry[1], entry[2] if len(entry) > 2 else entry[0]
+            if self._due.get(zoho_id) == due:  # otherwise rescheduled or cancelled since
+                taken.append((zoho_id, due))
+        return taken
+
+    async def _precompute(self) -> None:
+        while self._pre_heap and self._pre_heap[0][0] <= time.time():
+            batch = self._pop_due(self._pre_heap, time.time(), self.batch_size)
+            if not batch:
+                continue
+            rows = await self._io(self._store.read, [z for z, _ in batch])
+            plans = await asyncio.gather(*(self._plan(rows[z]) for z, due in batch if z in rows and rows[z]["due_at"] == due))
+            for row, plan in plans:
+                if plan is not None and self._due.get(row["zoho_id"]) == row["due_at"]:
+                    self._ops.append(("plan", json.dumps(plan, default=str), time.time(), row["zoho_id"], row["due_at"]))
+            await self._flush()
+
+    async def _plan(self, row: Dict[str, Any]):
+        try:
+            return row, await self.planner(row["lead"], row["state"], row["metadata"])
+        except Exception as e:
+            logger.error(f"Follow-up plan for {row['zoho_id']} failed: {e}")
+            return row, None
+
+    async def _fire(self) -> None:
+        while self._fire_heap and self._fire_heap[0][0] <= time.time():
+            if self._pull_full():
+                return  # nobody is pulling; leave the rest in the heap until take_ready()
+            room = self.batch_size if self.webhook_url or self.sink else min(self.batch_size, self.max_ready - len(self._ready))
+            batch = self._pop_due(self._fire_heap, time.time(), room)
+            if not batch:
+                continue
+            for zoho_id, _ in batch:
+                del self._due[zoho_id]
+            await self._flush()  # the claim must see this worker's own pending upserts
+            batch = await self._io(self._store.claim, batch, self.owner, self.lease_seconds)
+            if not batch:
+                continue  # cancelled, rescheduled or claimed by another worker
+            rows = await self._io(self._store.read, [z for z, _ in batch])
+            items = []
+            for zoho_id, due in batch:
+                row = rows.get(zoho_id)
+                if row is None or row["due_at"] != due:
+                    continue
+                if row["plan"] is None:  # not precomputed (e.g. scheduled inside the window)
+                    row["plan"] = (await self._plan(row))[1]
+                items.append({**row, "due_ts": due})
+            self.fired += len(items)
+            await self._deliver(items)
+
+    async def _deliver(self, items: List[Dict[str, Any]]) -> None:
+        if not items:
+            return
+        if self.sink is None and self.webhook_url is None:
+            self._ready.extend(items)
+            return
+        try:
+            payload = [self._public(i) for i in items]
+            if self.sink is not None:
+                await self.sink(payload)
+            else:
+                await self._post(payload)
+        except Exception as e:
+            self.delivery_failures += 1
+            retry = time.time() + min(300.0, 5.0 * 2 ** min(self.delivery_failures, 6)) * random.uniform(0.5, 1.0)
+            logger.warning(f"Follow-up delivery of {len(items)} item(s) failed ({e}); retrying at {iso(retry)}")
+            for item in items:
+                if item["zoho_id"] not in self._due:  # not rescheduled meanwhile
+                    self.schedule(item["zoho_id"], retry)
+            return
+        self.delivery_failures = 0
+        self._ops.extend(("delivered", i["zoho_id"], i["due_ts"]) for i in items)
+
+    async def _post(self, payload: List[Dict[str, Any]]) -> None:
+        # pooled client and per-request retries of the webhook dispatcher
+        from src.services.webhooks import get_webhook_dispatcher
+
+        await get_webhook_dispatcher().deliver(self.webhook_url, {"followups": payload})
+
+    @staticmethod
+    def _public(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "zoho_id": item["zoho_id"],
+            "thread_key": item.get("thread_key"),
+            "due_at": iso(item["due_ts"]),
+            "lead": item.get("lead"),
+            "plan": item.get("plan"),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": len(self._due), "ready": len(self._ready), "fired": self.fired, "delivery_failures": self.delivery_failures}
+
+
+def record_followup(lead: Dict[str, Any], state: Optional[Dict[str, Any]], metadata: Optional[Dict[str, Any]], plan: Dict[str, Any]) -> None:
+    """Schedule (or cancel) the lead's follow-up from a plan; no-op unless the scheduler is running."""
+    scheduler = get_followup_scheduler()
+    zoho_id = (lead or {}).get("zoho_id")
+    if not scheduler.running or not zoho_id:
+        return
+    due = followup_due(plan, state)
+    if due is None:
+        scheduler.cancel(zoho_id)
+        return
+    state = {k: v for k, v in (state or {}).items() if k != "history"}  # the conversation store keeps history
+    thread_key = (plan.get("metadata") or {}).get("thread_key") or (metadata or {}).get("thread_key")
+    # /respond only knows the zoho_id: keep the lead details stored by the original plan
+    full_lead = lead if len(lead) > 1 else None
+    scheduler.schedule(zoho_id, due, full_lead, state, metadata or None, thread_key)
+
+
+_scheduler: Optional[FollowupScheduler] = None
+
+
+def followups_enabled() -> bool:
+    return os.getenv("FOLLOWUPS_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+def get_followup_scheduler() -> FollowupScheduler:
+    """Process-wide scheduler configured from FOLLOWUPS_* env vars (started by the app)."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FollowupScheduler(
+            path=os.getenv("FOLLOWUPS_DB", os.getenv("DECISIONS_DB", "decisions.db")),
+            precompute_seconds=float(os.getenv("FOLLOWUPS_PRECOMPUTE_SECONDS", "600")),
+            batch_size=int(os.getenv("FOLLOWUPS_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("FOLLOWUPS_FLUSH_INTERVAL", "0.5")),
+            webhook_url=os.getenv("FOLLOWUPS_WEBHOOK_URL") or None,
+            lease_seconds=float(os.getenv("FOLLOWUPS_LEASE_SECONDS", "300")),
+        )
+    return _scheduler
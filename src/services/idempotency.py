@@ -0,0 +1,133 @@
+"""
+Idempotency record stores
+
+A record is the first successful response to a request, kept for
+IDEMPOTENCY_TTL seconds so retries (e.g. n8n re-sending a timed-out HTTP node)
+can be replayed byte-for-byte instead of re-planning and re-messaging.
+
+Backends (IDEMPOTENCY_BACKEND):
+- memory: bounded LRU with TTL, per process
+- sqlite: shared by all workers on the host (IDEMPOTENCY_DB, default idempotency.db)
+- redis: shared by all workers everywhere (REDIS_URL); see src/services/redis_backend.py
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StoredResponse(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    fingerprint: str  # hash of the request that produced it
+
+
+class MemoryIdempotencyStore:
+    """LRU + TTL store bounded by max_entries."""
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, StoredResponse]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return response
+
+    async def put(self, key: str, response: StoredResponse) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, response)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteIdempotencyStore:
+    """SQLite-backed store so every worker on the host sees the same records."""
+
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str = "idempotency.db", ttl: float = 3600, max_entries: int = 100_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency_records ("
+            "key TEXT PRIMARY KEY, status INTEGER NOT NULL, headers TEXT NOT NULL, body BLOB NOT NULL, "
+            "fingerprint TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_idempotency_records_expires_at ON idempotency_records (expires_at)")
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, response: StoredResponse) -> None:
+        await asyncio.to_thread(self._put, key, response)
+
+    def _get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, fingerprint FROM idempotency_records WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(row[1])]
+        return StoredResponse(row[0], headers, bytes(row[2]), row[3])
+
+    def _put(self, key: str, response: StoredResponse) -> None:
+        headers = json.dumps([(k.decode("latin-1"), v.decode("latin-1")) for k, v in response.headers])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO idempotency_records (key, status, headers, body, fingerprint, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, response.status, headers, response.body, response.fingerprint, time.time() + self.ttl),
+            )
+            self._puts += 1
+            if self._puts % self.PRUNE_EVERY == 0:
+                self._prune()
+
+    def _prune(self) -> None:
+        self._conn.execute("DELETE FROM idempotency_records WHERE expires_at < ?", (time.time(),))
+        self._conn.execute(
+            "DELETE FROM idempotency_records WHERE key IN ("
+            "SELECT key FROM idempotency_records ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+def build_idempotency_store():
+    """Store configured from IDEMPOTENCY_BACKEND / IDEMPOTENCY_TTL / IDEMPOTENCY_MAX_ENTRIES."""
+    backend = os.getenv("IDEMPOTENCY_BACKEND", "memory").lower()
+    ttl = float(os.getenv("IDEMPOTENCY_TTL", "3600"))
+    max_entries = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+    if backend == "sqlite":
+        return SqliteIdempotencyStore(os.getenv("IDEMPOTENCY_DB", "idempotency.db"), ttl, max_entries)
+    if backend == "redis":
+        from src.services.redis_backend import RedisIdempotencyStore, get_redis
+
+        return RedisIdempotencyStore(get_redis(), ttl)
+    if backend != "memory":
+        logger.warning(f"Unknown IDEMPOTENCY_BACKEND '{backend}', using memory")
+    return MemoryIdempotencyStore(ttl, max_entries)
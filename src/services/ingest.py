@@ -0,0 +1,235 @@
+"""
+Zoho webhook ingestion
+
+Zoho fires several webhooks for a single lead edit, and each used to become a
+full n8n -> /next_action round trip. The ingestor takes them directly:
+
+- accept() does no I/O and no planning, so the endpoint acks at once.
+- Deliveries already seen, keyed by (zoho_id, Modified_Time), are dropped.
+  The set holds the last INGEST_DEDUPE_SIZE keys and evicts the oldest first.
+- Edits to the same lead are coalesced, with later fields winning. A lead is
+  planned once no edit has arrived for INGEST_DEBOUNCE seconds, and at most
+  INGEST_MAX_DELAY seconds after its first edit.
+- Debounced leads go through a bounded asyncio queue (INGEST_QUEUE_SIZE) to
+  INGEST_WORKERS worker tasks, which run the handler (planning). When the
+  queue is full a lead waits another debounce window.
+- Once INGEST_MAX_PENDING leads are waiting, accept() refuses new ones, and
+  the endpoint answers 503 so Zoho backs off.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Zoho API field name -> lead key used by the planner
+ZOHO_LEAD_FIELDS = {
+    "id": "zoho_id",
+    "First_Name": "first_name",
+    "Full_Name": "name",
+    "Email": "email",
+    "Phone": "phone",
+    "Mobile": "phone",
+    "Lead_Source": "source",
+    "City": "city",
+    "Country": "country",
+    "Description": "notes",
+    "Preferred_Channel": "preferred_channel",
+    "Interests": "interests",
+    "Thread_Key": "thread_key",
+}
+# Mapped keys the planner reads from LeadState, not from the lead
+STATE_KEYS = ("preferred_channel", "last_outcome")
+MODIFIED_KEYS = ("Modified_Time", "modified_time", "Last_Activity_Time")
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def lead_from_webhook(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Zoho record (API names) or an already snake_case lead -> planner lead dict."""
+    lead: Dict[str, Any] = {}
+    for key, value in payload.items():
+        if value is None or value == "":
+            continue
+        target = ZOHO_LEAD_FIELDS.get(key, key if key.islower() else None)
+        if target and target not in lead:
+            lead[target] = value
+    if "zoho_id" in lead:
+        lead["zoho_id"] = str(lead["zoho_id"])
+    if isinstance(lead.get("interests"), str):
+        lead["interests"] = [i.strip() for i in lead["interests"].split(";") if i.strip()]
+    return lead
+
+
+class Deduper:
+    """Bounded set of recently seen keys; the oldest key is evicted first."""
+
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self._seen: Dict[Hashable, None] = {}
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def seen(self, key: Hashable) -> bool:
+        """True if key was already seen; otherwise remembers it."""
+        if key in self._seen:
+            return True
+        self._seen[key] = None
+        if len(self._seen) > self.max_size:
+            del self._seen[next(iter(self._seen))]
+        return False
+
+    def forget(self, key: Hashable) -> None:
+        self._seen.pop(key, None)
+
+
+class _Pending:
+    __slots__ = ("payload", "first_seen", "timer", "edits")
+
+    def __init__(self, payload: Dict[str, Any], now: float):
+        self.payload = payload
+        self.first_seen = now
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.edits = 1
+
+
+class WebhookIngestor:
+    def __init__(
+        self,
+        handler: Handler,
+        debounce: float = 2.0,
+        max_delay: float = 10.0,
+        queue_size: int = 1000,
+        workers: int = 4,
+        dedupe_size: int = 100_000,
+        max_pending: int = 10_000,
+    ):
+        self.handler = handler
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.workers = workers
+        self.max_pending = max_pending
+        self.dedupe = Deduper(dedupe_size)
+        self.queue: Optional[asyncio.Queue] = None
+        self.queue_size = queue_size
+        self.counts = {"accepted": 0, "duplicate": 0, "coalesced": 0, "refused": 0, "planned": 0, "failed": 0, "requeued": 0}
+        self._pending: Dict[str, _Pending] = {}
+        self._tasks: list = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> "WebhookIngestor":
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self.queue = asyncio.Queue(self.queue_size)
+            self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        return self
+
+    async def close(self) -> None:
+        for entry in self._pending.values():
+            if entry.timer is not None:
+                entry.timer.cancel()
+        if self._pending:
+            logger.warning(f"Dropping {len(self._pending)} debounced Zoho webhook(s) on shutdown")
+        self._pending.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ---- ingest (request path; no awaits) ----
+    def accept(self, payload: Dict[str, Any], fingerprint: Hashable = None) -> str:
+        """Take one webhook delivery: 'accepted', 'coalesced', 'duplicate' or 'refused'."""
+        zoho_id = str(payload.get("zoho_id") or payload.get("id") or "")
+        if not zoho_id:
+            raise ValueError("webhook payload has no id / zoho_id")
+        modified = next((payload[k] for k in MODIFIED_KEYS if payload.get(k)), None)
+        key = (zoho_id, modified if modified is not None else fingerprint)
+        if self.dedupe.seen(key):
+            self.counts["duplicate"] += 1
+            return "duplicate"
+
+        now = time.monotonic()
+        entry = self._pending.get(zoho_id)
+        if entry is None:
+            if len(self._pending) >= self.max_pending:
+                # Zoho retries a refused delivery; that retry must not be dropped as a duplicate
+                self.dedupe.forget(key)
+                self.counts["refused"] += 1
+                return "refused"
+            entry = self._pending[zoho_id] = _Pending(dict(payload), now)
+            outcome = "accepted"
+        else:
+            entry.payload.update(payload)
+            entry.edits += 1
+            entry.timer.cancel()
+            outcome = "coalesced"
+        self.counts[outcome] += 1
+        # trailing debounce, but never later than max_delay after the first edit
+        delay = min(self.debounce, entry.first_seen + self.max_delay - now)
+        entry.timer = asyncio.get_running_loop().call_later(max(0.0, delay), self._release, zoho_id)
+        return outcome
+
+    def _release(self, zoho_id: str) -> None:
+        entry = self._pending.get(zoho_id)
+        if entry is None:
+            return
+        try:
+            self.queue.put_nowait((zoho_id, entry.payload, entry.edits))
+        except asyncio.QueueFull:
+            # workers are behind: keep it pending (edits keep coalescing) and try again later
+            self.counts["requeued"] += 1
+            entry.first_seen = time.monotonic()
+            entry.timer = asyncio.get_running_loop().call_later(self.debounce, self._release, zoho_id)
+            return
+        del self._pending[zoho_id]
+
+    # ---- workers ----
+    async def _work(self) -> None:
+        while True:
+            zoho_id, payload, edits = await self.queue.get()
+            try:
+                await self.handler(payload)
+                self.counts["planned"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counts["failed"] += 1
+                logger.error(f"Planning from Zoho webhook for {zoho_id} ({edits} edit(s)) failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counts,
+            "pending": len(self._pending),
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "dedupe_keys": len(self.dedupe),
+        }
+
+
+def ingest_enabled() -> bool:
+    return os.getenv("ZOHO_INGEST_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+def build_ingestor(handler: Handler) -> WebhookIngestor:
+    """Ingestor configured from INGEST_* env vars."""
+    return WebhookIngestor(
+        handler,
+        debounce=float(os.getenv("INGEST_DEBOUNCE", "2.0")),
+        max_delay=float(os.getenv("INGEST_MAX_DELAY", "10.0")),
+        queue_size=int(os.getenv("INGEST_QUEUE_SIZE", "1000")),
+        workers=int(os.getenv("INGEST_WORKERS", "4")),
+        dedupe_size=int(os.getenv("INGEST_DEDUPE_SIZE", "100000")),
+        max_pending=int(os.getenv("INGEST_MAX_PENDING", "10000")),
+    )
@@ -0,0 +1,156 @@
+"""
+Rule-based inbound intent classifier for /respond
+
+Maps common customer replies onto LeadState.last_outcome values so /respond can
+answer them deterministically instead of asking the LLM what to do:
+
+    opt_out     "stop", "unsubscribe", "not interested"   -> action "stop"
+    wants_call  "call me tomorrow", "can someone ring me"  -> action "handoff"
+    busy        "busy right now", "get back to you later"  -> action "schedule_followup"
+    asked_price "how much is the Balmoral cot"             -> deterministic send_message
+
+Patterns are compiled once at import. Rules are checked in precedence order
+(opt-out always wins) and each carries a confidence; only matches at or above
+INTENT_MIN_CONFIDENCE short-circuit the planner. Low-precision rules name an
+"unless" pattern: "no thanks, how much is it?" is a question, "don't call me
+until Friday" a deferral and "don't email me, WhatsApp is better" a channel
+preference, none of them an opt-out; those go to the planner instead.
+Call requests preceded by a negation ("don't ring me") never count as one.
+"""
+
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+OPT_OUT = "opt_out"
+WANTS_CALL = "wants_call"
+BUSY = "busy"
+ASKED_PRICE = "asked_price"
+OUTCOMES = (OPT_OUT, WANTS_CALL, BUSY, ASKED_PRICE)
+
+# The message still wants something: don't read it as an opt-out
+_QUESTION_OR_BUYING = r"\?|\b(?:how|when|what|where|which|price|prices|pricing|cost|costs|quote|deliver(?:y|ed)?|arrive|available|in stock)\b"
+# "don't call me until next week" / "don't email me, WhatsApp is better": a deferral or
+# a channel preference, not an opt-out
+_DEFERRAL_OR_SWITCH = (
+    r"\b(?:until|till|til|before|unless)\b|\b(?:instead|rather|prefer|preferably)\b"
+    r"|\b(?:whatsapp|e-?mail|text|sms|phone|call|instagram|dm|message)s?\b[^.!?]*\b(?:better|easier|best|fine|ok|okay)\b"
+)
+# "not interested in the wardrobe but how much is the cot?" declines one thing only
+_PARTIAL_DECLINE = r"\bnot interested in\b.*\b(?:but|though|however|just)\b|\bnot interested\b.*\?"
+# "can we talk about the price" is a price question, not a call request
+_BUYING = r"\b(?:price|prices|pricing|cost|costs|quote|how much)\b"
+# "don't / do not / never / no (need to) call me"
+_NEGATED = re.compile(r"\b(?:don['’]?t|do not|never|no)\s+(?:\w+\s+){0,2}$", re.IGNORECASE)
+
+# (outcome, [(pattern, confidence[, unless]), ...]) in precedence order;
+# a rule with an "unless" pattern does not fire when that pattern also matches
+_RULES: List[Tuple[str, List[Tuple]]] = [
+    (OPT_OUT, [
+        (r"^\W*(?:stop|stopall|unsubscribe|cancel|quit|end|opt[\s-]?out)\W*$", 0.99),
+        (r"\b(?:unsubscribe|opt(?:\s|-)?out|remove me|take me off)\b", 0.95),
+        (r"\b(?:stop|quit) (?:messaging|texting|emailing|contacting|sending)\b", 0.95, _DEFERRAL_OR_SWITCH),
+        (r"\b(?:do not|don['’]?t|never) (?:contact|message|email|text|call|phone|ring) me\b", 0.95, _DEFERRAL_OR_SWITCH),
+        (r"\bnot interested\b", 0.9, _PARTIAL_DECLINE),
+        (r"\bno longer (?:interested|need)", 0.9),
+        (r"\bno,? thank(?:s| you)\b", 0.8, _QUESTION_OR_BUYING),
+        (r"\balready (?:bought|purchased|ordered|found)\b", 0.8, _QUESTION_OR_BUYING),
+    ]),
+    (WANTS_CALL, [
+        (r"\b(?:call|ring|phone) me\b", 0.95),
+        (r"\bgive me a (?:call|ring|bell)\b", 0.95),
+        (r"\bcan (?:you|someone|we) (?:call|ring|phone)\b", 0.9),
+        (r"\bcan (?:you|someone|we) (?:speak|talk)\b", 0.9, _BUYING),
+        (r"\b(?:speak|talk) (?:to|with) (?:someone|a person|a human|an agent|sabrina)\b", 0.9),
+        (r"\bprefer (?:a )?(?:call|phone call|to talk)\b", 0.85),
+    ]),
+    (BUSY, [
+        (r"\b(?:not a good time|bad time|in a meeting|driving)\b", 0.9),
+        (r"\b(?:busy|swamped)\b", 0.85),
+        (r"\b(?:get back to you|come back to you|another time|catch up later|talk later)\b", 0.85),
+        (r"\b(?:later|next week|tomorrow|after the weekend)\b", 0.6),
+    ]),
+    (ASKED_PRICE, [
+        (r"\bhow much\b", 0.95),
+        (r"\b(?:price|prices|pricing|priced|cost|costs|quote|quotation)\b", 0.9),
+        (r"[£$€]\s?\d", 0.7),
+    ]),
+]
+
+_COMPILED = [
+    (outcome, [(re.compile(rule[0], re.IGNORECASE), rule[1], re.compile(rule[2], re.IGNORECASE) if len(rule) > 2 else None) for rule in patterns])
+    for outcome, patterns in _RULES
+]
+
+_FOLLOWUP_HOURS = [
+    (re.compile(r"\b(?:tonight|this evening|later today)\b", re.IGNORECASE), 4),
+    (re.compile(r"\btomorrow\b", re.IGNORECASE), 24),
+    (re.compile(r"\b(?:after the weekend|monday)\b", re.IGNORECASE), 72),
+    (re.compile(r"\bnext week\b", re.IGNORECASE), 168),
+    (re.compile(r"\bnext month\b", re.IGNORECASE), 720),
+]
+
+try:
+    MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.8"))
+except ValueError:
+    MIN_CONFIDENCE = 0.8
+
+
+class IntentMatch(NamedTuple):
+    outcome: Optional[str]
+    confidence: float
+    pattern: Optional[str] = None
+
+    @property
+    def confident(self) -> bool:
+        return self.outcome is not None and self.confidence >= MIN_CONFIDENCE
+
+
+_NO_MATCH = IntentMatch(None, 0.0)
+
+# Coverage counters: how many inbound messages avoided the LLM path
+_stats: Dict[str, int] = {"total": 0, "confident": 0}
+
+
+def classify(text: str) -> IntentMatch:
+    """Return the highest-precedence match for an inbound message (no counters)."""
+    if not text:
+        return _NO_MATCH
+    for outcome, patterns in _COMPILED:
+        best = None
+        for regex, confidence, unless in patterns:
+            if best is not None and confidence <= best.confidence:
+                continue
+            m = regex.search(text)
+            if m is None or (unless is not None and unless.search(text)):
+                continue
+            if outcome == WANTS_CALL and _NEGATED.search(text, 0, m.start()):
+                continue
+            best = IntentMatch(outcome, confidence, regex.pattern)
+        if best is not None:
+            return best
+    return _NO_MATCH
+
+
+def classify_inbound(text: str) -> IntentMatch:
+    """classify() plus coverage accounting; used on the /respond request path."""
+    match = classify(text)
+    _stats["total"] += 1
+    if match.confident:
+        _stats["confident"] += 1
+        _stats[match.outcome] = _stats.get(match.outcome, 0) + 1
+    return match
+
+
+def followup_hours(text: str, default: int = 48) -> int:
+    """Translate "tomorrow"/"next week" style deferrals into a follow-up delay."""
+    for regex, hours in _FOLLOWUP_HOURS:
+        if regex.search(text or ""):
+            return hours
+    return default
+
+
+def classifier_stats() -> Dict[str, float]:
+    """Coverage = share of inbound messages answered without the LLM."""
+    total = _stats["total"]
+    return {**_stats, "coverage": round(_stats["confident"] / total, 4) if total else 0.0}
@@ -0,0 +1,201 @@
+"""
+BM25 inverted index over the knowledge pack
+
+Built once when the knowledge pack is (re)loaded, then queried in-process by the
+deterministic planner to attach grounded snippets (prices, dimensions, lead
+times) without an LLM call.
+
+Layout:
+- terms are stemmed, mapped through SYNONYMS and interned to integer ids
+- BM25 weights are query-independent, so each posting stores its final weight
+- postings are array-backed (doc ids as uint32, weights as float32) and sorted
+  by weight, so a query only walks the highest-impact postings of each term
+
+Expected pack shape: {"documents": [{"id", "title", "text", "price", "dimensions", "lead_time", ...}]}
+or a bare list of such documents.
+"""
+
+import heapq
+import math
+import re
+import sys
+from array import array
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.services.packs import get_pack, register_indexer
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in is it me my of on or our "
+    "so that the their there this to us we what when where which will with would you your".split()
+)
+
+# Applied after stemming so plurals collapse first (cribs -> crib -> cot)
+SYNONYMS = {
+    "crib": "cot",
+    "cradle": "cot",
+    "cotbed": "cot",
+    "bassinet": "moses",
+    "chest": "dresser",
+    "drawer": "dresser",
+    "armoire": "wardrobe",
+    "cost": "price",
+    "pric": "price",
+    "much": "price",
+    "size": "dimension",
+    "measurement": "dimension",
+    "big": "dimension",
+    "deliver": "delivery",
+    "dispatch": "delivery",
+    "ship": "delivery",
+    "colour": "color",
+    "nursery": "room",
+}
+
+# Structured fields surfaced alongside each snippet
+FACT_FIELDS = ("price", "dimensions", "lead_time", "url")
+
+SNIPPET_CHARS = 200
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Light suffix-stripping stemmer (plural/verb endings only; good enough for product copy)."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            base = word[: -len(suffix)]
+            if len(base) > 2 and base[-1] == base[-2] and base[-1] not in "lsz":
+                base = base[:-1]
+            return base
+    if word.endswith(("ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+
+def analyze(text: str) -> List[str]:
+    """Tokenize, drop stopwords, stem and canonicalise synonyms."""
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        term = stem(token)
+        terms.append(SYNONYMS.get(term, term))
+    return terms
+
+
+class KnowledgeIndex:
+    """Memory-compact BM25 index with impact-ordered postings."""
+
+    def __init__(self, documents: Iterable[Dict[str, Any]], k1: float = 1.2, b: float = 0.75):
+        self.term_ids: Dict[str, int] = {}
+        self.titles: List[str] = []
+        self.snippets: List[str] = []
+        self.facts: List[Optional[Dict[str, Any]]] = []
+        self.doc_keys: List[Any] = []
+
+        doc_lengths = array("I")
+        raw_postings: List[Dict[int, int]] = []  # term id -> {doc id: tf} during build only
+        for doc in documents:
+            if not isinstance(doc, dict):
+                continue
+            doc_id = len(self.titles)
+            title = str(doc.get("title") or "")
+            text = str(doc.get("text") or doc.get("body") or "")
+            self.titles.append(sys.intern(title))
+            self.snippets.append(text[:SNIPPET_CHARS])
+            self.doc_keys.append(doc.get("id", doc_id))
+            facts = {f: doc[f] for f in FACT_FIELDS if doc.get(f) not in (None, "")}
+            self.facts.append(facts or None)
+
+            # Titles count twice: they are short and name the product
+            terms = analyze(f"{title} {title} {text} {' '.join(str(v) for v in facts.values())}")
+            doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                tid = self.term_ids.get(term)
+                if tid is None:
+                    tid = self.term_ids[sys.intern(term)] = len(raw_postings)
+                    raw_postings.append({})
+                raw_postings[tid][doc_id] = tf
+
+        n_docs = len(self.titles)
+        avg_len = (sum(doc_lengths) / n_docs) if n_docs else 0.0
+        self.n_docs = n_docs
+        self.post_docs: List[array] = []
+        self.post_weights: List[array] = []
+        for bucket in raw_postings:
+            df = len(bucket)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scored = []
+            for doc_id, tf in bucket.items():
+                norm = k1 * (1 - b + b * doc_lengths[doc_id] / avg_len) if avg_len else k1
+                scored.append((idf * tf * (k1 + 1) / (tf + norm), doc_id))
+            scored.sort(reverse=True)
+            self.post_docs.append(array("I", (d for _, d in scored)))
+            self.post_weights.append(array("f", (w for w, _ in scored)))
+
+    @classmethod
+    def from_pack(cls, data: Any) -> "KnowledgeIndex":
+        documents = data.get("documents", []) if isinstance(data, dict) else data
+        return cls(documents or [])
+
+    def search(self, query: str, k: int = 3, max_postings: int = 256) -> List[Dict[str, Any]]:
+        """
+        Top-k documents for a free-text query.
+
+        Args:
+            query: customer text
+            k: number of snippets to return
+            max_postings: per-term budget of impact-ordered postings to score;
+                bounds latency on very common terms at a small recall cost
+
+        Returns:
+            List of {id, title, snippet, score, **facts} ordered by score
+        """
+        scores: Dict[int, float] = {}
+        for term in set(analyze(query)):
+            tid = self.term_ids.get(term)
+            if tid is None:
+                continue
+            get = scores.get
+            for d, w in zip(self.post_docs[tid][:max_postings], self.post_weights[tid][:max_postings]):
+                scores[d] = get(d, 0.0) + w
+
+        results = []
+        for doc_id, score in heapq.nlargest(k, scores.items(), key=lambda item: item[1]):
+            hit = {
+                "id": self.doc_keys[doc_id],
+                "title": self.titles[doc_id],
+                "snippet": self.snippets[doc_id],
+                "score": round(score, 4),
+            }
+            if self.facts[doc_id]:
+                hit.update(self.facts[doc_id])
+            results.append(hit)
+        return results
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint of the postings arrays and term dictionary."""
+        postings = sum(a.buffer_info()[1] * a.itemsize for a in self.post_docs + self.post_weights)
+        return postings + sys.getsizeof(self.term_ids)
+
+
+register_indexer("knowledge", KnowledgeIndex.from_pack)
+
+
+def search_knowledge(text: str, k: int = 3) -> List[Dict[str, Any]]:
+    """Search the loaded knowledge pack; empty when the pack is unavailable."""
+    if not text:
+        return []
+    pack = get_pack("knowledge")
+    if pack is None or not isinstance(pack.index, KnowledgeIndex):
+        return []
+    return pack.index.search(text, k)
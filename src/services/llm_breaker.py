@@ -0,0 +1,117 @@
+"""
+Circuit breaker for OpenAI calls
+
+When OpenAI is failing, every planning request otherwise waits for its own
+timeout before falling back to the deterministic plan. The breaker trips
+("open") after LLM_BREAKER_FAILURES consecutive failures, or when at least
+LLM_BREAKER_ERROR_RATE of the calls in the last LLM_BREAKER_WINDOW seconds
+failed (once there are LLM_BREAKER_MIN_CALLS of them). While it is open, callers
+skip OpenAI and use their fallback straight away. After LLM_BREAKER_COOLDOWN
+seconds a single trial call is let through ("half_open"). If it succeeds the
+breaker closes again; if it fails the breaker reopens.
+
+State and recent error rate are reported by the readiness endpoint.
+"""
+
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBreaker:
+    def __init__(
+        self,
+        failures: int = 5,
+        error_rate: float = 0.5,
+        min_calls: int = 20,
+        window: float = 60.0,
+        cooldown: float = 30.0,
+    ):
+        self.failures = failures
+        self.max_error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.skipped = 0
+        self.opened = 0
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._trial_at: Optional[float] = None  # when the half-open trial call was let through
+        self._calls: Deque[Tuple[float, bool]] = deque()
+
+    def allow(self) -> bool:
+        """Whether to attempt an OpenAI call now; callers must record() its outcome."""
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open" and now - self._opened_at >= self.cooldown:
+            self.state = "half_open"
+            self._trial_at = None
+        # one trial at a time; a trial that never reported back is replaced after a cooldown
+        if self.state == "half_open" and (self._trial_at is None or now - self._trial_at >= self.cooldown):
+            self._trial_at = now
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, ok: bool) -> None:
+        now = time.monotonic()
+        self._calls.append((now, ok))
+        self._trim(now)
+        if ok:
+            self._consecutive = 0
+            if self.state != "closed":
+                logger.info("LLM circuit breaker closed")
+            self.state = "closed"
+            return
+        self._consecutive += 1
+        if self.state == "half_open" or self._consecutive >= self.failures or (
+            len(self._calls) >= self.min_calls and self.error_rate() >= self.max_error_rate
+        ):
+            if self.state != "open":
+                self.opened += 1
+                logger.warning(f"LLM circuit breaker open for {self.cooldown:.0f}s (error rate {self.error_rate():.0%})")
+            self.state = "open"
+            self._opened_at = now
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+    def error_rate(self) -> float:
+        self._trim(time.monotonic())
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, ok in self._calls if not ok) / len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 4),
+            "calls": len(self._calls),
+            "consecutive_failures": self._consecutive,
+            "skipped": self.skipped,
+            "opened": self.opened,
+        }
+
+
+_breaker: Optional[LLMBreaker] = None
+
+
+def get_llm_breaker() -> LLMBreaker:
+    """Process-wide breaker configured from LLM_BREAKER_* env vars."""
+    global _breaker
+    if _breaker is None:
+        _breaker = LLMBreaker(
+            failures=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            error_rate=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+            min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "20")),
+            window=float(os.getenv("LLM_BREAKER_WINDOW", "60")),
+            cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+        )
+    return _breaker
@@ -0,0 +1,218 @@
+"""
+Priority scheduling of LLM capacity
+
+At most LLM_CONCURRENCY OpenAI calls run at once. Callers beyond that wait in
+a start-time fair queue instead of first come first served:
+
+- every (class, source) pair is a flow; a flow's share of capacity is its
+  class weight (LLM_WEIGHTS, default high=8, normal=3, low=1), so a hot
+  WhatsApp/Phone lead is not stuck behind a bulk re-engagement batch, and two
+  sources in the same class split that class' share evenly
+- low-weight flows still get their share while high ones are busy, and any
+  request that has waited LLM_MAX_WAIT seconds is dispatched next regardless
+  of its tag, so nothing starves
+
+Classes come from the deterministic plan (llm_class): priority >= 8 or a
+handoff is "high", priority >= 6 "normal", everything else "low".
+metadata.llm_priority overrides it (e.g. "low" for batch jobs).
+
+Per-class wait times (count, p50/p99/max) are kept for /metrics and readiness.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLASSES = ("high", "normal", "low")
+DEFAULT_WEIGHTS = {"high": 8.0, "normal": 3.0, "low": 1.0}
+WAIT_SAMPLES = 2048
+
+
+def parse_weights(value: Optional[str]) -> Dict[str, float]:
+    """'high=8,normal=3,low=1' -> weights; unknown or invalid entries are ignored."""
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in (value or "").split(","):
+        name, _, number = part.partition("=")
+        name = name.strip().lower()
+        try:
+            if name in weights and float(number) > 0:
+                weights[name] = float(number)
+        except ValueError:
+            logger.warning(f"Ignoring LLM weight '{part}'")
+    return weights
+
+
+def llm_class(priority: Any = 5, to_agent: Any = False, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Scheduling class for a lead from its planned priority / handoff flag."""
+    override = str((metadata or {}).get("llm_priority") or "").lower()
+    if override in CLASSES:
+        return override
+    try:
+        priority = int(priority)
+    except (TypeError, ValueError):
+        priority = 5
+    if to_agent is True or priority >= 8:
+        return "high"
+    if priority >= 6:
+        return "normal"
+    return "low"
+
+
+class _Waiter:
+    __slots__ = ("klass", "flow", "tag", "arrived", "future")
+
+    def __init__(self, klass: str, flow: Tuple[str, str], tag: float, future: asyncio.Future):
+        self.klass = klass
+        self.flow = flow
+        self.tag = tag
+        self.arrived = time.monotonic()
+        self.future = future
+
+
+class ClassStats:
+    __slots__ = ("dispatched", "aged", "waits")
+
+    def __init__(self):
+        self.dispatched = 0
+        self.aged = 0  # dispatched early because they hit LLM_MAX_WAIT
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    def percentile(self, q: float) -> float:
+        if not self.waits:
+            return 0.0
+        ordered = sorted(self.waits)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class LLMScheduler:
+    def __init__(self, concurrency: int = 8, weights: Optional[Dict[str, float]] = None, max_wait: float = 30.0):
+        self.concurrency = concurrency
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.max_wait = max_wait
+        self.running = 0
+        self.stats_by_class: Dict[str, ClassStats] = {k: ClassStats() for k in self.weights}
+        self._heap: List[Tuple[float, int, _Waiter]] = []
+        self._arrivals: Deque[_Waiter] = deque()  # oldest first, for starvation checks
+        self._finish: Dict[Tuple[str, str], float] = {}  # last finish tag per flow
+        self._vtime = 0.0
+        self._seq = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, w in self._heap if not w.future.done())
+
+    def queued_by_class(self) -> Dict[str, int]:
+        counts = dict.fromkeys(self.weights, 0)
+        for _, _, w in self._heap:
+            if not w.future.done():
+                counts[w.klass] += 1
+        return counts
+
+    @asynccontextmanager
+    async def slot(self, klass: str = "normal", source: str = "") -> AsyncIterator[None]:
+        """Hold one unit of LLM capacity for the body of the with-block."""
+        await self.acquire(klass, source)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, klass: str = "normal", source: str = "") -> float:
+        """Wait for capacity; returns seconds waited."""
+        klass = klass if klass in self.weights else "normal"
+        self._compact()
+        if self.running < self.concurrency and not self._heap:
+            self.running += 1
+            self._record(klass, 0.0, aged=False)
+            return 0.0
+        flow = (klass, source or "")
+        start = max(self._vtime, self._finish.get(flow, 0.0))
+        self._finish[flow] = start + 1.0 / self.weights[klass]
+        waiter = _Waiter(klass, flow, start, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, (start, next(self._seq), waiter))
+        self._arrivals.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release()  # capacity was handed over as we were cancelled
+            raise
+        return time.monotonic() - waiter.arrived
+
+    def release(self) -> None:
+        """Free one unit of capacity, handing it to the next waiter in fair-queue order."""
+        waiter = self._next()
+        if waiter is None:
+            self.running -= 1
+            return
+        waiter.future.set_result(None)
+
+    def _next(self) -> Optional[_Waiter]:
+        now = time.monotonic()
+        while self._arrivals and self._arrivals[0].future.done():
+            self._arrivals.popleft()
+        if self._arrivals and now - self._arrivals[0].arrived >= self.max_wait:
+            # starvation guard; its heap entry is skipped later because its future is done
+            waiter = self._arrivals.popleft()
+            self._record(waiter.klass, now - waiter.arrived, aged=True)
+            return waiter
+        self._compact()
+        if not self._heap:
+            return None
+        _, _, waiter = heapq.heappop(self._heap)
+        self._vtime = waiter.tag
+        self._record(waiter.klass, now - waiter.arrived, aged=False)
+        return waiter
+
+    def _compact(self) -> None:
+        """Drop heap entries whose waiter was already dispatched by age or cancelled."""
+        while self._heap and self._heap[0][2].future.done():
+            heapq.heappop(self._heap)
+
+    def _record(self, klass: str, waited: float, aged: bool) -> None:
+        stats = self.stats_by_class[klass]
+        stats.dispatched += 1
+        stats.aged += aged
+        stats.waits.append(waited)
+
+    def stats(self) -> Dict[str, Any]:
+        queued = self.queued_by_class()
+        return {
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "classes": {
+                klass: {
+                    "weight": self.weights[klass],
+                    "queued": queued[klass],
+                    "dispatched": s.dispatched,
+                    "aged": s.aged,
+                    "wait_p50_ms": round(s.percentile(0.5) * 1000, 3),
+                    "wait_p99_ms": round(s.percentile(0.99) * 1000, 3),
+                    "wait_max_ms": round(max(s.waits, default=0.0) * 1000, 3),
+                }
+                for klass, s in self.stats_by_class.items()
+            },
+        }
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Process-wide scheduler from LLM_CONCURRENCY / LLM_WEIGHTS / LLM_MAX_WAIT."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(
+            concurrency=int(os.getenv("LLM_CONCURRENCY", "8")),
+            weights=parse_weights(os.getenv("LLM_WEIGHTS")),
+            max_wait=float(os.getenv("LLM_MAX_WAIT", "30")),
+        )
+    return _scheduler
@@ -3,12 +3,21 @@ LLM Service for Lead Follow-up AI Agent
 Handles OpenAI API calls and mock responses for lead analysis
 """
 
+import asyncio
 import json
 import logging
 import os
+from time import perf_counter
 from typing import Dict, Any
 from openai import OpenAI
 
+from src.services.knowledge_index import search_knowledge
+from src.services.llm_breaker import get_llm_breaker
+from src.services.llm_scheduler import get_llm_scheduler, llm_class
+from src.services.metrics import record_llm_call, stage
+from src.services.packs import brand_value
+from src.services.tracing import span
+
 logger = logging.getLogger(__name__)
 
 def safe_strip(value):
@@ -31,8 +40,22 @@ async def analyze_lead(lead_data: Dict[str, Any]) -> Dict[str, Any]:
     if mock_mode:
         return _mock_response(lead_data)
     
+    breaker = get_llm_breaker()
+    if not breaker.allow():
+        # OpenAI is failing: don't make this request wait for its own timeout
+        return _fallback_response(lead_data)
     try:
-        return await _openai_response(lead_data)
+        # Heuristic priority decides this call's share of LLM capacity
+        estimate = _mock_response(lead_data)
+        klass = llm_class(estimate.get("priority"), estimate.get("to_agent"), lead_data)
+        async with get_llm_scheduler().slot(klass, safe_strip(lead_data.get("source"))):
+            try:
+                result = await _openai_response(lead_data)
+            except Exception:
+                breaker.record(False)
+                raise
+        breaker.record(True)
+        return result
     except Exception as e:
         logger.error(f"OpenAI API call failed: {e}")
         return _fallback_response(lead_data)
@@ -58,29 +81,41 @@ async def plan_next_action(lead_data: Dict[str, Any], state_data: Dict[str, Any]
     
     # Always use deterministic messaging logic for reply generation
     # This ensures consistent outbound messages regardless of MOCK_LLM setting
-    messaging_plan = _mock_action_plan(lead_data, state_data, metadata_data)
+    with stage("mock_plan"):
+        messaging_plan = _mock_action_plan(lead_data, state_data, metadata_data)
     
     # If MOCK_LLM=False, enhance with OpenAI analysis for scoring and AI notes
-    if not mock_mode:
+    breaker = get_llm_breaker()
+    if not mock_mode and breaker.allow():
         try:
-            ai_analysis = await _openai_action_plan(lead_data, state_data, metadata_data)
+            plan_meta = messaging_plan.get("metadata", {})
+            klass = llm_class(plan_meta.get("priority"), plan_meta.get("to_agent"), metadata_data)
+            with stage("llm"):
+                async with get_llm_scheduler().slot(klass, safe_strip(lead_data.get("source"))):
+                    try:
+                        ai_analysis = await _openai_action_plan(lead_data, state_data, metadata_data)
+                    except Exception:
+                        breaker.record(False)
+                        raise
+            breaker.record(True)
             
             # Override messaging with deterministic logic, but keep AI analysis
-            messaging_plan.update({
-                "metadata": {
-                    **messaging_plan.get("metadata", {}),
-                    # Keep AI-generated analysis fields
-                    "ai_notes": ai_analysis.get("metadata", {}).get("ai_notes", messaging_plan.get("metadata", {}).get("ai_notes", "")),
-                    "priority": ai_analysis.get("metadata", {}).get("priority", messaging_plan.get("metadata", {}).get("priority", 5)),
-                    "to_agent": ai_analysis.get("metadata", {}).get("to_agent", messaging_plan.get("metadata", {}).get("to_agent", False)),
-                },
-                "store": {
-                    **messaging_plan.get("store", {}),
-                    # Keep AI-generated store fields
-                    "ai_notes": ai_analysis.get("store", {}).get("ai_notes", messaging_plan.get("store", {}).get("ai_notes", "")),
-                    "decision_priority": ai_analysis.get("store", {}).get("decision_priority", messaging_plan.get("store", {}).get("decision_priority", 5)),
-                }
-            })
+            with stage("merge"):
+                messaging_plan.update({
+                    "metadata": {
+                        **messaging_plan.get("metadata", {}),
+                        # Keep AI-generated analysis fields
+                        "ai_notes": ai_analysis.get("metadata", {}).get("ai_notes", messaging_plan.get("metadata", {}).get("ai_notes", "")),
+                        "priority": ai_analysis.get("metadata", {}).get("priority", messaging_plan.get("metadata", {}).get("priority", 5)),
+                        "to_agent": ai_analysis.get("metadata", {}).get("to_agent", messaging_plan.get("metadata", {}).get("to_agent", False)),
+                    },
+                    "store": {
+                        **messaging_plan.get("store", {}),
+                        # Keep AI-generated store fields
+                        "ai_notes": ai_analysis.get("store", {}).get("ai_notes", messaging_plan.get("store", {}).get("ai_notes", "")),
+                        "decision_priority": ai_analysis.get("store", {}).get("decision_priority", messaging_plan.get("store", {}).get("decision_priority", 5)),
+                    }
+                })
             
         except Exception as e:
             logger.error(f"OpenAI API call failed, using mock logic only: {e}")
@@ -275,10 +310,10 @@ def get_in_person_followup(lead_data: Dict[str, Any], state_data: Dict[str, Any]
     is_harrods = source == "harrods"
     location_display = source_raw or "The Baby Cot Shop"
     
-    # Get signoffs
-    SIGNOFF_NAME = os.getenv("SIGNOFF_NAME", "Sabrina")
-    EMAIL_SIGNOFF = os.getenv("SIGNOFF_EMAIL", f"{SIGNOFF_NAME}\nThe Baby Cot Shop")
-    WA_SIGNOFF = os.getenv("SIGNOFF_WA", f"{SIGNOFF_NAME}\nThe Baby Cot Shop")
+    # Get signoffs (brand pack first, then environment)
+    SIGNOFF_NAME = brand_value("signoff.name", os.getenv("SIGNOFF_NAME", "Sabrina"))
+    EMAIL_SIGNOFF = brand_value("signoff.email", os.getenv("SIGNOFF_EMAIL", f"{SIGNOFF_NAME}\nThe Baby Cot Shop"))
+    WA_SIGNOFF = brand_value("signoff.whatsapp", os.getenv("SIGNOFF_WA", f"{SIGNOFF_NAME}\nThe Baby Cot Shop"))
     
     # Use determined channel if provided, otherwise determine based on state data
     if determined_channel:
@@ -373,10 +408,10 @@ def _generate_deterministic_message(what: str, first_name: str, channel: str) ->
     """
     import os
     
-    # Get signoffs from environment
-    SIGNOFF_NAME  = os.getenv("SIGNOFF_NAME", "Sabrina")
-    EMAIL_SIGNOFF = os.getenv("SIGNOFF_EMAIL", f"Kind regards,\n{SIGNOFF_NAME}\nThe Baby Cot Shop")
-    WA_SIGNOFF    = os.getenv("SIGNOFF_WA", SIGNOFF_NAME)
+    # Get signoffs (brand pack first, then environment)
+    SIGNOFF_NAME  = brand_value("signoff.name", os.getenv("SIGNOFF_NAME", "Sabrina"))
+    EMAIL_SIGNOFF = brand_value("signoff.email", os.getenv("SIGNOFF_EMAIL", f"Kind regards,\n{SIGNOFF_NAME}\nThe Baby Cot Shop"))
+    WA_SIGNOFF    = brand_value("signoff.whatsapp", os.getenv("SIGNOFF_WA", SIGNOFF_NAME))
     
     # Determine message type based on topic
     wl = (what or "").lower()
@@ -697,6 +732,10 @@ def _mock_action_plan(lead_data: Dict[str, Any], state_data: Dict[str, Any], met
     # ---------- DETERMINISTIC MESSAGE GENERATION ----------
     # Use helper function to generate all message content deterministically
     message = _generate_deterministic_message(what, first, channel)
+
+    # ---------- KNOWLEDGE GROUNDING ----------
+    # Top-k knowledge pack snippets for the customer's last message (in-process BM25, no AI)
+    knowledge = search_knowledge(last_customer_text) if last_customer_text else []
     
     # ---------- DETERMINISTIC PLAN ASSEMBLY ----------
     # All messaging fields are set deterministically - no AI-generated content
@@ -730,14 +769,112 @@ def _mock_action_plan(lead_data: Dict[str, Any], state_data: Dict[str, Any], met
             "subject": subject_in,
         },
     }
+    if knowledge:
+        plan["metadata"]["knowledge"] = knowledge
     
     log_debug(f"Returning plan with channel = {plan['channel']}")
     log_debug(f"Message contents: subject = {plan['message']['subject']}, body = {plan['message']['body']}, whatsapp_text = {plan['message']['whatsapp_text']}")
     
     return plan
 
+def _intent_action_plan(lead_data: Dict[str, Any], state_data: Dict[str, Any], outcome: str, confidence: float, metadata_data: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Deterministic plan for an inbound reply the intent classifier recognised.
 
+    Used by /respond to skip plan_next_action (and its OpenAI call) for common
+    replies:
+    - opt_out     -> stop, no message
+    - wants_call  -> handoff to an agent by phone
+    - busy        -> schedule_followup after the delay the customer asked for
+    - asked_price -> deterministic reply grounded with knowledge snippets
     
+    Args:
+        lead_data: Dictionary containing lead information
+        state_data: Dictionary containing lead state (history includes the inbound turn)
+        outcome: last_outcome value from the classifier
+        confidence: classifier confidence for the match
+        metadata_data: Dictionary containing metadata information
+        
+    Returns:
+        Dictionary with ActionPlan fields
+    """
+    from uuid import uuid4
+    from src.services.intent import ASKED_PRICE, BUSY, OPT_OUT, WANTS_CALL, followup_hours
+
+    state_data = {**state_data, "last_outcome": outcome}
+    thread_key = metadata_data.get("thread_key") if metadata_data else ""
+
+    if outcome == ASKED_PRICE:
+        plan = _mock_action_plan(lead_data, state_data, metadata_data)
+        # A price question is a buying signal: make sure a human sees it
+        priority = max(plan["metadata"].get("priority", 5), 8)
+        plan["metadata"].update(priority=priority, to_agent=True, last_outcome=outcome, intent_confidence=confidence)
+        plan["store"].update(decision_priority=priority, last_outcome=outcome)
+        return plan
+
+    hist = state_data.get("history") or []
+    last_text = (hist[-1].get("text") or "") if hist else ""
+    preferred = (state_data.get("preferred_channel") or "").strip() or None
+
+    if outcome == OPT_OUT:
+        action, channel, priority, to_agent, hours = "stop", None, 0, False, 0
+        ai_notes = "Customer opted out; stop all outreach."
+    elif outcome == WANTS_CALL:
+        action, channel, priority, to_agent, hours = "handoff", "Phone", 9, True, 0
+        ai_notes = "Customer asked for a call; hand off to an agent."
+    elif outcome == BUSY:
+        hours = followup_hours(last_text)
+        action, channel, priority, to_agent = "schedule_followup", preferred or state_data.get("channel"), 5, False
+        ai_notes = f"Customer is busy; follow up in {hours}h."
+    else:
+        raise ValueError(f"No deterministic plan for outcome '{outcome}'")
+
+    return {
+        "plan_id": str(uuid4()),
+        "action": action,
+        "channel": channel,
+        "message": None,
+        "metadata": {
+            "priority": priority,
+            "to_agent": to_agent,
+            "ai_notes": ai_notes,
+            "suggested_followup_in_hours": hours,
+            "last_outcome": outcome,
+            "intent_confidence": confidence,
+            "history_seen": len(hist),
+            "history_last": last_text,
+            "thread_key": thread_key,
+        },
+        "log": f"Intent classifier: {outcome} ({confidence:.2f}) -> {action}",
+        "store": {
+            "decision_channel": channel,
+            "decision_priority": priority,
+            "ai_notes": ai_notes,
+            "last_outcome": outcome,
+            "zoho_id": lead_data.get("zoho_id"),
+            "thread_key": thread_key,
+        },
+    }
+
+    
+async def _chat_completion(call: str, client: OpenAI, **kwargs):
+    """One chat completion, timed and token-counted for /metrics under `call` (and traced when sampled)."""
+    started = perf_counter()
+    with span("openai.chat_completion", call=call, model=kwargs.get("model")) as traced:
+        try:
+            # Sync client: run it off the event loop so other requests keep being served
+            response = await asyncio.to_thread(client.chat.completions.create, **kwargs)
+        except Exception:
+            record_llm_call(call, started)
+            raise
+        record_llm_call(call, started, response)
+        usage = getattr(response, "usage", None)
+        if traced is not None and usage is not None:
+            traced.attributes["llm.prompt_tokens"] = usage.prompt_tokens
+            traced.attributes["llm.completion_tokens"] = usage.completion_tokens
+    return response
+
+
 async def _openai_response(lead_data: Dict[str, Any]) -> Dict[str, Any]:
     """Get response from OpenAI API"""
     api_key = os.getenv("OPENAI_API_KEY")
@@ -761,7 +898,9 @@ async def _openai_response(lead_data: Dict[str, Any]) -> Dict[str, Any]:
     Respond with valid JSON only.
     """
     
-    response = client.chat.completions.create(
+    response = await _chat_completion(
+        "analyze_lead",
+        client,
         model=os.getenv("LLM_MODEL", "gpt-4o"),
         messages=[
             {"role": "system", "content": "You are a sales lead analysis expert. Always respond with valid JSON."},
@@ -811,7 +950,9 @@ async def _openai_action_plan(lead_data: Dict[str, Any], state_data: Dict[str, A
     Respond with valid JSON only.
     """
     
-    response = client.chat.completions.create(
+    response = await _chat_completion(
+        "plan_next_action",
+        client,
         model=os.getenv("LLM_MODEL", "gpt-4o"),
         messages=[
             {"role": "system", "content": "You are a sales rep agent expert. Always respond with valid JSON."},
@@ -0,0 +1,286 @@
+"""
+In-process metrics in Prometheus text format
+
+A deliberately small registry instead of prometheus_client. Hot-path updates
+are a dict lookup plus an attribute increment, with no lock: observations are
+made on the event loop thread, and a rare lost update from a worker thread
+doesn't matter for monitoring. Histograms have fixed buckets and keep
+per-bucket counts; cumulative counts are built only when /metrics is scraped.
+
+Gauges that mirror state owned elsewhere (queue depths, loop lag, breaker
+state, lru_cache stats) are collectors, read at scrape time, so they cost
+nothing per request. Stage timers double as tracing spans for sampled
+requests (see tracing.py).
+
+    with stage("mock_plan"):
+        plan = _mock_action_plan(...)
+"""
+
+import math
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.services.tracing import current_span, end_span, start_span
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0)
+
+# (name, type, help, [(labels, value)])
+Sample = Tuple[Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]
+Collector = Callable[[], Iterable[Family]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in list(self._children.items()):
+            self._render_child(out, values, child)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _render_child(self, out, values, child) -> None:
+        out.append(f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}")
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _render_child(self, out, values, child) -> None:
+        counts = list(child.counts)
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            out.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _labels(self.labelnames, values)
+        out.append(f"{self.name}_sum{labels} {repr(child.sum)}")
+        out.append(f"{self.name}_count{labels} {cumulative}")
+
+
+class Registry:
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()  # registration only, never on the hot path
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self.prefix + name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self.prefix + name, help, labelnames, buckets))
+
+    def collector(self, fn: Collector) -> Collector:
+        """Register fn() -> [(name, type, help, [(labels, value)])], called on every scrape."""
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self) -> bytes:
+        out: List[str] = []
+        for metric in list(self._metrics.values()):
+            metric.render(out)
+        for fn in list(self._collectors):
+            try:
+                families = list(fn())
+            except Exception as e:
+                out.append(f"# collector {getattr(fn, '__name__', fn)} failed: {_escape(e)}")
+                continue
+            for name, kind, help, samples in families:
+                name = self.prefix + name
+                out.append(f"# HELP {name} {help}")
+                out.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    out.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        out.append("")
+        return "\n".join(out).encode()
+
+
+REGISTRY = Registry(prefix=os.getenv("METRICS_PREFIX", "lead_agent_"))
+
+HTTP_REQUESTS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Request latency by route template, method and status", ("route", "method", "status")
+)
+PLANNER_STAGES = REGISTRY.histogram("planner_stage_duration_seconds", "Time spent in each planning stage", ("stage",))
+LLM_REQUESTS = REGISTRY.histogram(
+    "llm_request_duration_seconds", "OpenAI call latency by call site and outcome", ("call", "outcome"), buckets=LLM_BUCKETS
+)
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "OpenAI tokens used by call site and kind (prompt/completion)", ("call", "kind"))
+CACHE_REQUESTS = REGISTRY.counter("cache_requests_total", "Cache lookups by cache and result (hit/miss/stale)", ("cache", "result"))
+
+
+def metrics_enabled() -> bool:
+    return os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class _StageTimer:
+    __slots__ = ("child", "name", "started", "span")
+
+    def __init__(self, child: _HistogramChild, name: str):
+        self.child = child
+        self.name = name
+
+    def __enter__(self) -> "_StageTimer":
+        # sampled requests also get a tracing span per stage
+        self.span = start_span(f"planner.{self.name}") if current_span() is not None else None
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.child.observe(perf_counter() - self.started)
+        if self.span is not None:
+            end_span(self.span, exc)
+
+
+def stage(name: str) -> _StageTimer:
+    """Context manager timing one planning stage into planner_stage_duration_seconds (and a span when traced)."""
+    return _StageTimer(PLANNER_STAGES.labels(name), name)
+
+
+def cache_result(cache: str, result: str) -> None:
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+def record_llm_call(call: str, started: float, response=None) -> None:
+    """Latency, outcome and token usage of one OpenAI call (response None = failed)."""
+    LLM_REQUESTS.labels(call, "ok" if response is not None else "error").observe(perf_counter() - started)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.labels(call, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        LLM_TOKENS.labels(call, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+# ---- scrape-time collectors ----
+@REGISTRY.collector
+def _queue_depths():
+    # The readiness probe already knows every background queue, including ones registered by the API layer
+    from src.services.readiness import get_readiness_probe
+
+    samples = []
+    for queue, probe in get_readiness_probe().queues.items():
+        try:
+            depths = probe()
+        except Exception:
+            continue
+        for field, value in (depths or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                samples.append(({"queue": queue, "field": field}, value))
+    return [("queue_depth", "gauge", "Depth of background queues (items waiting, in flight, ...)", samples)]
+
+
+@REGISTRY.collector
+def _runtime():
+    from src.services import admission, llm_breaker
+    from src.services.intent import OUTCOMES, classifier_stats
+    from src.services.knowledge_index import stem
+
+    families = []
+    ctl = admission._controller
+    if ctl is not None:
+        families.append(("event_loop_lag_seconds", "gauge", "Most recent event-loop scheduling lag", [({}, ctl.monitor.lag)]))
+    breaker = llm_breaker._breaker
+    if breaker is not None:
+        state = {"closed": 0, "half_open": 1, "open": 2}[breaker.state]
+        families.append(("llm_breaker_state", "gauge", "LLM circuit breaker: 0 closed, 1 half-open, 2 open", [({}, state)]))
+        families.append(("llm_breaker_skipped_total", "counter", "OpenAI calls skipped by the open breaker", [({}, breaker.skipped)]))
+    intents = classifier_stats()
+    families.append(("intent_messages_total", "counter", "Inbound /respond messages run through the intent classifier", [({}, intents["total"])]))
+    families.append((
+        "intent_short_circuits_total", "counter", "Inbound messages answered without the LLM, by classified outcome",
+        [({"outcome": outcome}, intents.get(outcome, 0)) for outcome in OUTCOMES],
+    ))
+    families.append(("intent_coverage_ratio", "gauge", "Share of inbound messages answered without the LLM", [({}, intents["coverage"])]))
+    info = stem.cache_info()
+    families.append((
+        "lru_cache_requests_total", "counter", "functools.lru_cache lookups by result",
+        [({"cache": "knowledge_stem", "result": "hit"}, info.hits), ({"cache": "knowledge_stem", "result": "miss"}, info.misses)],
+    ))
+    return families
@@ -0,0 +1,288 @@
+"""
+Brand and knowledge pack loader for Lead Follow-up AI Agent
+
+Packs are JSON documents fetched from BRAND_PACK_URL / KNOWLEDGE_PACK_URL
+(http(s) URL, file:// URL or plain path). They are parsed and pre-indexed once,
+kept in memory for PACK_CACHE_TTL seconds and refreshed in the background
+(stale-while-revalidate, conditional GET with ETag/If-Modified-Since).
+
+A single on-disk copy under PACK_CACHE_DIR is shared by every uvicorn worker:
+whichever worker takes the file lock refreshes it, the rest pick it up from disk.
+Callers on the request path only ever read memory.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: fall back to no cross-process lock
+    fcntl = None
+
+from src.services.metrics import cache_result
+
+logger = logging.getLogger(__name__)
+
+# pack name -> env var holding its source
+PACK_SOURCES = {
+    "brand": "BRAND_PACK_URL",
+    "knowledge": "KNOWLEDGE_PACK_URL",
+}
+
+# pack name -> function building the pre-computed index from parsed JSON
+_INDEXERS: Dict[str, Callable[[Any], Any]] = {}
+
+
+def register_indexer(name: str, indexer: Callable[[Any], Any]) -> None:
+    """Register the function that pre-indexes a pack when it is (re)loaded."""
+    _INDEXERS[name] = indexer
+
+
+def flatten(data: Any, prefix: str = "") -> Dict[str, Any]:
+    """Flatten nested dicts into dotted keys: {"signoff": {"name": x}} -> {"signoff.name": x}."""
+    flat: Dict[str, Any] = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            path = f"{prefix}{key}"
+            if isinstance(value, dict):
+                flat.update(flatten(value, f"{path}."))
+            else:
+                flat[path] = value
+    return flat
+
+
+class Pack:
+    """A parsed pack plus its pre-computed index and HTTP validators."""
+
+    def __init__(self, name: str, data: Any, version: str, fetched_at: float, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.name = name
+        self.data = data
+        self.version = version
+        self.fetched_at = fetched_at
+        self.etag = etag
+        self.last_modified = last_modified
+        indexer = _INDEXERS.get(name)
+        self.index = indexer(data) if indexer else flatten(data)
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Dotted-key lookup against the flattened index."""
+        if isinstance(self.index, dict):
+            return self.index.get(key, default)
+        return default
+
+
+class PackLoader:
+    """
+    TTL cache of parsed packs with background revalidation.
+
+    get() never performs I/O: it returns whatever is in memory (possibly stale,
+    possibly None before the first load) and schedules a refresh when needed.
+    """
+
+    def __init__(
+        self,
+        sources: Optional[Dict[str, str]] = None,
+        ttl: Optional[float] = None,
+        cache_dir: Optional[str] = None,
+        client: Optional[httpx.Client] = None,
+    ):
+        if sources is None:
+            sources = {name: os.getenv(env) for name, env in PACK_SOURCES.items()}
+        self.sources = {name: src for name, src in sources.items() if src}
+        self.ttl = ttl if ttl is not None else float(os.getenv("PACK_CACHE_TTL", "600"))
+        self.cache_dir = cache_dir or os.getenv("PACK_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "bcs-packs")
+        self.retry_after = min(self.ttl, 60.0)
+        self._client = client
+        self._packs: Dict[str, Pack] = {}
+        self._refreshing: set = set()
+        self._retry_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pack-refresh")
+
+    # ---- request path ----
+    def get(self, name: str) -> Optional[Pack]:
+        pack = self._packs.get(name)
+        if name in self.sources and (pack is None or pack.age() >= self.ttl):
+            cache_result("pack", "miss" if pack is None else "stale")
+            self._schedule_refresh(name)
+        else:
+            cache_result("pack", "hit")
+        return pack
+
+    # ---- lifecycle ----
+    def warm(self) -> None:
+        """Load shared disk copies (cheap, local) and schedule refreshes for anything stale."""
+        for name in self.sources:
+            try:
+                self._load_from_disk(name)
+            except Exception as e:
+                logger.warning(f"Pack '{name}' disk copy unreadable: {e}")
+            self.get(name)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        if self._client is not None:
+            self._client.close()
+
+    # ---- refresh ----
+    def _schedule_refresh(self, name: str) -> None:
+        with self._lock:
+            if name in self._refreshing or time.time() < self._retry_at.get(name, 0):
+                return
+            self._refreshing.add(name)
+        self._executor.submit(self._refresh_task, name)
+
+    def _refresh_task(self, name: str) -> None:
+        try:
+            self.refresh(name)
+        except Exception as e:
+            logger.warning(f"Pack '{name}' refresh failed, serving stale copy: {e}")
+            self._retry_at[name] = time.time() + self.retry_after
+        finally:
+            with self._lock:
+                self._refreshing.discard(name)
+
+    def refresh(self, name: str) -> Optional[Pack]:
+        """Synchronously bring a pack up to date (runs on the background executor)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Another worker may already have refreshed the shared copy
+        pack = self._load_from_disk(name)
+        if pack is not None and pack.age() < self.ttl:
+            return pack
+
+        with open(self._path(name, "lock"), "a") as lock_fh:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Someone else is fetching; keep serving what we have
+                    return self._packs.get(name)
+            pack = self._load_from_disk(name)
+            if pack is not None and pack.age() < self.ttl:
+                return pack
+            return self._fetch(name, pack)
+
+    def _fetch(self, name: str, current: Optional[Pack]) -> Optional[Pack]:
+        source = self.sources[name]
+        parsed = urlparse(source)
+        etag = current.etag if current else None
+        last_modified = current.last_modified if current else None
+
+        if parsed.scheme in ("http", "https"):
+            headers = {}
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+            resp = self._http().get(source, headers=headers)
+            if resp.status_code == 304 and current is not None:
+                return self._touch(current)
+            resp.raise_for_status()
+            body = resp.content
+            etag = resp.headers.get("etag")
+            last_modified = resp.headers.get("last-modified")
+        else:
+            path = parsed.path if parsed.scheme == "file" else source
+            mtime = str(os.stat(path).st_mtime_ns)
+            if current is not None and current.last_modified == mtime:
+                return self._touch(current)
+            with open(path, "rb") as fh:
+                body = fh.read()
+            etag, last_modified = None, mtime
+
+        version = hashlib.sha256(body).hexdigest()
+        if current is not None and current.version == version:
+            current.etag, current.last_modified = etag, last_modified
+            return self._touch(current)
+
+        pack = Pack(name, json.loads(body), version, time.time(), etag, last_modified)
+        self._atomic_write(self._path(name, "json"), body)
+        self._write_meta(pack)
+        self._packs[name] = pack
+        logger.info(f"Pack '{name}' loaded ({len(body)} bytes, version {version[:12]})")
+        return pack
+
+    def _touch(self, pack: Pack) -> Pack:
+        pack.fetched_at = time.time()
+        self._write_meta(pack)
+        self._packs[pack.name] = pack
+        return pack
+
+    # ---- shared disk copy ----
+    def _path(self, name: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, f"{name}.{ext}")
+
+    def _load_from_disk(self, name: str) -> Optional[Pack]:
+        meta_path = self._path(name, "meta")
+        if not os.path.exists(meta_path):
+            return self._packs.get(name)
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+        current = self._packs.get(name)
+        if current is not None and current.version == meta["version"]:
+            # Same content: adopt the newer freshness without re-parsing
+            if meta["fetched_at"] > current.fetched_at:
+                current.fetched_at = meta["fetched_at"]
+                current.etag, current.last_modified = meta.get("etag"), meta.get("last_modified")
+            return current
+        with open(self._path(name, "json"), "rb") as fh:
+            body = fh.read()
+        if hashlib.sha256(body).hexdigest() != meta["version"]:
+            # Writer is mid-update; try again on the next refresh
+            return current
+        pack = Pack(name, json.loads(body), meta["version"], meta["fetched_at"], meta.get("etag"), meta.get("last_modified"))
+        self._packs[name] = pack
+        return pack
+
+    def _write_meta(self, pack: Pack) -> None:
+        meta = {"version": pack.version, "fetched_at": pack.fetched_at, "etag": pack.etag, "last_modified": pack.last_modified}
+        self._atomic_write(self._path(pack.name, "meta"), json.dumps(meta).encode("utf-8"))
+
+    def _atomic_write(self, path: str, data: bytes) -> None:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+    def _http(self) -> httpx.Client:
+        if self._client is None:
+            # One pooled keep-alive client for all pack fetches
+            self._client = httpx.Client(timeout=10.0, follow_redirects=True, limits=httpx.Limits(max_keepalive_connections=4))
+        return self._client
+
+
+_loader: Optional[PackLoader] = None
+
+
+def get_pack_loader() -> PackLoader:
+    """Process-wide loader, configured from the environment on first use."""
+    global _loader
+    if _loader is None:
+        _loader = PackLoader()
+    return _loader
+
+
+def get_pack(name: str) -> Optional[Pack]:
+    return get_pack_loader().get(name)
+
+
+def brand_value(key: str, default: Any = None) -> Any:
+    """Look up a brand pack value by dotted key, falling back to default when absent or not loaded."""
+    pack = get_pack("brand")
+    if pack is None:
+        return default
+    value = pack.get(key)
+    return default if value in (None, "") else value
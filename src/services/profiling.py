@@ -0,0 +1,235 @@
+"""
+On-demand request profiling
+
+A request sent with `x-profile-token: <PROFILE_SECRET>` is profiled by
+sampling the event-loop thread's Python stack every PROFILE_INTERVAL_MS
+(default 1 ms). The planner's CPU work (_mock_action_plan, serialisation,
+knowledge search) runs on the loop, so that is where a slow lead shape shows
+up. Time spent awaiting I/O appears as the loop's selector.
+
+The profile is written to PROFILE_DIR as speedscope JSON (PROFILE_FORMAT=speedscope,
+open it at https://www.speedscope.app) or as collapsed stacks
+(PROFILE_FORMAT=collapsed, for flamegraph.pl / speedscope).
+
+It is safe to leave enabled in production:
+
+- nothing happens without the secret
+- one profile runs at a time, at most one every PROFILE_MIN_INTERVAL seconds
+  (default 10)
+- a profile stops sampling after PROFILE_MAX_SECONDS (default 30)
+- the sampler is a daemon thread, not a tracing hook, so other requests are
+  not slowed down
+
+Other requests running on the loop at the same time appear in the profile too.
+"""
+
+import hmac
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_NAME = re.compile(r"^[\w.-]+\.(speedscope\.json|collapsed)$")
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+
+
+class SamplingProfiler:
+    """Samples one thread's stack from a background thread until stop()."""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.001, max_seconds: float = 30.0):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._switch_interval: Optional[float] = None
+
+    def start(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        # The sampler needs the GIL to take a sample; a CPU-bound loop only releases it every switch interval
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._switch_interval is not None:
+            sys.setswitchinterval(self._switch_interval)
+            self._switch_interval = None
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        deadline = self.started + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.perf_counter() > deadline:
+                logger.warning(f"Request profile stopped after {self.max_seconds:.0f}s")
+                return
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack: List[Frame] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()  # root first
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    # ---- output ----
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed stacks: `root;caller;callee count` per line."""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            names = ";".join(f"{name} ({_short(path)}:{line})" for name, path, line in stack)
+            lines.append(f"{names} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> Dict:
+        """Speedscope file format, one sampled profile weighted in seconds."""
+        frames: List[Dict] = []
+        index: Dict[Frame, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "lead-agent request profiler",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+def _short(path: str) -> str:
+    parts = path.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+class RequestProfiler:
+    """Decides which requests are profiled and writes their profiles."""
+
+    def __init__(
+        self,
+        secret: Optional[str],
+        directory: str,
+        fmt: str = "speedscope",
+        interval: float = 0.001,
+        min_interval: float = 10.0,
+        max_seconds: float = 30.0,
+    ):
+        self.secret = secret or ""
+        self.directory = directory
+        self.format = "collapsed" if fmt == "collapsed" else "speedscope"
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_seconds = max_seconds
+        self.profiles = 0
+        self.limited = 0
+        self._active = False
+        self._last = -float("inf")
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.secret)
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and token is not None and hmac.compare_digest(token.encode(), self.secret.encode())
+
+    def acquire(self) -> bool:
+        """Claim the profiling slot; False when another profile runs or the last one was too recent."""
+        with self._lock:
+            now = time.monotonic()
+            if self._active or now - self._last < self.min_interval:
+                self.limited += 1
+                return False
+            self._active = True
+            self._last = now
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._active = False
+
+    def new_name(self, method: str, path: str) -> str:
+        route = re.sub(r"[^\w]+", "_", path).strip("_") or "root"
+        suffix = "speedscope.json" if self.format == "speedscope" else "collapsed"
+        return f"{time.strftime('%Y%m%dT%H%M%S')}-{method.lower()}-{route}-{os.urandom(3).hex()}.{suffix}"
+
+    def sampler(self) -> SamplingProfiler:
+        return SamplingProfiler(interval=self.interval, max_seconds=self.max_seconds)
+
+    def write(self, name: str, profile: SamplingProfiler) -> str:
+        """Write a finished profile (blocking; call it off the event loop)."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        if self.format == "speedscope":
+            content = json.dumps(profile.speedscope(name), separators=(",", ":"))
+        else:
+            content = profile.collapsed()
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)  # readers never see a half-written profile
+        self.profiles += 1
+        logger.info(f"Request profile {name}: {profile.samples} samples over {profile.elapsed * 1000:.1f} ms")
+        return path
+
+    def path_for(self, name: str) -> Optional[str]:
+        """Path of a finished profile, or None for unknown / malformed names."""
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+_profiler: Optional[RequestProfiler] = None
+
+
+def get_request_profiler() -> RequestProfiler:
+    """Process-wide profiler configured from PROFILE_* env vars (disabled unless PROFILE_SECRET is set)."""
+    global _profiler
+    if _profiler is None:
+        _profiler = RequestProfiler(
+            secret=os.getenv("PROFILE_SECRET"),
+            directory=os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "bcs-profiles"),
+            fmt=os.getenv("PROFILE_FORMAT", "speedscope").lower(),
+            interval=float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000,
+            min_interval=float(os.getenv("PROFILE_MIN_INTERVAL", "10")),
+            max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", "30")),
+        )
+    return _profiler
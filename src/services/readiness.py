@@ -0,0 +1,255 @@
+"""
+Readiness probing
+
+/api/v1/health only says the process is up. /api/v1/ready says whether this
+worker should get traffic. A background task refreshes a snapshot every
+READINESS_INTERVAL seconds, and the endpoint returns it pre-serialised, so
+load balancers can probe it as often as they like.
+
+The worker is not ready when:
+
+- the LLM circuit breaker is open (unless MOCK_LLM)
+- event-loop lag is above ADMISSION_MAX_LOOP_LAG
+- a storage probe fails or takes longer than READINESS_MAX_STORAGE_MS
+  (decisions SQLite, conversation store)
+- the admission queue is full
+- the snapshot is older than three intervals (the probe task is stuck)
+
+Packs older than READINESS_MAX_PACK_AGE (default: twice PACK_CACHE_TTL) and
+missing packs are reported as "degraded", which does not fail readiness.
+Queue depths from the other background components are included for
+dashboards; more can be added with register_queue().
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QueueProbe = Callable[[], Optional[Dict[str, Any]]]
+
+
+def _decisions_db_probe(path: str) -> None:
+    conn = sqlite3.connect(path, timeout=1.0)
+    try:
+        conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+    finally:
+        conn.close()
+
+
+def _default_queues() -> Dict[str, QueueProbe]:
+    # Read the module singletons directly so probing never creates a component that isn't in use
+    from src.services import admission, decision_log, followups, llm_scheduler, tracing, webhooks, zoho_writeback
+
+    def admission_queue():
+        ctl = admission._controller
+        return None if ctl is None else {"inflight": ctl.inflight, "queued": ctl.queued, "max_queue": ctl.max_queue}
+
+    def llm_queue():
+        sched = llm_scheduler._scheduler
+        return None if sched is None else {"running": sched.running, "queued": sched.queued}
+
+    def decision_queue():
+        writer = decision_log._writer
+        return None if writer is None else {"pending": writer.pending(), "dropped": writer.dropped}
+
+    def followup_queue():
+        sched = followups._scheduler
+        return None if sched is None or not sched.running else {"pending": len(sched), "ready": sched.ready}
+
+    def webhook_queue():
+        dispatcher = webhooks._dispatcher
+        if dispatcher is None or not dispatcher.running:
+            return None
+        stats = dispatcher.stats().values()
+        return {"queued": sum(s["queued"] for s in stats), "in_flight": sum(s["in_flight"] for s in stats)}
+
+    def writeback_queue():
+        wb = zoho_writeback._writeback
+        return None if wb is None or not wb.running else {"pending": wb.pending, "paused_for": wb.stats()["paused_for"]}
+
+    def trace_queue():
+        exporter = tracing._tracer.exporter if tracing._tracer is not None else None
+        return None if exporter is None or not exporter.running else {"pending": exporter.pending, "dropped": exporter.dropped}
+
+    return {
+        "admission": admission_queue,
+        "llm": llm_queue,
+        "decisions": decision_queue,
+        "followups": followup_queue,
+        "webhooks": webhook_queue,
+        "zoho_writeback": writeback_queue,
+        "traces": trace_queue,
+    }
+
+
+class ReadinessProbe:
+    def __init__(
+        self,
+        interval: float = 2.0,
+        max_storage_ms: float = 500.0,
+        max_pack_age: Optional[float] = None,
+        decisions_db: Optional[str] = None,
+    ):
+        self.interval = interval
+        self.max_storage_ms = max_storage_ms
+        self.max_pack_age = max_pack_age
+        self.decisions_db = decisions_db or os.getenv("DECISIONS_DB", "decisions.db")
+        self.queues: Dict[str, QueueProbe] = _default_queues()
+        self.probes = 0
+        self._snapshot: Optional[Tuple[float, bool, bytes]] = None  # (taken at, ready, JSON body)
+        self._task: Optional[asyncio.Task] = None
+
+    def register_queue(self, name: str, probe: QueueProbe) -> None:
+        self.queues[name] = probe
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Readiness probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    # ---- endpoint ----
+    async def current(self) -> Tuple[bool, bytes]:
+        """(ready, JSON body) from the cached snapshot."""
+        snapshot = self._snapshot
+        running = self._task is not None and not self._task.done()
+        if snapshot is None or (not running and time.monotonic() - snapshot[0] >= self.interval):
+            # no background task (first call, or tests without lifespan): probe inline, still cached per interval
+            await self.refresh()
+            snapshot = self._snapshot
+        taken, ready, body = snapshot
+        age = time.monotonic() - taken
+        if age > 3 * self.interval:
+            return False, json.dumps({"ready": False, "failing": ["probe_stale"], "stale_for_s": round(age, 3)}).encode()
+        return ready, body
+
+    # ---- probing ----
+    async def refresh(self) -> Dict[str, Any]:
+        checks = {
+            "llm": self._llm(),
+            "loop": self._loop(),
+            "storage": await self._storage(),
+            "packs": self._packs(),
+            "queues": self._queues(),
+        }
+        failing = [name for name, check in checks.items() if check.get("ok") is False]
+        report = {
+            "ready": not failing,
+            "failing": failing,
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "checks": checks,
+        }
+        self.probes += 1
+        self._snapshot = (time.monotonic(), not failing, json.dumps(report, default=str).encode())
+        return report
+
+    def _llm(self) -> Dict[str, Any]:
+        from src.services.llm_breaker import get_llm_breaker
+
+        stats = get_llm_breaker().stats()
+        mock = os.getenv("MOCK_LLM", "false").lower() in ("1", "true", "yes")
+        return {**stats, "mock": mock, "ok": mock or stats["state"] != "open"}
+
+    def _loop(self) -> Dict[str, Any]:
+        from src.services.admission import get_admission_controller
+
+        ctl = get_admission_controller()
+        lag = ctl.monitor.lag
+        return {
+            "lag_ms": round(lag * 1000, 3),
+            "max_lag_ms": round(ctl.monitor.max_lag * 1000, 3),
+            "ok": not ctl.max_loop_lag or lag <= ctl.max_loop_lag,
+        }
+
+    async def _storage(self) -> Dict[str, Any]:
+        from src.services.conversation_store import get_conversation_store
+
+        results: Dict[str, Any] = {}
+        probes = {
+            "decisions_db": lambda: asyncio.to_thread(_decisions_db_probe, self.decisions_db),
+            "conversations": lambda: get_conversation_store().get("__readiness__"),
+        }
+        timeout = max(1.0, 4 * self.max_storage_ms / 1000)
+        for name, probe in probes.items():
+            started = time.perf_counter()
+            # asyncio.wait rather than wait_for: wait_for can swallow stop()'s cancellation on 3.11
+            task = asyncio.ensure_future(probe())
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            ms = (time.perf_counter() - started) * 1000
+            if not done:
+                task.cancel()
+                results[name] = {"error": f"no answer in {timeout:.1f}s", "ok": False}
+            elif task.exception() is not None:
+                e = task.exception()
+                results[name] = {"error": f"{type(e).__name__}: {e}", "ok": False}
+            else:
+                results[name] = {"latency_ms": round(ms, 3), "ok": ms <= self.max_storage_ms}
+        return {**results, "ok": all(r["ok"] for r in results.values())}
+
+    def _packs(self) -> Dict[str, Any]:
+        from src.services.packs import get_pack_loader
+
+        loader = get_pack_loader()
+        max_age = self.max_pack_age if self.max_pack_age is not None else 2 * loader.ttl
+        packs = {}
+        for name in loader.sources:
+            pack = loader.get(name)
+            if pack is None:
+                packs[name] = {"status": "missing"}
+            else:
+                age = pack.age()
+                packs[name] = {"version": pack.version, "age_s": round(age, 1), "status": "fresh" if age <= max_age else "stale"}
+        degraded = any(p["status"] != "fresh" for p in packs.values())
+        return {"packs": packs, "degraded": degraded}  # no "ok": stale content still serves
+
+    def _queues(self) -> Dict[str, Any]:
+        depths = {}
+        for name, probe in self.queues.items():
+            try:
+                value = probe()
+            except Exception as e:
+                value = {"error": str(e)}
+            if value is not None:
+                depths[name] = value
+        admission = depths.get("admission")
+        ok = admission is None or admission["queued"] < admission["max_queue"] or admission["max_queue"] == 0
+        return {**depths, "ok": ok}
+
+
+_probe: Optional[ReadinessProbe] = None
+
+
+def get_readiness_probe() -> ReadinessProbe:
+    """Process-wide probe configured from READINESS_* env vars."""
+    global _probe
+    if _probe is None:
+        max_pack_age = os.getenv("READINESS_MAX_PACK_AGE")
+        _probe = ReadinessProbe(
+            interval=float(os.getenv("READINESS_INTERVAL", "2.0")),
+            max_storage_ms=float(os.getenv("READINESS_MAX_STORAGE_MS", "500")),
+            max_pack_age=float(max_pack_age) if max_pack_age else None,
+        )
+    return _probe
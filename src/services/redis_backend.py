@@ -0,0 +1,163 @@
+"""
+Redis backends shared by every uvicorn worker
+
+STORE_BACKEND=redis and IDEMPOTENCY_BACKEND=redis use one process-wide
+connection pool (REDIS_URL, REDIS_MAX_CONNECTIONS). Each operation is a single
+pipelined round trip where possible; a conversation merge that has to
+de-duplicate resent history, or key turns without a ts, takes two.
+
+Key layout (REDIS_PREFIX, default "bcs:"):
+- {prefix}conv:{thread_key}:h   list of JSON turns (trimmed to STORE_MAX_TURNS)
+- {prefix}conv:{thread_key}:s   hash of state fields (JSON values) + __seen counter
+- {prefix}conv:{thread_key}:k   list of turn keys, aligned with (and trimmed like) :h
+- {prefix}idem:{key}            hash: status, headers, body, fingerprint
+
+All keys carry a TTL; memory is bounded by Redis' own maxmemory policy.
+"""
+
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from src.services.conversation_store import STATE_FIELDS, Conversation, turn_key, unseen_turns
+from src.services.idempotency import StoredResponse
+from src.utils.codec import decode, encode
+
+logger = logging.getLogger(__name__)
+
+SEEN_FIELD = b"__seen"
+
+_client: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Process-wide client over a shared connection pool (connections are opened lazily)."""
+    global _client
+    if _client is None:
+        pool = aioredis.ConnectionPool.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "64")),
+        )
+        _client = aioredis.Redis(connection_pool=pool)
+    return _client
+
+
+async def close_redis() -> None:
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
+        await client.connection_pool.disconnect()
+
+
+def _prefix() -> str:
+    return os.getenv("REDIS_PREFIX", "bcs:")
+
+
+class RedisConversationStore:
+    """Conversation store with the same merge semantics as MemoryConversationStore."""
+
+    def __init__(self, client: aioredis.Redis, ttl: float = 7 * 24 * 3600, max_turns: int = 200, prefix: Optional[str] = None):
+        self.client = client
+        self.ttl = int(ttl)
+        self.max_turns = max_turns
+        self.prefix = (prefix if prefix is not None else _prefix()) + "conv:"
+
+    def _keys(self, thread_key: str):
+        base = f"{self.prefix}{thread_key}"
+        return f"{base}:h", f"{base}:s", f"{base}:k"
+
+    async def get(self, thread_key: str) -> Optional[Conversation]:
+        hkey, skey, _ = self._keys(thread_key)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lrange(hkey, 0, -1)
+        pipe.hgetall(skey)
+        history, state = await pipe.execute()
+        if not history and not state:
+            return None
+        return self._conversation(history, state)
+
+    async def merge(
+        self,
+        thread_key: str,
+        state: Optional[Dict[str, Any]] = None,
+        new_turns: Iterable[Dict[str, Any]] = (),
+    ) -> Conversation:
+        hkey, skey, kkey = self._keys(thread_key)
+        state = state or {}
+
+        resent = state.get("history") or ()
+        new_turns = list(new_turns)
+        fresh: List[Tuple[bytes, Dict[str, Any]]] = []
+        if resent or any(t.get("ts") is None for t in new_turns):
+            pipe = self.client.pipeline(transaction=False)
+            pipe.lrange(kkey, 0, -1)
+            pipe.hget(skey, SEEN_FIELD)
+            known, seen = await pipe.execute()
+            seen = int(seen or 0)
+            fresh = unseen_turns(resent, known, seen)
+            position = seen + len(fresh)
+            fresh.extend((turn_key(t, position + i), t) for i, t in enumerate(new_turns))
+        else:
+            fresh.extend((turn_key(t, 0), t) for t in new_turns)
+
+        pipe = self.client.pipeline(transaction=True)
+        fields = {f: encode(state[f]) for f in STATE_FIELDS if state.get(f) is not None}
+        if fields:
+            pipe.hset(skey, mapping=fields)
+        if fresh:
+            pipe.rpush(hkey, *[encode(t) for _, t in fresh])
+            pipe.rpush(kkey, *[k for k, _ in fresh])
+            pipe.hincrby(skey, SEEN_FIELD, len(fresh))
+            pipe.ltrim(hkey, -self.max_turns, -1)
+            pipe.ltrim(kkey, -self.max_turns, -1)
+        pipe.lrange(hkey, 0, -1)
+        pipe.hgetall(skey)
+        for key in (hkey, skey, kkey):
+            pipe.expire(key, self.ttl)
+        results = await pipe.execute()
+        history, stored_state = results[-5], results[-4]
+        return self._conversation(history, stored_state)
+
+    async def delete(self, thread_key: str) -> None:
+        await self.client.delete(*self._keys(thread_key))
+
+    @staticmethod
+    def _conversation(history: List[bytes], state: Dict[bytes, bytes]) -> Conversation:
+        conv = Conversation()
+        conv.history = [decode(t) for t in history]
+        for field, value in state.items():
+            if field == SEEN_FIELD:
+                conv.seen = int(value)
+            else:
+                conv.state[field.decode()] = decode(value)
+        conv.seen = conv.seen or len(conv.history)
+        return conv
+
+
+class RedisIdempotencyStore:
+    """Idempotency records shared by all workers; one round trip per get/put."""
+
+    def __init__(self, client: aioredis.Redis, ttl: float = 3600, prefix: Optional[str] = None):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = (prefix if prefix is not None else _prefix()) + "idem:"
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        record = await self.client.hgetall(self.prefix + key)
+        if not record:
+            return None
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in decode(record[b"headers"])]
+        return StoredResponse(int(record[b"status"]), headers, record[b"body"], record[b"fingerprint"].decode())
+
+    async def put(self, key: str, response: StoredResponse) -> None:
+        headers = encode([(k.decode("latin-1"), v.decode("latin-1")) for k, v in response.headers])
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(
+            self.prefix + key,
+            mapping={"status": response.status, "headers": headers, "body": response.body, "fingerprint": response.fingerprint},
+        )
+        pipe.expire(self.prefix + key, self.ttl)
+        await pipe.execute()
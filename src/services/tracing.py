@@ -0,0 +1,347 @@
+"""
+Request tracing with a local OTLP exporter
+
+Spans cover the planning pipeline: a root span per HTTP request, plus one span
+per planner stage (the same stages /metrics times) and one per OpenAI call.
+The root span carries the lead's thread_key and zoho_id, so a slow request can
+be found from an n8n execution.
+
+- Propagation: a W3C `traceparent` request header continues the caller's
+  trace. Traced responses carry `traceparent` and `x-trace-id`.
+- Sampling is head-based. An upstream sampled flag is honoured either way;
+  requests without one are sampled at TRACE_SAMPLE_RATE. An unsampled request
+  only costs a ContextVar lookup per stage.
+- Export: finished traces are batched and written as OTLP/JSON
+  (ExportTraceServiceRequest), either appended to TRACE_FILE, one request per
+  line (TRACE_EXPORTER=file), or POSTed to an OTLP/HTTP collector at
+  TRACE_OTLP_ENDPOINT (TRACE_EXPORTER=otlp).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: int = SPAN_KIND_INTERNAL, start_ns: Optional[int] = None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = 0
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+class _Trace:
+    """Spans of one sampled request; exported together when the root span ends."""
+
+    __slots__ = ("root", "spans")
+
+    def __init__(self, root: Span):
+        self.root = root
+        self.spans: List[Span] = []
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_current_trace: ContextVar[Optional[_Trace]] = ContextVar("current_trace", default=None)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent span_id, sampled) from a W3C traceparent header, or None if absent/invalid."""
+    match = TRACEPARENT.match((value or "").strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+# ---- OTLP/JSON encoding ----
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    encoded = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [_attribute(k, v) for k, v in span.attributes.items() if v is not None],
+        "status": {"code": 2, "message": span.error} if span.error else {},
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    return encoded
+
+
+def otlp_request(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """ExportTraceServiceRequest in OTLP/JSON form."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", service_name)]},
+            "scopeSpans": [{"scope": {"name": "lead-agent.tracing"}, "spans": [_otlp_span(s) for s in spans]}],
+        }]
+    }
+
+
+class SpanExporter:
+    """Batches finished spans and writes them to a file or an OTLP/HTTP collector in the background."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        endpoint: Optional[str] = None,
+        service_name: str = "lead-followup-agent",
+        batch_size: int = 512,
+        interval: float = 2.0,
+        max_queue: int = 20_000,
+        timeout: float = 5.0,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.path = path
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.exported = 0
+        self.dropped = 0
+        self._queue: Deque[Span] = deque()
+        self._client = client
+        self._owns_client = client is None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def add(self, spans: List[Span]) -> None:
+        room = self.max_queue - len(self._queue)
+        if room < len(spans):
+            self.dropped += len(spans) - max(room, 0)
+            spans = spans[: max(room, 0)]
+        self._queue.extend(spans)
+        if self._wakeup is not None and len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self) -> "SpanExporter":
+        if not self.running:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # call_later + Event rather than wait_for, which can swallow close()'s cancellation
+            timer = loop.call_later(self.interval, self._wakeup.set)
+            try:
+                await self._wakeup.wait()
+            finally:
+                timer.cancel()
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Span export failed: {e}")
+
+    async def flush(self) -> int:
+        """Export everything queued now; returns the number of spans exported."""
+        count = 0
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            body = otlp_request(batch, self.service_name)
+            try:
+                if self.endpoint:
+                    await self._post(body)
+                else:
+                    await asyncio.to_thread(self._append, json.dumps(body, separators=(",", ":")))
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"Dropped {len(batch)} span(s): {e}")
+                continue
+            self.exported += len(batch)
+            count += len(batch)
+        return count
+
+    def _append(self, line: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    async def _post(self, body: Dict[str, Any]) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        resp = await self._client.post(self.endpoint, json=body)
+        resp.raise_for_status()
+
+
+class Tracer:
+    def __init__(self, exporter: Optional[SpanExporter], sample_rate: float = 0.01):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, kind: int = SPAN_KIND_SERVER) -> Optional[Span]:
+        """Open a root span if this trace is sampled (make it current); None otherwise."""
+        if self.exporter is None:
+            return None
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = None, None
+            sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+        if not sampled:
+            return None
+        root = Span(trace_id or f"{random.getrandbits(128):032x}", parent_id, name, kind)
+        _current_trace.set(_Trace(root))
+        _current_span.set(root)
+        return root
+
+    def end_trace(self, root: Span) -> None:
+        trace = _current_trace.get()
+        root.end_ns = time.time_ns()
+        _current_span.set(None)
+        _current_trace.set(None)
+        if trace is not None and trace.root is root and self.exporter is not None:
+            self.exporter.add(trace.spans + [root])
+
+
+# ---- helpers for instrumented code; all no-ops outside a sampled trace ----
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, start_ns: Optional[int] = None) -> Optional[Tuple[Span, Any]]:
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    span = Span(parent.trace_id, parent.span_id, name, start_ns=start_ns)
+    return span, _current_span.set(span)
+
+
+def end_span(started: Optional[Tuple[Span, Any]], error: Optional[BaseException] = None) -> None:
+    if started is None:
+        return
+    span, token = started
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    _current_span.reset(token)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append(span)
+
+
+class _SpanContext:
+    __slots__ = ("name", "attributes", "started")
+
+    def __init__(self, name: str, **attributes: Any):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Optional[Span]:
+        self.started = start_span(self.name)
+        if self.started is None:
+            return None
+        self.started[0].attributes.update(self.attributes)
+        return self.started[0]
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end_span(self.started, exc)
+
+
+def span(name: str, **attributes: Any) -> _SpanContext:
+    """with span("openai.chat", call="analyze_lead"): ... (nothing is recorded unless the request is sampled)"""
+    return _SpanContext(name, **attributes)
+
+
+def annotate(**attributes: Any) -> None:
+    """Set attributes on the current trace's root span (e.g. thread_key, zoho_id)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.root.attributes.update({k: v for k, v in attributes.items() if v not in (None, "")})
+
+
+def record_since_start(name: str) -> None:
+    """Add a finished span from the root span's start until now (work done before instrumented code ran)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        end_span(start_span(name, start_ns=trace.root.start_ns))
+
+
+def tracing_exporter() -> Optional[SpanExporter]:
+    kind = os.getenv("TRACE_EXPORTER", "").lower()
+    if kind not in ("file", "otlp"):
+        return None
+    return SpanExporter(
+        path=os.getenv("TRACE_FILE", "traces.jsonl") if kind == "file" else None,
+        endpoint=os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces") if kind == "otlp" else None,
+        service_name=os.getenv("TRACE_SERVICE_NAME", "lead-followup-agent"),
+        batch_size=int(os.getenv("TRACE_BATCH_SIZE", "512")),
+        interval=float(os.getenv("TRACE_EXPORT_INTERVAL", "2.0")),
+    )
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer configured from TRACE_* env vars (disabled unless TRACE_EXPORTER is set)."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(tracing_exporter(), sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")))
+    return _tracer
@@ -0,0 +1,354 @@
+"""
+Outbound webhooks to n8n
+
+Instead of n8n polling, the service pushes events (handoffs, lead analyses,
+due follow-ups) to webhook URLs:
+
+- WEBHOOK_ROUTES maps event types to URLs ("handoff=https://...,lead.analyzed=...");
+  WEBHOOK_URL receives every type without a route of its own. With neither
+  set, emit() is a no-op.
+- emit() only appends to the destination's in-memory queue. Each destination
+  (URL) has a worker that POSTs {"events": [...]} batches of up to
+  WEBHOOK_BATCH_SIZE, waiting at most WEBHOOK_BATCH_WAIT seconds to fill one,
+  with at most WEBHOOK_CONCURRENCY batches in flight per destination.
+- All destinations share one httpx.AsyncClient, so connections are kept alive
+  and reused.
+- Timeouts, connection errors, 408/429 and 5xx are retried up to
+  WEBHOOK_MAX_ATTEMPTS times with full-jitter exponential backoff (honouring
+  Retry-After). Batches that still fail, are rejected with another 4xx, or do
+  not fit in a full queue go to the webhook_dead_letters table
+  (WEBHOOK_DLQ_DB, default decisions.db) and can be replayed.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DLQ_DDL = (
+    "CREATE TABLE IF NOT EXISTS webhook_dead_letters ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, events TEXT NOT NULL, "
+    "error TEXT, attempts INTEGER NOT NULL, created_at TEXT NOT NULL)"
+)
+
+RETRY_STATUSES = (408, 429)
+
+
+class WebhookError(Exception):
+    """Raised by WebhookDispatcher.deliver() when a POST failed for good."""
+
+    def __init__(self, message: str, attempts: int):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+def _failure(error: str, attempts: int) -> WebhookError:
+    return WebhookError(f"{error} after {attempts} attempt(s)", attempts)
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+def parse_routes(value: Optional[str]) -> Dict[str, str]:
+    """'handoff=https://a,lead.analyzed=https://b' -> {event type: url}."""
+    routes = {}
+    for part in (value or "").split(","):
+        name, _, url = part.partition("=")
+        if name.strip() and url.strip():
+            routes[name.strip()] = url.strip()
+    return routes
+
+
+class DeadLetterStore:
+    """SQLite dead-letter queue; methods are blocking, call them via asyncio.to_thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(DLQ_DDL)
+            conn.commit()
+            self._ready = True
+        return conn
+
+    def add(self, url: str, events: List[Dict[str, Any]], error: str, attempts: int) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO webhook_dead_letters (url, events, error, attempts, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (url, json.dumps(events, default=str), error[:500], attempts, datetime.now(timezone.utc).isoformat()),
+                )
+        finally:
+            conn.close()
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, url, events, error, attempts, created_at FROM webhook_dead_letters ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"id": r[0], "url": r[1], "events": json.loads(r[2]), "error": r[3], "attempts": r[4], "created_at": r[5]}
+            for r in rows
+        ]
+
+    def delete(self, ids: List[int]) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("DELETE FROM webhook_dead_letters WHERE id = ?", [(i,) for i in ids])
+        finally:
+            conn.close()
+
+
+class _Destination:
+    def __init__(self, url: str, concurrency: int):
+        self.url = url
+        self.queue: Deque[Dict[str, Any]] = deque()
+        self.has_events = asyncio.Event()
+        self.slots = asyncio.Semaphore(concurrency)
+        self.sending: set = set()
+        self.worker: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dead = 0
+
+
+class WebhookDispatcher:
+    def __init__(
+        self,
+        routes: Optional[Dict[str, str]] = None,
+        default_url: Optional[str] = None,
+        dlq_path: str = "decisions.db",
+        batch_size: int = 50,
+        batch_wait: float = 0.2,
+        concurrency: int = 4,
+        max_queue: int = 10_000,
+        max_attempts: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        timeout: float = 10.0,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.routes = dict(routes or {})
+        self.default_url = default_url
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.dlq = DeadLetterStore(dlq_path)
+        self._client = client
+        self._own_client = client is None
+        self._destinations: Dict[str, _Destination] = {}
+        self._running = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.routes or self.default_url)
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0),
+            )
+        return self._client
+
+    def url_for(self, event_type: str) -> Optional[str]:
+        return self.routes.get(event_type) or self.default_url
+
+    def start(self) -> "WebhookDispatcher":
+        self._running = True
+        return self
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """Stop accepting events, send what is queued (up to drain_timeout), dead-letter the rest."""
+        self._running = False
+        for dest in self._destinations.values():
+            dest.has_events.set()
+        workers = [d.worker for d in self._destinations.values() if d.worker is not None]
+        if workers:
+            done, pending = await asyncio.wait(workers, timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        for dest in self._destinations.values():
+            for task in list(dest.sending):
+                task.cancel()
+            await asyncio.gather(*dest.sending, return_exceptions=True)
+            if dest.queue:
+                await self._dead_letter(dest, list(dest.queue), "shutdown", 0)
+                dest.queue.clear()
+        self._destinations.clear()
+        if self._own_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---- producing ----
+    def emit(self, event_type: str, data: Dict[str, Any]) -> bool:
+        """Queue an event for its destination; False when there is no route or the dispatcher is stopped."""
+        url = self.url_for(event_type)
+        if not self._running or url is None:
+            return False
+        event = {"id": uuid.uuid4().hex, "type": event_type, "created_at": datetime.now(timezone.utc).isoformat(), "data": data}
+        dest = self._destination(url)
+        if len(dest.queue) >= self.max_queue:
+            asyncio.get_running_loop().create_task(self._dead_letter(dest, [event], "queue full", 0))
+            return False
+        dest.queue.append(event)
+        dest.has_events.set()
+        return True
+
+    def _destination(self, url: str) -> _Destination:
+        dest = self._destinations.get(url)
+        if dest is None:
+            dest = self._destinations[url] = _Destination(url, self.concurrency)
+        if dest.worker is None or dest.worker.done():
+            dest.worker = asyncio.get_running_loop().create_task(self._work(dest))
+        return dest
+
+    # ---- delivery ----
+    async def _work(self, dest: _Destination) -> None:
+        while self._running or dest.queue:
+            if not dest.queue:
+                dest.has_events.clear()
+                await dest.has_events.wait()
+                continue
+            if len(dest.queue) < self.batch_size and self._running:
+                # let a batch fill up, but never hold an event longer than batch_wait
+                deadline = time.monotonic() + self.batch_wait
+                while len(dest.queue) < self.batch_size and self._running and time.monotonic() < deadline:
+                    dest.has_events.clear()
+                    timer = asyncio.get_running_loop().call_later(deadline - time.monotonic(), dest.has_events.set)
+                    try:
+                        await dest.has_events.wait()
+                    finally:
+                        timer.cancel()
+            await dest.slots.acquire()
+            batch = [dest.queue.popleft() for _ in range(min(self.batch_size, len(dest.queue)))]
+            if not batch:
+                dest.slots.release()
+                continue
+            task = asyncio.get_running_loop().create_task(self._send(dest, batch))
+            dest.sending.add(task)
+            task.add_done_callback(dest.sending.discard)
+        await asyncio.gather(*dest.sending, return_exceptions=True)
+
+    async def _send(self, dest: _Destination, events: List[Dict[str, Any]]) -> None:
+        try:
+            await self.deliver(dest.url, {"events": events})
+            dest.sent += len(events)
+        except asyncio.CancelledError:
+            await self._dead_letter(dest, events, "shutdown", 0)  # close() gave up waiting on it
+            raise
+        except Exception as e:
+            attempts = getattr(e, "attempts", 1)
+            await self._dead_letter(dest, events, str(e) or type(e).__name__, attempts)
+        finally:
+            dest.slots.release()
+
+    async def deliver(self, url: str, body: Dict[str, Any]) -> httpx.Response:
+        """POST body to url with retries and backoff; raises once attempts are exhausted or the error is permanent."""
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = None
+            try:
+                resp = await self.client.post(url, json=body)
+                if resp.status_code < 300:
+                    return resp
+                error = f"HTTP {resp.status_code}"
+                if resp.status_code < 500 and resp.status_code not in RETRY_STATUSES:
+                    raise _failure(error, attempt)
+                retry_after = _retry_after(resp.headers.get("retry-after"))
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt >= self.max_attempts:
+                raise _failure(error, attempt)
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+            if retry_after is not None:
+                delay = min(self.max_backoff, max(delay, retry_after))
+            await asyncio.sleep(delay)
+
+    async def _dead_letter(self, dest: _Destination, events: List[Dict[str, Any]], error: str, attempts: int) -> None:
+        dest.dead += len(events)
+        logger.warning(f"Dead-lettering {len(events)} webhook event(s) for {dest.url}: {error}")
+        try:
+            await asyncio.to_thread(self.dlq.add, dest.url, events, error, attempts)
+        except Exception as e:
+            logger.error(f"Could not write webhook dead letter: {e}")
+
+    async def replay(self, limit: int = 100) -> int:
+        """Re-queue up to limit dead-lettered batches; returns the number of events re-queued."""
+        letters = await asyncio.to_thread(self.dlq.list, limit)
+        count = 0
+        for letter in letters:
+            dest = self._destination(letter["url"])
+            dest.queue.extend(letter["events"])
+            dest.has_events.set()
+            count += len(letter["events"])
+        await asyncio.to_thread(self.dlq.delete, [letter["id"] for letter in letters])
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            url: {"queued": len(d.queue), "in_flight": len(d.sending), "sent": d.sent, "dead_lettered": d.dead}
+            for url, d in self._destinations.items()
+        }
+
+
+_dispatcher: Optional[WebhookDispatcher] = None
+
+
+def get_webhook_dispatcher() -> WebhookDispatcher:
+    """Process-wide dispatcher configured from WEBHOOK_* env vars."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = WebhookDispatcher(
+            routes=parse_routes(os.getenv("WEBHOOK_ROUTES")),
+            default_url=os.getenv("WEBHOOK_URL") or None,
+            dlq_path=os.getenv("WEBHOOK_DLQ_DB", os.getenv("DECISIONS_DB", "decisions.db")),
+            batch_size=int(os.getenv("WEBHOOK_BATCH_SIZE", "50")),
+            batch_wait=float(os.getenv("WEBHOOK_BATCH_WAIT", "0.2")),
+            concurrency=int(os.getenv("WEBHOOK_CONCURRENCY", "4")),
+            max_attempts=int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5")),
+        )
+    return _dispatcher
+
+
+def emit(event_type: str, data: Dict[str, Any]) -> bool:
+    """Push an event to n8n if a webhook is configured for its type."""
+    dispatcher = _dispatcher
+    if dispatcher is None or not dispatcher.running:
+        return False
+    return dispatcher.emit(event_type, data)
@@ -0,0 +1,387 @@
+"""
+Bulk write-back of plan store dicts to Zoho CRM
+
+Each ActionPlan.store (decision_channel, decision_priority, ai_notes,
+thread_key, ...) used to be written to Zoho by n8n, one API call per record.
+With ZOHO_WRITEBACK_ENABLED=true the service does it itself:
+
+- submit() coalesces updates per zoho_id: a later write for the same lead
+  overwrites the fields it sets, so ten plans for one lead cost one record.
+  Empty values are skipped rather than blanking CRM fields.
+- A background loop upserts pending records (oldest first) in batches of up
+  to ZOHO_WRITEBACK_BATCH_SIZE (100 is Zoho's maximum) every
+  ZOHO_WRITEBACK_INTERVAL seconds, or as soon as a full batch is waiting,
+  over one pooled httpx.AsyncClient with at most ZOHO_WRITEBACK_CONCURRENCY
+  calls in flight.
+- HTTP 429 / quota errors, 5xx and connection errors pause all calls
+  (Retry-After, else jittered exponential backoff) and put the batch back
+  under any newer writes. A 401 refreshes the OAuth token once.
+- Records Zoho rejects individually (e.g. INVALID_DATA) are logged and dropped.
+- Any other 4xx for the whole request (a bad payload, or a 401 that a token
+  refresh did not fix) is permanent: the batch is logged and parked in a
+  bounded dead-letter list instead of being retried and burning API quota.
+  Unexpected errors are retried with the same backoff as 5xx.
+
+Store keys map to Zoho API names by title-casing (decision_channel ->
+Decision_Channel); ZOHO_FIELD_MAP overrides that ("ai_notes=AI_Notes,...").
+Pending writes are held in memory and flushed on shutdown.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 100  # Zoho's limit per upsert call
+QUOTA_CODES = ("TOO_MANY_REQUESTS", "LIMIT_REACHED", "API_LIMIT_EXCEEDED")
+SKIP_KEYS = ("zoho_id", "id")
+
+
+def parse_field_map(value: Optional[str]) -> Dict[str, str]:
+    """'ai_notes=AI_Notes,thread_key=Thread_Key' -> {store key: Zoho API name}."""
+    fields = {}
+    for part in (value or "").split(","):
+        key, _, api_name = part.partition("=")
+        if key.strip() and api_name.strip():
+            fields[key.strip()] = api_name.strip()
+    return fields
+
+
+def zoho_field(key: str, field_map: Optional[Dict[str, str]] = None) -> str:
+    if field_map and key in field_map:
+        return field_map[key]
+    return "_".join(part[:1].upper() + part[1:] for part in key.split("_"))
+
+
+class ZohoAuth:
+    """OAuth access tokens from a refresh token, cached until shortly before they expire."""
+
+    def __init__(
+        self,
+        accounts_url: str = "https://accounts.zoho.com",
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
+        refresh_token: Optional[str] = None,
+        access_token: Optional[str] = None,
+    ):
+        self.accounts_url = accounts_url.rstrip("/")
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_token = refresh_token
+        self._token = access_token
+        self._expires = float("inf") if access_token else 0.0
+        self._lock = asyncio.Lock()
+
+    async def token(self, client: httpx.AsyncClient) -> str:
+        async with self._lock:
+            if self._token is None or time.monotonic() >= self._expires:
+                await self._refresh(client)
+            return self._token
+
+    def invalidate(self) -> None:
+        if self.refresh_token:
+            self._token = None
+
+    async def _refresh(self, client: httpx.AsyncClient) -> None:
+        if not self.refresh_token:
+            raise RuntimeError("Zoho write-back needs ZOHO_REFRESH_TOKEN (or ZOHO_ACCESS_TOKEN)")
+        resp = await client.post(
+            f"{self.accounts_url}/oauth/v2/token",
+            params={
+                "refresh_token": self.refresh_token,
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "grant_type": "refresh_token",
+            },
+        )
+        resp.raise_for_status()
+        body = resp.json()
+        if "access_token" not in body:
+            raise RuntimeError(f"Zoho token refresh failed: {body.get('error', body)}")
+        self._token = body["access_token"]
+        self._expires = time.monotonic() + float(body.get("expires_in", 3600)) - 60
+
+
+class _Retry(Exception):
+    def __init__(self, reason: str, retry_after: Optional[float] = None):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class _Permanent(Exception):
+    """Zoho refused the whole request in a way retrying won't fix."""
+
+
+class ZohoWriteback:
+    def __init__(
+        self,
+        api_base: str = "https://www.zohoapis.com",
+        module: str = "Leads",
+        auth: Optional[ZohoAuth] = None,
+        field_map: Optional[Dict[str, str]] = None,
+        batch_size: int = MAX_BATCH,
+        flush_interval: float = 2.0,
+        concurrency: int = 2,
+        max_pending: int = 50_000,
+        backoff: float = 1.0,
+        max_backoff: float = 300.0,
+        timeout: float = 30.0,
+        client: Optional[httpx.AsyncClient] = None,
+        max_dead_letters: int = 1000,
+    ):
+        self.url = f"{api_base.rstrip('/')}/crm/v6/{module}/upsert"
+        self.auth = auth or ZohoAuth()
+        self.field_map = dict(field_map or {})
+        self.batch_size = max(1, min(MAX_BATCH, batch_size))
+        self.flush_interval = flush_interval
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.written = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.failed = 0
+        self.dead_letters: deque = deque(maxlen=max_dead_letters)  # records from permanently failed batches
+        self.calls = 0
+        self.quota_pauses = 0
+        self._client = client
+        self._own_client = client is None
+        self._pending: Dict[str, Dict[str, Any]] = {}  # zoho_id -> Zoho record fields, oldest first
+        self._failures = 0
+        self._paused_until = 0.0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sending: set = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.concurrency + 1, max_keepalive_connections=self.concurrency + 1),
+            )
+        return self._client
+
+    def start(self) -> "ZohoWriteback":
+        if not self.running:
+            self._wake = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def close(self, drain_timeout: float = 10.0) -> None:
+        """Stop the loop and try to write what is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            try:
+                await asyncio.wait_for(self.flush(), drain_timeout)
+            except (asyncio.TimeoutError, Exception) as e:
+                logger.error(f"Zoho write-back shutdown flush incomplete ({e}); {self.pending} record(s) not written")
+        if self._own_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---- producing ----
+    def submit(self, zoho_id: str, store: Dict[str, Any]) -> bool:
+        """Coalesce a store dict into the lead's pending record; False if there was nothing to write."""
+        fields = {
+            zoho_field(k, self.field_map): v
+            for k, v in store.items()
+            if k not in SKIP_KEYS and v is not None and v != ""
+        }
+        if not zoho_id or not fields:
+            return False
+        record = self._pending.get(zoho_id)
+        if record is None:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            record = self._pending[zoho_id] = {"id": zoho_id}
+        record.update(fields)
+        if len(self._pending) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+        return True
+
+    # ---- sending ----
+    async def _run(self) -> None:
+        while True:
+            delay = max(self.flush_interval, self._paused_until - time.monotonic())
+            timer = asyncio.get_running_loop().call_later(delay, self._wake.set)
+            try:
+                await self._wake.wait()
+            finally:
+                timer.cancel()
+            self._wake.clear()
+            while self._pending and time.monotonic() >= self._paused_until:
+                await self._slots.acquire()
+                batch = self._take()
+                task = asyncio.get_running_loop().create_task(self._send_batch(batch))
+                self._sending.add(task)
+                task.add_done_callback(self._sending.discard)
+                if len(self._pending) < self.batch_size:
+                    break  # a partial batch waits for the next interval
+
+    async def flush(self) -> None:
+        """Write everything pending now (honouring quota pauses); used on shutdown and in tests."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+        while self._pending:
+            wait = self._paused_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self._slots.acquire()
+            await self._send_batch(self._take())
+
+    def _take(self) -> List[Dict[str, Any]]:
+        batch = []
+        for zoho_id in list(self._pending)[: self.batch_size]:
+            batch.append(self._pending.pop(zoho_id))
+        return batch
+
+    def _requeue(self, batch: List[Dict[str, Any]]) -> None:
+        """Put a failed batch back ahead of newer records, under any newer writes for the same leads."""
+        newer = self._pending
+        self._pending = {}
+        for record in batch:
+            self._pending[record["id"]] = {**record, **newer.pop(record["id"], {})}
+        self._pending.update(newer)
+
+    async def _send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            await self._upsert(batch)
+            self._failures = 0
+        except _Retry as e:
+            pause = self._pause(e.retry_after)
+            logger.warning(f"Zoho write-back paused {pause:.1f}s ({e}); {len(batch)} record(s) re-queued")
+            self._requeue(batch)
+        except _Permanent as e:
+            self.failed += len(batch)
+            self.dead_letters.extend(batch)
+            logger.error(f"Zoho write-back of {len(batch)} record(s) failed permanently, not retrying: {e}")
+        except Exception as e:
+            pause = self._pause()
+            logger.error(f"Zoho write-back of {len(batch)} record(s) failed: {e}; retrying in {pause:.1f}s")
+            self._requeue(batch)
+        finally:
+            self._slots.release()
+
+    def _pause(self, retry_after: Optional[float] = None) -> float:
+        """Pause all calls: Retry-After when given, else jittered exponential backoff."""
+        self._failures += 1
+        backoff = random.uniform(0.5, 1.0) * min(self.max_backoff, self.backoff * 2 ** (self._failures - 1))
+        pause = min(self.max_backoff, retry_after) if retry_after is not None else backoff
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        return pause
+
+    async def _upsert(self, batch: List[Dict[str, Any]], retried_auth: bool = False) -> None:
+        token = await self.auth.token(self.client)
+        self.calls += 1
+        try:
+            resp = await self.client.post(
+                self.url,
+                json={"data": batch, "duplicate_check_fields": ["id"]},
+                headers={"Authorization": f"Zoho-oauthtoken {token}"},
+            )
+        except httpx.TransportError as e:
+            raise _Retry(f"{type(e).__name__}: {e}")
+        try:
+            body = resp.json()
+        except ValueError:
+            body = {}
+        code = body.get("code") if isinstance(body, dict) else None
+        if resp.status_code == 401 and not retried_auth:
+            self.auth.invalidate()
+            return await self._upsert(batch, retried_auth=True)
+        if resp.status_code == 429 or code in QUOTA_CODES:
+            self.quota_pauses += 1
+            raise _Retry(f"quota ({code or resp.status_code})", _retry_after(resp))
+        if resp.status_code >= 500:
+            raise _Retry(f"HTTP {resp.status_code}", _retry_after(resp))
+        if resp.status_code >= 400:
+            raise _Permanent(f"HTTP {resp.status_code}: {code or resp.text[:200]}")
+        results = body.get("data") or []
+        for record, result in zip(batch, results):
+            if (result.get("status") or "").lower() == "success":
+                self.written += 1
+            else:
+                self.rejected += 1
+                logger.warning(f"Zoho rejected write-back for {record['id']}: {result.get('code')} {result.get('details')}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "calls": self.calls,
+            "quota_pauses": self.quota_pauses,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    try:
+        return max(0.0, float(resp.headers["retry-after"]))
+    except (KeyError, ValueError):
+        return None
+
+
+def writeback_enabled() -> bool:
+    return os.getenv("ZOHO_WRITEBACK_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+_writeback: Optional[ZohoWriteback] = None
+
+
+def get_zoho_writeback() -> ZohoWriteback:
+    """Process-wide write-back client configured from ZOHO_* env vars."""
+    global _writeback
+    if _writeback is None:
+        _writeback = ZohoWriteback(
+            api_base=os.getenv("ZOHO_API_BASE", "https://www.zohoapis.com"),
+            module=os.getenv("ZOHO_MODULE", "Leads"),
+            auth=ZohoAuth(
+                accounts_url=os.getenv("ZOHO_ACCOUNTS_URL", "https://accounts.zoho.com"),
+                client_id=os.getenv("ZOHO_CLIENT_ID"),
+                client_secret=os.getenv("ZOHO_CLIENT_SECRET"),
+                refresh_token=os.getenv("ZOHO_REFRESH_TOKEN"),
+                access_token=os.getenv("ZOHO_ACCESS_TOKEN"),
+            ),
+            field_map=parse_field_map(os.getenv("ZOHO_FIELD_MAP")),
+            batch_size=int(os.getenv("ZOHO_WRITEBACK_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("ZOHO_WRITEBACK_INTERVAL", "2.0")),
+            concurrency=int(os.getenv("ZOHO_WRITEBACK_CONCURRENCY", "2")),
+        )
+    return _writeback
+
+
+def record_writeback(lead: Dict[str, Any], plan: Dict[str, Any]) -> None:
+    """Queue the plan's store dict for Zoho; no-op unless write-back is running."""
+    writeback = _writeback
+    store = plan.get("store") or {}
+    if writeback is None or not writeback.running or not store:
+        return
+    writeback.submit(str(store.get("zoho_id") or (lead or {}).get("zoho_id") or ""), store)
@@ -0,0 +1,72 @@
+"""
+JSON codec used for request parsing and response rendering
+
+orjson when it is installed (pip install orjson), stdlib json otherwise.
+Set JSON_CODEC=json to force the stdlib codec.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Callable, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _std_dumps(obj: Any) -> bytes:
+    # Same output settings as starlette's JSONResponse
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _std_loads(data: Union[bytes, str]) -> Any:
+    return json.loads(data)
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+_CODECS = {"json": (_std_dumps, _std_loads)}
+if orjson is not None:
+    _CODECS["orjson"] = (_orjson_dumps, orjson.loads)
+
+name = ""
+dumps: Callable[[Any], bytes] = _std_dumps
+loads: Callable[[Union[bytes, str]], Any] = _std_loads
+
+
+def set_codec(codec: str) -> str:
+    """Switch the process-wide codec ("orjson" or "json"); falls back to json if unavailable."""
+    global name, dumps, loads
+    if codec not in _CODECS:
+        logger.warning(f"JSON codec '{codec}' unavailable, using stdlib json")
+        codec = "json"
+    name = codec
+    dumps, loads = _CODECS[codec]
+    return codec
+
+
+set_codec(os.getenv("JSON_CODEC") or ("orjson" if orjson is not None else "json"))
+
+
+def decode(data: Union[bytes, str]) -> Any:
+    """Parse JSON with the active codec (looked up per call so set_codec() applies everywhere)."""
+    return loads(data)
+
+
+def encode(obj: Any) -> bytes:
+    return dumps(obj)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered through the active codec."""
+
+    def render(self, content: Any) -> bytes:
+        return encode(content)
@@ -0,0 +1,29 @@
+"""
+Shared test setup
+"""
+
+import os
+import tempfile
+
+import pytest
+
+# TestClient runs the app's startup hooks; keep the decision writer out of the repo's decisions.db
+_tmp = tempfile.mkdtemp(prefix="bcs-tests-")
+os.environ.setdefault("DECISIONS_DB", os.path.join(_tmp, "decisions.db"))
+os.environ.setdefault("DECISIONS_ARCHIVE_DIR", os.path.join(_tmp, "archive"))
+
+
+@pytest.fixture(autouse=True)
+def _fresh_llm_breaker(monkeypatch):
+    # Without OPENAI_API_KEY every real LLM call fails; don't let one test's failures trip the breaker for the next
+    from src.services import llm_breaker
+
+    monkeypatch.setattr(llm_breaker, "_breaker", None)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_readiness_probe(monkeypatch):
+    # The cached snapshot would otherwise carry one test's breaker / storage state into the next
+    from src.services import readiness
+
+    monkeypatch.setattr(readiness, "_probe", None)
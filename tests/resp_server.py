@@ -0,0 +1,264 @@
+"""
+In-process Redis-compatible server for tests and benchmarks
+
+Speaks RESP2/RESP3 (HELLO) over TCP and implements the subset of commands the Redis
+backends use (strings, hashes, lists, sets, expiry, MULTI/EXEC), so the real
+redis.asyncio client, its connection pool and pipelines are exercised
+end to end without a Redis install.
+
+    server = RespServer()
+    await server.start()
+    client = redis.asyncio.Redis.from_url(server.url)
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+
+class RespError(Exception):
+    pass
+
+
+class RespServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.data: Dict[bytes, Any] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.commands = 0
+        self._handlers: set = set()
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self) -> "RespServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._handlers):
+                task.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+
+    # ---- protocol ----
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        queued: Optional[List[List[bytes]]] = None
+        resp3 = False
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                name = args[0].upper()
+                if name == b"HELLO":
+                    resp3 = len(args) > 1 and args[1] == b"3"
+                    hello = {"server": "resp_server", "version": "7.2.0", "proto": 3 if resp3 else 2, "mode": "standalone", "role": "master", "modules": []}
+                    writer.write(self._encode(hello, resp3))
+                elif name == b"MULTI":
+                    queued = []
+                    writer.write(b"+OK\r\n")
+                elif name == b"EXEC":
+                    results = []
+                    for cmd in queued or []:
+                        try:
+                            results.append(self._execute(cmd))
+                        except RespError as e:
+                            results.append(e)
+                    queued = None
+                    writer.write(self._encode(results, resp3))
+                elif name == b"DISCARD":
+                    queued = None
+                    writer.write(b"+OK\r\n")
+                elif queued is not None:
+                    queued.append(args)
+                    writer.write(b"+QUEUED\r\n")
+                else:
+                    try:
+                        writer.write(self._encode(self._execute(args), resp3))
+                    except RespError as e:
+                        writer.write(self._encode(e, resp3))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()  # inline command
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    def _encode(self, value: Any, resp3: bool = False) -> bytes:
+        if value is None:
+            return b"_\r\n" if resp3 else b"$-1\r\n"
+        if isinstance(value, RespError):
+            return b"-ERR " + str(value).encode() + b"\r\n"
+        if value is True:
+            return b"+OK\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, str):
+            value = value.encode()
+        if isinstance(value, bytes):
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if isinstance(value, dict):
+            if resp3:
+                return b"%%%d\r\n" % len(value) + b"".join(self._encode(x, resp3) for pair in value.items() for x in pair)
+            value = [x for pair in value.items() for x in pair]
+        if isinstance(value, (list, tuple)):
+            return b"*%d\r\n" % len(value) + b"".join(self._encode(v, resp3) for v in value)
+        raise TypeError(type(value))
+
+    # ---- commands ----
+    def _execute(self, args: List[bytes]) -> Any:
+        self.commands += 1
+        name = args[0].decode().lower()
+        handler = getattr(self, f"cmd_{name}", None)
+        if handler is None:
+            raise RespError(f"unknown command '{name}'")
+        return handler(*args[1:])
+
+    def _alive(self, key: bytes) -> bool:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _get(self, key: bytes, kind: type, create: bool = False) -> Any:
+        if not self._alive(key):
+            if not create:
+                return None
+            self.data[key] = kind()
+        value = self.data[key]
+        if not isinstance(value, kind):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def cmd_ping(self, *args):
+        return args[0] if args else True
+
+    def cmd_client(self, *args):
+        return True
+
+    def cmd_select(self, db):
+        return True
+
+    def cmd_flushdb(self, *args):
+        self.data.clear()
+        self.expires.clear()
+        return True
+
+    def cmd_dbsize(self):
+        return sum(1 for key in list(self.data) if self._alive(key))
+
+    def cmd_get(self, key):
+        return self._get(key, bytes)
+
+    def cmd_set(self, key, value, *opts):
+        opts = [o.upper() for o in opts]
+        if b"NX" in opts and self._alive(key):
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        for flag, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if flag in opts:
+                self.expires[key] = time.monotonic() + int(opts[opts.index(flag) + 1]) * scale
+        return True
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                removed += 1
+                self.data.pop(key)
+                self.expires.pop(key, None)
+        return removed
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._alive(key))
+
+    def cmd_expire(self, key, seconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + float(seconds)
+        return 1
+
+    def cmd_pexpire(self, key, millis):
+        return self.cmd_expire(key, float(millis) / 1000)
+
+    def cmd_ttl(self, key):
+        if not self._alive(key):
+            return -2
+        deadline = self.expires.get(key)
+        return -1 if deadline is None else int(deadline - time.monotonic())
+
+    def cmd_hset(self, key, *pairs):
+        h = self._get(key, dict, create=True)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in h
+            h[field] = value
+        return added
+
+    def cmd_hget(self, key, field):
+        return (self._get(key, dict) or {}).get(field)
+
+    def cmd_hgetall(self, key):
+        return dict(self._get(key, dict) or {})
+
+    def cmd_hincrby(self, key, field, amount):
+        h = self._get(key, dict, create=True)
+        h[field] = str(int(h.get(field, b"0")) + int(amount)).encode()
+        return int(h[field])
+
+    def cmd_rpush(self, key, *values):
+        items = self._get(key, list, create=True)
+        items.extend(values)
+        return len(items)
+
+    def cmd_llen(self, key):
+        return len(self._get(key, list) or [])
+
+    def cmd_lrange(self, key, start, stop):
+        items = self._get(key, list) or []
+        start, stop = int(start), int(stop)
+        stop = len(items) if stop == -1 else (stop + 1 if stop >= 0 else len(items) + stop + 1)
+        return items[start if start >= 0 else max(0, len(items) + start):stop]
+
+    def cmd_ltrim(self, key, start, stop):
+        items = self._get(key, list)
+        if items is not None:
+            items[:] = self.cmd_lrange(key, start, stop)
+        return True
+
+    def cmd_sadd(self, key, *members):
+        s = self._get(key, set, create=True)
+        before = len(s)
+        s.update(members)
+        return len(s) - before
+
+    def cmd_sismember(self, key, member):
+        return int(member in (self._get(key, set) or ()))
+
+    def cmd_smismember(self, key, *members):
+        s = self._get(key, set) or set()
+        return [int(m in s) for m in members]
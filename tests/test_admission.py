@@ -0,0 +1,116 @@
+"""
+Unit tests for admission control and the 503 load-shedding middleware
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.main import app
+from src.api.admission import AdmissionMiddleware
+from src.services.admission import AdmissionController, Rejected
+
+
+class TestAdmissionController:
+    async def test_slots_queue_and_handoff(self):
+        ctl = AdmissionController(max_inflight=2, max_queue=1, max_queue_wait=1.0)
+        a = await ctl.acquire()
+        b = await ctl.acquire()
+        queued = asyncio.ensure_future(ctl.acquire())
+        await asyncio.sleep(0)
+        assert ctl.queued == 1
+        with pytest.raises(Rejected) as exc:
+            await ctl.acquire()
+        assert exc.value.reason == "queue_full" and exc.value.retry_after >= 1
+
+        ctl.release(a)
+        c = await queued
+        assert ctl.inflight == 2 and ctl.queued == 0
+        for t in (b, c):
+            ctl.release(t)
+        assert ctl.inflight == 0
+
+    async def test_queue_timeout_frees_position(self):
+        ctl = AdmissionController(max_inflight=1, max_queue=5, max_queue_wait=0.05)
+        held = await ctl.acquire()
+        with pytest.raises(Rejected) as exc:
+            await ctl.acquire()
+        assert exc.value.reason == "queue_timeout"
+        assert ctl.queued == 0
+        ctl.release(held)
+        assert ctl.inflight == 0
+
+    async def test_rejects_fast_when_expected_wait_too_long(self):
+        ctl = AdmissionController(max_inflight=1, max_queue=100, max_queue_wait=1.0)
+        ctl.service_time = 5.0
+        held = await ctl.acquire()
+        with pytest.raises(Rejected) as exc:
+            await ctl.acquire()
+        assert exc.value.reason == "queue_wait"
+        assert exc.value.retry_after >= 5
+        ctl.release(held)
+
+    async def test_cancelled_waiter_passes_slot_on(self):
+        ctl = AdmissionController(max_inflight=1, max_queue=5, max_queue_wait=5)
+        held = await ctl.acquire()
+        gone = asyncio.ensure_future(ctl.acquire())
+        stays = asyncio.ensure_future(ctl.acquire())
+        await asyncio.sleep(0)
+        gone.cancel()
+        await asyncio.sleep(0)
+        ctl.release(held)
+        await stays
+        assert ctl.inflight == 1 and ctl.queued == 0
+
+    async def test_rejects_on_loop_lag(self):
+        ctl = AdmissionController(max_loop_lag=0.05)
+        ctl.monitor.start()
+        ctl.monitor.lag = 0.2
+        with pytest.raises(Rejected) as exc:
+            await ctl.acquire()
+        assert exc.value.reason == "loop_lag"
+        await ctl.monitor.stop()
+
+    async def test_monitor_measures_blocked_loop(self):
+        ctl = AdmissionController()
+        ctl.monitor.interval = 0.01
+        ctl.monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.15)  # block the loop
+        await asyncio.sleep(0.03)
+        assert ctl.monitor.max_lag >= 0.1
+        await ctl.monitor.stop()
+
+
+async def slow_app(scope, receive, send):
+    await asyncio.sleep(0.2)
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+class TestMiddleware:
+    async def test_sheds_planning_requests_but_not_health(self):
+        ctl = AdmissionController(max_inflight=2, max_queue=0, max_queue_wait=0.1)
+        transport = httpx.ASGITransport(app=AdmissionMiddleware(slow_app, controller=ctl))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            results = await asyncio.gather(
+                *(client.post("/api/v1/next_action", json={}) for _ in range(5)),
+                client.get("/api/v1/health"),
+            )
+        statuses = sorted(r.status_code for r in results[:5])
+        assert statuses == [200, 200, 503, 503, 503]
+        shed = next(r for r in results if r.status_code == 503)
+        assert int(shed.headers["retry-after"]) >= 1
+        assert shed.json()["reason"] == "queue_full"
+        assert results[5].status_code == 200
+        assert ctl.inflight == 0 and ctl.rejected == {"queue_full": 3}
+
+    async def test_app_admits_normal_traffic(self):
+        transport = httpx.ASGITransport(app=app)
+        payload = {"lead": {"zoho_id": "A1", "source": "Website"}, "state": {}}
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post("/api/v1/next_action", json=payload)
+            health = await client.get("/api/v1/health")
+        assert resp.status_code == 200 and health.status_code == 200
@@ -0,0 +1,97 @@
+"""
+Unit tests for the offline backfill CLI
+"""
+
+import csv
+import json
+import sqlite3
+
+from src.cli.backfill import normalize_record, run_backfill
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8-sig") as fh:
+        writer = csv.DictWriter(fh, fieldnames=["Record Id", "First Name", "Last Name", "Email", "Phone", "Lead Source", "Interests"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _rows(n):
+    return [
+        {
+            "Record Id": f"Z{i}",
+            "First Name": "Jane",
+            "Last Name": "Doe",
+            "Email": f"jane{i}@example.com",
+            "Phone": "+441234" if i % 2 else "",
+            "Lead Source": "Harrods" if i % 5 == 0 else "Website",
+            "Interests": "Cot Bed;Wardrobe",
+        }
+        for i in range(n)
+    ]
+
+
+class TestNormalizeRecord:
+    def test_maps_zoho_headers(self):
+        lead, state, metadata = normalize_record(
+            {"Record Id": "1", "First Name": "Ann", "Last Name": "Lee", "Lead Source": "Harrods", "Interests": "Cot;Crib", "Preferred Channel": "WhatsApp", "Email": ""}
+        )
+        assert lead == {"zoho_id": "1", "first_name": "Ann", "name": "Ann Lee", "source": "Harrods", "interests": ["Cot", "Crib"]}
+        assert state == {"intent": "general", "preferred_channel": "WhatsApp"}
+        assert metadata == {}
+
+    def test_passes_through_request_shape(self):
+        raw = {"lead": {"zoho_id": "1"}, "state": {"intent": "x"}, "metadata": {"thread_key": "t"}}
+        assert normalize_record(raw) == ({"zoho_id": "1"}, {"intent": "x"}, {"thread_key": "t"})
+
+
+class TestRunBackfill:
+    def test_jsonl_output_in_input_order(self, tmp_path):
+        src = tmp_path / "leads.csv"
+        _write_csv(src, _rows(53) + [{"Record Id": "", "First Name": "NoId"}])
+        out = tmp_path / "plans.jsonl"
+
+        summary = run_backfill(str(src), str(out), workers=2, chunk_size=7, progress_every=0)
+
+        assert summary["rows"] == 54
+        assert summary["written"] == 53
+        assert summary["skipped"] == 1
+        lines = [json.loads(line) for line in out.read_text().splitlines()]
+        assert [r["zoho_id"] for r in lines] == [f"Z{i}" for i in range(53)]
+        assert lines[1]["plan"]["action"] == "send_message"
+
+    def test_sqlite_resume_skips_committed_rows(self, tmp_path):
+        src = tmp_path / "leads.csv"
+        _write_csv(src, _rows(20))
+        db = tmp_path / "decisions.db"
+
+        run_backfill(str(src), str(db), workers=2, chunk_size=5, progress_every=0)
+        # Simulate a crash after the first two chunks were committed
+        with sqlite3.connect(db) as conn:
+            conn.execute("DELETE FROM lead_decisions WHERE id > 10")
+            conn.execute("UPDATE backfill_checkpoints SET rows_done = 10")
+
+        summary = run_backfill(str(src), str(db), workers=2, chunk_size=5, resume=True, progress_every=0)
+
+        assert summary["resumed_from"] == 10
+        assert summary["written"] == 10
+        with sqlite3.connect(db) as conn:
+            ids = [r[0] for r in conn.execute("SELECT zoho_id FROM lead_decisions ORDER BY id")]
+        assert ids == [f"Z{i}" for i in range(20)]
+
+    def test_jsonl_resume_truncates_partial_writes(self, tmp_path):
+        src = tmp_path / "leads.jsonl"
+        src.write_text("".join(json.dumps({"zoho_id": f"J{i}", "email": f"j{i}@x.com"}) + "\n" for i in range(12)))
+        out = tmp_path / "plans.jsonl"
+
+        run_backfill(str(src), str(out), workers=2, chunk_size=4, progress_every=0)
+        with open(out, "a") as fh:
+            fh.write('{"partial": ')
+        ckpt = json.loads((tmp_path / "plans.jsonl.ckpt").read_text())
+        lines = out.read_text().splitlines()
+        ckpt.update(rows_done=8, offset=sum(len(line) + 1 for line in lines[:8]))
+        (tmp_path / "plans.jsonl.ckpt").write_text(json.dumps(ckpt))
+
+        run_backfill(str(src), str(out), workers=2, chunk_size=4, resume=True, progress_every=0)
+
+        assert [json.loads(line)["zoho_id"] for line in out.read_text().splitlines()] == [f"J{i}" for i in range(12)]
@@ -0,0 +1,90 @@
+"""
+Unit tests for the benchmark suite's regression gate
+"""
+
+import json
+import os
+import time
+
+from benchmarks import corpus, suite
+
+
+def result(calibration, **cases):
+    return {"calibration_us": calibration, "python": "3", "cases": {name: {"median_us": us} for name, us in cases.items()}}
+
+
+def statuses(rows):
+    return {row["case"]: row["status"] for row in rows}
+
+
+def test_compare_gates_on_threshold_and_min_delta():
+    baseline = {"calibration_us": 100.0, "cases": {
+        "plan": {"median_us": 100.0},
+        "tiny": {"median_us": 1.0},
+        "loose": {"median_us": 100.0, "threshold": 1.0},
+        "fast": {"median_us": 100.0},
+    }}
+    rows = suite.compare(result(100.0, plan=130.0, tiny=1.9, loose=180.0, fast=70.0, added=5.0), baseline, threshold=0.25)
+    assert statuses(rows) == {"plan": "regressed", "tiny": "ok", "loose": "ok", "fast": "improved", "added": "new"}
+    assert statuses(suite.compare(result(100.0, plan=124.0), baseline)) == {"plan": "ok"}
+
+
+def test_compare_scales_by_calibration():
+    baseline = {"calibration_us": 100.0, "cases": {"plan": {"median_us": 100.0}}}
+    # Twice as slow on a machine that is twice as slow is no regression
+    row = suite.compare(result(200.0, plan=200.0), baseline)[0]
+    assert row["score_us"] == 100.0 and row["status"] == "ok"
+    assert suite.compare(result(50.0, plan=200.0), baseline)[0]["status"] == "regressed"
+
+
+def test_updated_baseline_merges_onto_the_old_calibration():
+    old = {"calibration_us": 100.0, "cases": {"plan": {"median_us": 100.0, "threshold": 0.5}, "topic": {"median_us": 2.0}}}
+    new = suite.updated_baseline(result(200.0, plan=300.0, message=40.0), old)
+    assert new["calibration_us"] == 100.0
+    assert new["cases"] == {"message": {"median_us": 20.0}, "plan": {"median_us": 150.0, "threshold": 0.5}, "topic": {"median_us": 2.0}}
+    assert suite.updated_baseline(result(200.0, plan=300.0), None)["cases"] == {"plan": {"median_us": 300.0}}
+
+
+def test_best_of_keeps_the_lower_score():
+    rows = [{"case": "a", "score_us": 10.0, "status": "regressed"}, {"case": "b", "score_us": 5.0, "status": "ok"}]
+    retried = [{"case": "a", "score_us": 8.0, "status": "ok"}]
+    assert statuses(suite.best_of(rows, retried)) == {"a": "ok", "b": "ok"}
+
+
+def test_corpus_histories():
+    for size in corpus.HISTORY_SIZES:
+        for _, state, _ in corpus.planner_inputs(size):
+            assert len(state["history"]) == size
+            assert not size or state["history"][-1]["role"] == "customer"
+    assert corpus.webhook_record(1)["Modified_Time"] != corpus.webhook_record(1 + len(corpus.LEADS))["Modified_Time"]
+
+
+def test_gate_fails_when_the_planner_slows_down(monkeypatch, tmp_path, capsys):
+    path = str(tmp_path / "baselines.json")
+    args = ["-k", "^deterministic_message$", "--quick", "--baseline", path]
+    assert suite.main(args + ["--update-baseline"]) == 0
+    with open(path) as f:
+        assert set(json.load(f)["cases"]) == {"deterministic_message"}
+    assert suite.main(args + ["--threshold", "3"]) == 0
+
+    real = suite._generate_deterministic_message
+
+    def slowed(*a):
+        deadline = time.perf_counter() + 0.0003
+        while time.perf_counter() < deadline:
+            pass
+        return real(*a)
+
+    monkeypatch.setattr(suite, "_generate_deterministic_message", slowed)
+    assert suite.main(args + ["--retries", "1"]) == 1
+    assert "FAIL: 1 case(s) regressed" in capsys.readouterr().out
+
+
+def test_endpoint_env_overrides_the_shell(monkeypatch):
+    shell = {"MOCK_LLM": "false", "DECISIONS_DB": "/srv/bcs/decisions.db", "FOLLOWUPS_ENABLED": "false", "WEBHOOK_URL": "https://n8n.example.com/hook"}
+    monkeypatch.setattr(os, "environ", {**os.environ, **shell})
+    suite._configure_env()
+    assert os.getenv("MOCK_LLM") == "true" and os.getenv("FOLLOWUPS_ENABLED") == "true"
+    assert os.getenv("DECISIONS_DB") != shell["DECISIONS_DB"] and "bcs-bench-" in os.getenv("DECISIONS_DB")
+    assert not os.getenv("WEBHOOK_URL")
+
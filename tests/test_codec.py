@@ -0,0 +1,60 @@
+"""
+Unit tests for the JSON codec layer
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from src.utils import codec
+
+
+@pytest.fixture(params=["json", "orjson"])
+def active_codec(request):
+    if request.param == "orjson" and codec.orjson is None:
+        pytest.skip("orjson not installed")
+    previous = codec.name
+    codec.set_codec(request.param)
+    yield request.param
+    codec.set_codec(previous)
+
+
+class TestCodec:
+    def test_roundtrip(self, active_codec):
+        payload = {"text": "£1,450 – cot", "n": [1, 2.5, None, True], "nested": {"a": "b"}}
+        raw = codec.encode(payload)
+        assert isinstance(raw, bytes)
+        assert codec.decode(raw) == payload
+        assert json.loads(raw) == payload
+
+    def test_unknown_codec_falls_back_to_stdlib(self):
+        previous = codec.name
+        try:
+            assert codec.set_codec("nope") == "json"
+        finally:
+            codec.set_codec(previous)
+
+    def test_response_class_renders_compact_utf8(self, active_codec):
+        body = codec.FastJSONResponse({"msg": "Hi — £5"}).body
+        assert body == '{"msg":"Hi — £5"}'.encode("utf-8")
+
+
+class TestEndpoints:
+    def test_flex_parses_regardless_of_content_type(self, active_codec):
+        payload = {"zoho_id": "Z1", "name": "Ann Lee", "email": "ann@example.com", "interests": "cot bed"}
+        with TestClient(app) as client:
+            resp = client.post("/api/v1/next_action_flex", content=json.dumps(payload), headers={"content-type": "text/plain"})
+        assert resp.status_code == 200
+        assert resp.json()["store"]["zoho_id"] == "Z1"
+
+    def test_flex_rejects_non_object(self, active_codec):
+        with TestClient(app) as client:
+            resp = client.post("/api/v1/next_action_flex", content="[1, 2]")
+        assert resp.status_code == 400
+
+    def test_debug_echo_any(self, active_codec):
+        with TestClient(app) as client:
+            resp = client.post("/api/v1/debug_echo_any", content='{"a": 1}')
+        assert resp.json()["parsed_json"] == {"a": 1}
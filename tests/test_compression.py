@@ -0,0 +1,110 @@
+"""
+Unit tests for request/response compression
+"""
+
+import gzip
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from src.api import compression
+from src.api.compression import CompressionMiddleware, choose_encoding
+
+
+def make_app(**kwargs):
+    app = FastAPI()
+
+    @app.post("/api/v1/respond")
+    async def respond(request: Request):
+        body = await request.json()
+        return {"echo": body, "padding": "x" * 2000}
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    app.add_middleware(CompressionMiddleware, **kwargs)
+    return app
+
+
+def client_for(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+class TestNegotiation:
+    def test_prefers_brotli_when_available(self, monkeypatch):
+        monkeypatch.setattr(compression, "brotli", object())
+        assert choose_encoding("gzip, deflate, br") == "br"
+        assert choose_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+
+    def test_gzip_without_brotli(self, monkeypatch):
+        monkeypatch.setattr(compression, "brotli", None)
+        assert choose_encoding("br, gzip") == "gzip"
+        assert choose_encoding("identity") is None
+        assert choose_encoding("gzip;q=0") is None
+
+
+class TestResponses:
+    async def test_large_json_is_gzipped(self, monkeypatch):
+        monkeypatch.setattr(compression, "brotli", None)
+        async with client_for(make_app(minimum_size=500)) as client:
+            resp = await client.post("/api/v1/respond", json={"a": 1}, headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["content-encoding"] == "gzip"
+        assert resp.headers["vary"] == "Accept-Encoding"
+        assert int(resp.headers["content-length"]) < 500
+        assert resp.json()["echo"] == {"a": 1}
+
+    async def test_brotli_response(self):
+        if compression.brotli is None:
+            pytest.skip("brotli not installed")
+        async with client_for(make_app(minimum_size=500)) as client:
+            resp = await client.post("/api/v1/respond", json={"a": 1}, headers={"Accept-Encoding": "br"})
+        assert resp.headers["content-encoding"] == "br"
+        assert resp.json()["echo"] == {"a": 1}
+
+    async def test_small_response_not_compressed(self):
+        async with client_for(make_app(minimum_size=500)) as client:
+            resp = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in resp.headers
+        assert resp.headers["vary"] == "Accept-Encoding"
+        assert resp.json() == {"ok": True}
+
+    async def test_uncompressed_negotiable_response_varies(self):
+        async with client_for(make_app(minimum_size=500)) as client:
+            resp = await client.post("/api/v1/respond", json={"a": 1}, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in resp.headers
+        assert resp.headers["vary"] == "Accept-Encoding"
+
+
+class TestRequests:
+    async def test_gzip_request_body_is_inflated(self):
+        raw = gzip.compress(json.dumps({"history": ["hi"] * 100}).encode())
+        async with client_for(make_app()) as client:
+            resp = await client.post("/api/v1/respond", content=raw, headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+        assert resp.status_code == 200
+        assert len(resp.json()["echo"]["history"]) == 100
+
+    async def test_decompression_bomb_rejected(self):
+        bomb = gzip.compress(b"0" * 5_000_000)
+        async with client_for(make_app(max_inflated=1_000_000)) as client:
+            resp = await client.post("/api/v1/respond", content=bomb, headers={"Content-Encoding": "gzip"})
+        assert len(bomb) < 10_000
+        assert resp.status_code == 413
+
+    async def test_malformed_gzip_rejected(self):
+        async with client_for(make_app()) as client:
+            resp = await client.post("/api/v1/respond", content=b"not gzip", headers={"Content-Encoding": "gzip"})
+        assert resp.status_code == 400
+
+    async def test_unsupported_encoding_rejected(self):
+        async with client_for(make_app()) as client:
+            resp = await client.post("/api/v1/respond", content=b"x", headers={"Content-Encoding": "compress"})
+        assert resp.status_code == 415
+
+    async def test_error_body_is_valid_json(self):
+        async with client_for(make_app()) as client:
+            resp = await client.post("/api/v1/respond", content=b"x", headers={"Content-Encoding": 'br"\\'})
+        assert resp.status_code == 415
+        assert resp.json()["detail"] == 'Unsupported Content-Encoding \'br"\\\'.'
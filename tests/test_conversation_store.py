@@ -0,0 +1,132 @@
+"""
+Unit tests for the server-side conversation store
+"""
+
+import asyncio
+import os
+
+import httpx
+import pytest
+
+os.environ.setdefault("MOCK_LLM", "true")
+
+from app.main import app
+from src.services import conversation_store
+from src.services.conversation_store import MemoryConversationStore
+
+
+def turn(text, role="customer", ts=None):
+    return {"role": role, "text": text, "channel": "WhatsApp", "ts": ts}
+
+
+class TestMemoryConversationStore:
+    async def test_merge_appends_only_new_turns(self):
+        store = MemoryConversationStore()
+        await store.merge("t", {"history": [turn("hi", ts="1")]})
+        conv = await store.merge("t", {"history": [turn("hi", ts="1"), turn("price?", ts="2")]})
+        assert [t["text"] for t in conv.history] == ["hi", "price?"]
+        assert conv.summary() == (2, "price?")
+
+    async def test_new_turns_always_appended(self):
+        store = MemoryConversationStore()
+        await store.merge("t", new_turns=[turn("yes")])
+        conv = await store.merge("t", new_turns=[turn("yes")])
+        assert conv.summary() == (2, "yes")
+
+    async def test_state_fields_only_overwritten_when_sent(self):
+        store = MemoryConversationStore()
+        await store.merge("t", {"intent": "interior_design", "preferred_channel": "Email"})
+        conv = await store.merge("t", {"last_outcome": "busy"})
+        assert conv.state == {"intent": "interior_design", "preferred_channel": "Email", "last_outcome": "busy"}
+
+    async def test_turn_cap_keeps_lifetime_count(self):
+        store = MemoryConversationStore(max_turns=3)
+        conv = await store.merge("t", new_turns=[turn(str(i)) for i in range(5)])
+        assert [t["text"] for t in conv.history] == ["2", "3", "4"]
+        assert conv.summary() == (5, "4")
+        # a full resend does not bring trimmed turns back
+        conv = await store.merge("t", {"history": [turn(str(i)) for i in range(5)]})
+        assert len(conv.history) == 3
+
+    async def test_repeated_replies_without_ts_are_kept(self):
+        store = MemoryConversationStore()
+        resent = [turn("ok"), turn("Shall I send the brochure?", "agent"), turn("ok")]
+        conv = await store.merge("t", {"history": resent})
+        assert [t["text"] for t in conv.history] == ["ok", "Shall I send the brochure?", "ok"]
+        conv = await store.merge("t", {"history": resent + [turn("ok")]})
+        assert conv.summary() == (4, "ok")
+
+    async def test_new_turns_only_in_sent_history(self):
+        store = MemoryConversationStore()
+        for _ in range(3):
+            conv = await store.merge("t", {"history": [turn("ok")]})
+        assert conv.summary() == (3, "ok")
+        # a full resend afterwards is recognised, and a timestamped window is de-duplicated
+        conv = await store.merge("t", {"history": [turn("ok")] * 3 + [turn("price?", ts="9")]})
+        conv = await store.merge("t", {"history": [turn("price?", ts="9"), turn("ok")]})
+        assert [t["text"] for t in conv.history] == ["ok", "ok", "ok", "price?", "ok"]
+
+    async def test_turn_keys_follow_the_retained_history(self):
+        store = MemoryConversationStore(max_turns=3)
+        resent = []
+        for i in range(50):
+            resent.append(turn(f"message {i}", ts=str(i)))
+            conv = await store.merge("t", {"history": resent})
+        assert len(conv.keys) == len(conv.history) == 3
+        assert [t["text"] for t in conv.history] == ["message 47", "message 48", "message 49"]
+        assert conv.seen == 50
+
+    async def test_lru_eviction_by_threads_and_bytes(self):
+        store = MemoryConversationStore(max_threads=2)
+        for key in "abc":
+            await store.merge(key, new_turns=[turn("hi")])
+        assert len(store) == 2
+        assert await store.get("a") is None
+
+        store = MemoryConversationStore(max_bytes=20_000)
+        for i in range(50):
+            await store.merge(f"t{i}", new_turns=[turn("x" * 1000)])
+        assert store.bytes <= 20_000
+        assert await store.get("t49") is not None
+        assert await store.get("t0") is None
+
+    async def test_ttl_expiry(self):
+        store = MemoryConversationStore(ttl=0.01)
+        await store.merge("t", new_turns=[turn("hi")])
+        await asyncio.sleep(0.02)
+        assert await store.get("t") is None
+        assert store.bytes == 0
+
+
+class TestEndpoints:
+    @pytest.fixture(autouse=True)
+    def fresh_store(self, monkeypatch):
+        monkeypatch.setattr(conversation_store, "_store", MemoryConversationStore())
+
+    async def test_respond_sends_only_the_new_turn(self):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/api/v1/next_action", json={
+                "lead": {"zoho_id": "Z1", "first_name": "Ann"},
+                "state": {"history": [turn("Hello, do you have the Balmoral cot?", ts="1")]},
+                "metadata": {"thread_key": "ann-web"},
+            })
+            first = await client.post("/api/v1/respond", json={
+                "zoho_id": "Z1", "incoming_text": "Is it available in sage?", "channel": "WhatsApp", "thread_key": "ann-web",
+            })
+            second = await client.post("/api/v1/respond", json={
+                "zoho_id": "Z1", "incoming_text": "And what about delivery?", "channel": "WhatsApp", "thread_key": "ann-web",
+            })
+        assert first.json()["metadata"]["history_seen"] == 2
+        assert second.json()["metadata"]["history_seen"] == 3
+        assert second.json()["metadata"]["history_last"] == "And what about delivery?"
+
+    async def test_without_thread_key_is_stateless(self):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for _ in range(2):
+                resp = await client.post("/api/v1/respond", json={
+                    "zoho_id": "Z1", "incoming_text": "Is it available in sage?", "channel": "WhatsApp", "timestamp": "x",
+                })
+        assert resp.json()["metadata"]["history_seen"] == 1
+        assert len(conversation_store._store) == 0
@@ -0,0 +1,163 @@
+"""
+Unit tests for the async SQLAlchemy repositories
+"""
+
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from src.services import database
+from src.services.conversation_store import MemoryConversationStore
+from src.services.database import ConversationRepository, Database, engine_options
+
+
+@pytest.fixture
+async def db(tmp_path):
+    db = await Database(f"sqlite:///{tmp_path / 'app.db'}").connect()
+    yield db
+    await db.dispose()
+
+
+class TestEngineOptions:
+    def test_sqlite_url_gets_async_driver_and_small_pool(self):
+        url, options = engine_options("sqlite:///decisions.db")
+        assert url == "sqlite+aiosqlite:///decisions.db"
+        assert options["max_overflow"] == 0 and options["pool_size"] == 4
+
+    def test_memory_sqlite_shares_one_connection(self):
+        _, options = engine_options("sqlite+aiosqlite://")
+        assert options["poolclass"].__name__ == "StaticPool"
+
+    @pytest.mark.parametrize("url", ["postgres://u:p@db/bcs", "postgresql://u:p@db/bcs", "postgresql+asyncpg://u:p@db/bcs"])
+    def test_postgres_url(self, url, monkeypatch):
+        monkeypatch.setenv("DB_POOL_SIZE", "20")
+        url, options = engine_options(url)
+        assert url == "postgresql+asyncpg://u:p@db/bcs?prepared_statement_cache_size=500"
+        assert options["pool_size"] == 20 and options["pool_pre_ping"]
+
+    def test_rejects_other_backends(self):
+        with pytest.raises(ValueError):
+            engine_options("mysql://u:p@db/bcs")
+
+
+class TestDecisionRepository:
+    async def test_bulk_insert_and_keyset_pages(self, db):
+        rows = [
+            {"zoho_id": f"Z{i % 5}", "channel": "Email", "priority": 5, "to_agent": i % 3 == 0, "notes": f"n{i}",
+             "lead_data": {"i": i}, "created_at": f"2024-01-01 10:{i // 60 % 60:02d}:{i % 60:02d}.000"}
+            for i in range(2500)
+        ]
+        assert await db.decisions.add_many(rows) == 2500
+        await db.decisions.add("Z1", "SMS", 3, True, "live", {"x": 1})
+        assert await db.decisions.count() == 2501
+
+        seen, cursor = [], None
+        while True:
+            items, cursor = await db.decisions.for_lead("Z1", limit=77, cursor=cursor)
+            seen.extend(items)
+            if cursor is None:
+                break
+        assert len(seen) == 501
+        assert seen[0]["notes"] == "live"
+        keys = [(i["created_at"], i["id"]) for i in seen]
+        assert keys == sorted(keys, reverse=True)
+
+    async def test_shares_table_with_decision_log(self, tmp_path):
+        from src.services.decision_log import DecisionReader, connect
+
+        path = tmp_path / "decisions.db"
+        connect(str(path)).close()
+        db = await Database(f"sqlite:///{path}").connect()
+        try:
+            await db.decisions.add("Z9", "Email", 5, False, "", {})
+        finally:
+            await db.dispose()
+        items, _ = DecisionReader(str(path)).list(zoho_id="Z9")
+        assert len(items) == 1 and items[0]["to_agent"] is False
+
+
+class TestConversationRepository:
+    async def test_merge_dedupes_resent_history(self, db):
+        turns = [{"role": "customer", "text": "hi", "ts": "1"}, {"role": "agent", "text": "hello", "ts": "2"}]
+        await db.conversations.merge("t1", {"intent": "buy", "history": turns})
+        conv = await db.conversations.merge("t1", {"history": turns}, [{"role": "customer", "text": "price?", "ts": "3"}])
+        assert [t["text"] for t in conv.history] == ["hi", "hello", "price?"]
+        assert conv.state == {"intent": "buy"} and conv.seen == 3
+        assert conv.summary() == (3, "price?")
+        stored = await db.conversations.get("t1")
+        assert stored.history == conv.history and stored.keys == conv.keys
+        await db.conversations.delete("t1")
+        assert await db.conversations.get("t1") is None
+
+    async def test_trims_and_expires(self, db):
+        db.conversations.max_turns = 3
+        turns = [{"role": "customer", "text": str(i), "ts": str(i)} for i in range(5)]
+        conv = await db.conversations.merge("t2", {"history": turns})
+        assert [t["text"] for t in conv.history] == ["2", "3", "4"] and conv.seen == 5
+        assert len(conv.keys) == 3
+        # trimmed turns are not re-added when the client resends everything
+        conv = await db.conversations.merge("t2", {"history": turns + [{"role": "customer", "text": "5", "ts": "5"}]})
+        assert [t["text"] for t in conv.history] == ["3", "4", "5"] and conv.seen == 6
+        assert (await db.conversations.get("t2")).keys == conv.keys and len(conv.keys) == 3
+        db.conversations.ttl = -1
+        await db.conversations.merge("t3", {"intent": "x"})
+        assert await db.conversations.get("t3") is None
+        assert await db.conversations.purge_expired() == 1
+
+    async def test_turn_keys_match_the_memory_store(self, db):
+        memory = MemoryConversationStore()
+        turns = [{"role": "customer", "text": "ok", "ts": None} for _ in range(3)]
+        for store in (memory, db.conversations):
+            await store.merge("t5", {"history": turns[:1]}, turns[1:])
+            conv = await store.merge("t5", None, turns)
+        assert conv.keys == (await memory.get("t5")).keys and conv.seen == 6
+
+    async def test_concurrent_merges_do_not_lose_turns(self, db):
+        await asyncio.gather(*(
+            db.conversations.merge("t4", None, [{"role": "customer", "text": f"m{i}", "ts": str(i)}]) for i in range(20)
+        ))
+        conv = await db.conversations.get("t4")
+        assert conv.seen == 20 and len(conv.history) == 20
+
+    def test_postgres_merge_locks_a_row_even_for_new_threads(self):
+        from sqlalchemy.dialects import postgresql
+
+        engine = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), execution_options=lambda **kw: None)
+        claim = str(ConversationRepository(engine)._claim.compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (thread_key) DO NOTHING" in claim
+        assert "FOR UPDATE" in str(database.SELECT_CONVERSATION_FOR_UPDATE.compile(dialect=postgresql.dialect()))
+
+
+class TestCacheRepository:
+    async def test_namespaced_get_set_and_expiry(self, db):
+        plans = db.cache("plans")
+        await plans.set_many({f"k{i}": {"v": i} for i in range(1500)})
+        assert await plans.get("k7") == {"v": 7}
+        assert await db.cache("other").get("k7") is None
+        got = await plans.get_many(["k1", "k2", "missing"])
+        assert got == {"k1": {"v": 1}, "k2": {"v": 2}}
+        await plans.set("k1", {"v": "new"})
+        assert await plans.get("k1") == {"v": "new"}
+        await plans.set("gone", 1, ttl=-1)
+        assert await plans.get("gone") is None
+        assert await plans.purge_expired() == 1
+        await plans.delete("k2")
+        assert await plans.get("k2") is None
+
+
+async def test_sql_conversation_backend(monkeypatch, tmp_path):
+    from src.services.conversation_store import build_conversation_store
+
+    monkeypatch.setenv("STORE_BACKEND", "sql")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'store.db'}")
+    monkeypatch.setattr(database, "_database", None)
+    store = build_conversation_store()
+    assert isinstance(store, database.ConversationRepository)
+    await database.get_database().connect()
+    try:
+        await store.merge("t", {"intent": "buy"})
+    finally:
+        await database.close_database()
+    assert sqlite3.connect(tmp_path / "store.db").execute("SELECT count(*) FROM conversations").fetchone() == (1,)
@@ -0,0 +1,77 @@
+"""
+Unit tests for write-behind decision persistence
+"""
+
+import os
+import sqlite3
+import time
+
+import httpx
+import pytest
+
+os.environ.setdefault("MOCK_LLM", "true")
+
+from app.main import app
+from src.services import decision_log
+from src.services.decision_log import DecisionWriter
+
+
+def rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT zoho_id, channel, priority, to_agent, notes, lead_data, created_at FROM lead_decisions ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+class TestDecisionWriter:
+    def test_batches_and_flushes_on_close(self, tmp_path):
+        path = str(tmp_path / "decisions.db")
+        writer = DecisionWriter(path, batch_size=50, flush_interval=0.01).start()
+        for i in range(120):
+            assert writer.submit(f"Z{i}", "Email", 5, False, "note", {"i": i})
+        writer.close()
+        stored = rows(path)
+        assert len(stored) == 120
+        assert stored[0][:5] == ("Z0", "Email", 5, 0, "note")
+        assert writer.batches >= 3
+        conn = sqlite3.connect(path)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_full_queue_drops_instead_of_blocking(self, tmp_path):
+        writer = DecisionWriter(str(tmp_path / "d.db"), max_queue=5)  # not started: nothing drains
+        started = time.perf_counter()
+        accepted = [writer.submit("Z", "Email", 5, False, "", {}) for _ in range(20)]
+        assert time.perf_counter() - started < 0.05
+        assert accepted.count(True) == 5
+        assert writer.dropped == 15
+
+    def test_bad_row_does_not_lose_the_batch(self, tmp_path):
+        path = str(tmp_path / "d.db")
+        writer = DecisionWriter(path).start()
+        writer.submit("Z1", "Email", "not a number", False, "", {})
+        writer.submit("Z2", "Email", 7, True, "", {})
+        writer.close()
+        assert [r[0] for r in rows(path)] == ["Z2"]
+        assert writer.dropped == 1
+
+
+class TestEndpoints:
+    @pytest.fixture
+    def writer(self, tmp_path, monkeypatch):
+        writer = DecisionWriter(str(tmp_path / "decisions.db"), flush_interval=0.01).start()
+        monkeypatch.setattr(decision_log, "_writer", writer)
+        yield writer
+        writer.close()
+
+    async def test_planning_endpoints_record_decisions(self, writer):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/api/v1/lead", json={"zoho_id": "Z1", "email": "ann@example.com"})
+            await client.post("/api/v1/next_action", json={"lead": {"zoho_id": "Z2", "first_name": "Ann", "source": "Website"}})
+            await client.post("/api/v1/respond", json={"zoho_id": "Z3", "incoming_text": "call me please", "channel": "WhatsApp"})
+        writer.close()
+        stored = rows(writer.path)
+        assert [r[0] for r in stored] == ["Z1", "Z2", "Z3"]
+        assert '"endpoint": "/respond"' in stored[2][5]
+        assert stored[2][2] == 9 and stored[2][3] == 1  # wants_call handoff
@@ -0,0 +1,106 @@
+"""
+Unit tests for the decision history queries and endpoints
+"""
+
+import sqlite3
+
+import httpx
+import pytest
+
+from app.main import app
+from src.services import decision_log
+from src.services.decision_log import INSERT_DECISION, DecisionReader, connect
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "decisions.db")
+    conn = connect(path)
+    rows = []
+    for i in range(3000):
+        # several rows share a timestamp so the id tie-breaker matters
+        ts = f"2024-01-{1 + (i // 200):02d} 10:00:{(i // 5) % 60:02d}.000"
+        rows.append((f"Z{i % 30}", "Email", 5, i % 7 == 0, f"n{i}", "{}", ts))
+    with conn:
+        conn.executemany(INSERT_DECISION, rows)
+    conn.close()
+    return path
+
+
+def all_pages(reader, **filters):
+    seen, cursor = [], None
+    while True:
+        items, cursor = reader.list(cursor=cursor, limit=97, **filters)
+        seen.extend(items)
+        if cursor is None:
+            return seen
+
+
+class TestDecisionReader:
+    def test_keyset_pages_cover_every_row_once_in_order(self, db):
+        reader = DecisionReader(db)
+        items = all_pages(reader, zoho_id="Z3")
+        assert len(items) == 100
+        keys = [(i["created_at"], i["id"]) for i in items]
+        assert keys == sorted(keys, reverse=True)
+        assert len(set(keys)) == 100
+
+    def test_filters(self, db):
+        reader = DecisionReader(db)
+        handoffs = all_pages(reader, to_agent=True)
+        assert len(handoffs) == len([i for i in range(3000) if i % 7 == 0])
+        assert all(i["to_agent"] for i in handoffs)
+        window = all_pages(reader, since="2024-01-02T00:00:00Z", until="2024-01-03T00:00:00Z")
+        assert len(window) == 200
+        assert all(i["created_at"].startswith("2024-01-02") for i in window)
+
+    @pytest.mark.parametrize("filters,index", [
+        ({"zoho_id": "Z1"}, "ix_lead_decisions_zoho_id"),
+        ({"since": "2024-01-02", "until": "2024-01-03"}, "ix_lead_decisions_created_at"),
+        ({"to_agent": True, "since": "2024-01-02"}, "ix_lead_decisions_to_agent"),
+        ({}, "ix_lead_decisions_created_at"),
+    ])
+    def test_explain_uses_covering_index_without_sort(self, db, filters, index):
+        reader = DecisionReader(db)
+        cursor = decision_log.encode_cursor("2024-01-05 10:00:00.000", 1000)
+        for with_cursor in (None, cursor):
+            plan = " | ".join(reader.explain(cursor=with_cursor, **filters))
+            assert f"COVERING INDEX {index}" in plan
+            assert "TEMP B-TREE" not in plan
+            assert "SCAN" not in plan or not filters
+
+    def test_widens_original_zoho_id_index(self, tmp_path):
+        path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute(decision_log.LEAD_DECISIONS_DDL)
+        conn.execute("CREATE INDEX ix_lead_decisions_zoho_id ON lead_decisions (zoho_id)")
+        conn.close()
+        conn = connect(path)
+        assert [r[2] for r in conn.execute("PRAGMA index_info(ix_lead_decisions_zoho_id)")] == ["zoho_id", "created_at"]
+
+    def test_bad_cursor(self, db):
+        with pytest.raises(ValueError):
+            DecisionReader(db).list(cursor="!!not-a-cursor")
+
+
+class TestEndpoints:
+    @pytest.fixture(autouse=True)
+    def reader(self, db, monkeypatch):
+        monkeypatch.setattr(decision_log, "_reader", DecisionReader(db))
+
+    async def test_lead_decisions_pagination(self):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = (await client.get("/api/v1/leads/Z3/decisions", params={"limit": 60})).json()
+            second = (await client.get("/api/v1/leads/Z3/decisions", params={"limit": 60, "cursor": first["next_cursor"]})).json()
+            bad = await client.get("/api/v1/decisions", params={"cursor": "garbage"})
+        assert len(first["items"]) == 60 and len(second["items"]) == 40
+        assert second["next_cursor"] is None
+        assert bad.status_code == 400
+
+    async def test_handoffs_with_data(self):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            page = (await client.get("/api/v1/decisions", params={"to_agent": "true", "limit": 5, "include_data": "true"})).json()
+        assert len(page["items"]) == 5
+        assert all(i["to_agent"] and i["lead_data"] == {} for i in page["items"])
@@ -0,0 +1,154 @@
+"""
+Unit tests for decision retention: partitions, archives, vacuum
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from src.services.decision_log import INSERT_DECISION, DecisionReader, DecisionWriter, connect, partition_tables
+from src.services.decision_retention import RetentionManager, lookup_archived
+
+NOW = datetime(2025, 6, 15, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "decisions.db")
+    conn = connect(path)
+    rows = []
+    # 2024-01 .. 2025-06, 100 rows a month, leads Z0..Z9
+    for m in range(18):
+        year, month = 2024 + m // 12, m % 12 + 1
+        for i in range(100):
+            ts = f"{year}-{month:02d}-{1 + i % 28:02d} 12:00:{i % 60:02d}.000"
+            rows.append((f"Z{i % 10}", "Email", 5, i % 4 == 0, f"{year}-{month:02d}/{i}", '{"n": %d}' % i, ts))
+    with conn:
+        conn.executemany(INSERT_DECISION, rows)
+    conn.close()
+    return path
+
+
+def manager(db, tmp_path, **kwargs):
+    kwargs.setdefault("archive_after_days", 365)
+    return RetentionManager(path=db, archive_dir=str(tmp_path / "archive"), chunk=137, pause=0, **kwargs)
+
+
+def all_pages(reader, **filters):
+    seen, cursor = [], None
+    while True:
+        items, cursor = reader.list(cursor=cursor, limit=73, **filters)
+        seen.extend(items)
+        if cursor is None:
+            return seen
+
+
+class TestPartition:
+    def test_moves_old_months_and_keeps_history_readable(self, db, tmp_path):
+        reader = DecisionReader(db)
+        before = all_pages(reader, zoho_id="Z3")
+        stats = manager(db, tmp_path, archive_after_days=10_000).run_once(now=NOW)
+        assert stats["partitioned"] == 1600 and stats["archived"] == 0
+
+        conn = sqlite3.connect(db)
+        assert conn.execute("SELECT substr(min(created_at), 1, 7), count(*) FROM lead_decisions").fetchone() == ("2025-05", 200)
+        assert len(partition_tables(conn)) == 16
+        assert partition_tables(conn)[0] == "lead_decisions_2025_04"
+        assert [r[1] for r in conn.execute("PRAGMA index_list(lead_decisions_2024_03)")] != []
+
+        reader = DecisionReader(db)
+        assert all_pages(reader, zoho_id="Z3") == before
+        window = all_pages(reader, since="2024-12-01", until="2025-06-01")
+        assert len(window) == 600
+        assert {i["created_at"][:7] for i in window} == {"2024-12", "2025-01", "2025-02", "2025-03", "2025-04", "2025-05"}
+
+    def test_idempotent(self, db, tmp_path):
+        m = manager(db, tmp_path, archive_after_days=10_000)
+        m.run_once(now=NOW)
+        assert m.run_once(now=NOW)["partitioned"] == 0
+
+
+class TestArchive:
+    def test_archive_round_trip_and_lookup(self, db, tmp_path):
+        stats = manager(db, tmp_path).run_once(now=NOW)
+        # months ending on or before 2024-06-15: 2024-01 .. 2024-05
+        assert stats["archived"] == 500
+        files = sorted(os.listdir(tmp_path / "archive"))
+        assert files == [f"lead_decisions-2024-{m:02d}.jsonl.gz" for m in range(1, 6)]
+        with gzip.open(tmp_path / "archive" / files[0], "rt") as fh:
+            records = [json.loads(line) for line in fh]
+        assert len(records) == 100 and records[0]["notes"] == "2024-01/0"
+
+        conn = sqlite3.connect(db)
+        assert "lead_decisions_2024_01" not in partition_tables(conn)
+        assert "lead_decisions_2024_06" in partition_tables(conn)
+
+        archived = list(lookup_archived(db, str(tmp_path / "archive"), "Z3"))
+        assert len(archived) == 50
+        assert {r["created_at"][:7] for r in archived} == {f"2024-{m:02d}" for m in range(1, 6)}
+        assert all(r["zoho_id"] == "Z3" and r["lead_data"] for r in archived)
+        assert list(lookup_archived(db, str(tmp_path / "archive"), "nobody")) == []
+
+    def test_lookup_reads_only_indexed_blocks(self, db, tmp_path, monkeypatch):
+        from src.services import decision_retention
+
+        monkeypatch.setattr(decision_retention, "ARCHIVE_BLOCK", 10)
+        manager(db, tmp_path).run_once(now=NOW)
+        conn = sqlite3.connect(db)
+        blocks = conn.execute("SELECT count(*) FROM lead_decisions_archive_index WHERE zoho_id = 'Z3'").fetchone()[0]
+        # rows cycle through Z0..Z9, so each 10-row block holds one Z3 row
+        assert blocks == 50
+        assert len(list(lookup_archived(db, str(tmp_path / "archive"), "Z3"))) == 50
+
+
+class TestVacuum:
+    def test_incremental_vacuum_returns_pages(self, db, tmp_path):
+        m = manager(db, tmp_path)
+        conn = sqlite3.connect(db)
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        stats = m.run_once(now=NOW)
+        assert stats["vacuumed_pages"] > 0
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+    def test_skips_file_without_incremental_vacuum(self, tmp_path, caplog):
+        path = str(tmp_path / "old.db")
+        sqlite3.connect(path).execute("CREATE TABLE t (x)").connection.close()
+        m = RetentionManager(path=path, archive_dir=str(tmp_path / "a"), pause=0)
+        assert m.run_once(now=NOW)["vacuumed_pages"] == 0
+        assert "convert-vacuum" in caplog.text
+        m.convert_to_incremental_vacuum()
+        assert sqlite3.connect(path).execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+class TestWriterNotBlocked:
+    def test_writer_keeps_committing_during_retention(self, db, tmp_path):
+        writer = DecisionWriter(db, batch_size=10, flush_interval=0.01).start()
+        m = manager(db, tmp_path)
+        stop = threading.Event()
+        latencies = []
+
+        def produce():
+            while not stop.is_set():
+                started = time.perf_counter()
+                writer.submit("Z-live", "Email", 5, False, "", {})
+                latencies.append(time.perf_counter() - started)
+                time.sleep(0.001)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        try:
+            m.run_once(now=NOW)
+        finally:
+            stop.set()
+            producer.join()
+            writer.close()
+        assert writer.dropped == 0
+        assert max(latencies) < 0.05
+        written = sqlite3.connect(db).execute("SELECT count(*) FROM lead_decisions WHERE zoho_id = 'Z-live'").fetchone()[0]
+        assert written == len(latencies)
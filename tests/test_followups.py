@@ -0,0 +1,168 @@
+"""
+Unit tests for the durable follow-up scheduler
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.main import app
+from src.services import followups
+from src.services.followups import FollowupScheduler, followup_due, parse_due
+
+
+async def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+class Planner:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, lead, state, metadata):
+        self.calls.append(lead["zoho_id"])
+        return {"action": "send_message", "metadata": {"ai_notes": f"nudge {lead['zoho_id']}"}}
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "followups.db")
+
+
+class TestDueTimes:
+    def test_plan_hours_win(self):
+        now = 1_000_000.0
+        assert followup_due({"action": "send_message", "metadata": {"suggested_followup_in_hours": 2}}, {}, now) == now + 7200
+        assert followup_due({"metadata": {"suggested_follow_up_in_hours": 48}}, {}, now) == now + 48 * 3600
+
+    def test_state_timestamp_and_cancellation(self):
+        now = parse_due("2026-01-01T00:00:00Z")
+        state = {"next_follow_up_at": "2026-01-02T00:00:00"}
+        assert followup_due({"action": "schedule_followup", "metadata": {}}, state, now) == now + 86400
+        assert followup_due({"action": "schedule_followup", "metadata": {}}, {"next_follow_up_at": "2025-12-31"}, now) is None
+        assert followup_due({"action": "handoff", "metadata": {"suggested_followup_in_hours": 4}}, {}, now) is None
+        assert followup_due({"action": "stop", "metadata": {}}, state, now) is None
+
+
+class TestScheduler:
+    async def test_fires_in_due_order_and_honours_reschedule_and_cancel(self, db):
+        planner = Planner()
+        scheduler = await FollowupScheduler(db, precompute_seconds=0, flush_interval=0.02, planner=planner).start()
+        now = time.time()
+        scheduler.schedule("B", now + 0.10, {"zoho_id": "B"})
+        scheduler.schedule("A", now + 0.05, {"zoho_id": "A"})
+        scheduler.schedule("C", now + 0.05, {"zoho_id": "C"})
+        scheduler.schedule("D", now + 0.05, {"zoho_id": "D"})
+        scheduler.schedule("C", now + 3600)  # rescheduled: keeps its lead, no longer due
+        assert scheduler.cancel("D") and not scheduler.cancel("D")
+
+        await wait_for(lambda: scheduler.ready == 2)
+        items = scheduler.take_ready(10)
+        assert [i["zoho_id"] for i in items] == ["A", "B"]
+        assert items[0]["plan"]["metadata"]["ai_notes"] == "nudge A"
+        assert len(scheduler) == 1 and scheduler.due_at("C") == now + 3600
+        await scheduler.close()
+
+    async def test_pending_follow_ups_survive_restart(self, db):
+        scheduler = await FollowupScheduler(db, flush_interval=0.02, planner=Planner()).start()
+        now = time.time()
+        for i in range(50):
+            scheduler.schedule(f"L{i}", now + 3600 + i, {"zoho_id": f"L{i}", "first_name": "Ann"})
+        scheduler.schedule("soon", now + 0.2, {"zoho_id": "soon"})
+        await scheduler.close()
+
+        planner = Planner()
+        restarted = await FollowupScheduler(db, precompute_seconds=0, flush_interval=0.02, planner=planner).start()
+        assert len(restarted) == 51 and restarted.due_at("L7") == now + 3607
+        await wait_for(lambda: restarted.ready == 1)
+        assert restarted.take_ready()[0]["zoho_id"] == "soon"
+        await restarted.close()
+
+        # delivered follow-ups are gone from the table
+        again = await FollowupScheduler(db, planner=planner).start()
+        assert len(again) == 50 and again.due_at("soon") is None
+        await again.close()
+
+    async def test_each_due_row_fires_on_one_worker_only(self, db):
+        first = await FollowupScheduler(db, flush_interval=0.02, planner=Planner()).start()
+        now = time.time()
+        first.schedule("M", now + 0.3, {"zoho_id": "M"})
+        first.schedule("X", now + 0.3, {"zoho_id": "X"})
+        await first.close()
+
+        workers = [await FollowupScheduler(db, precompute_seconds=0, flush_interval=0.02, planner=Planner()).start() for _ in range(2)]
+        # a stop plan for X lands on a worker; the other one must not fire it either
+        assert workers[1].cancel("X")
+        await wait_for(lambda: sum(w.ready for w in workers) == 1 and not any(len(w) for w in workers))
+        await asyncio.sleep(0.1)
+        assert sum(w.fired for w in workers) == 1
+        assert [i["zoho_id"] for w in workers for i in w.take_ready()] == ["M"]
+        for w in workers:
+            await w.close()
+
+    async def test_cancel_deletes_rows_this_worker_never_loaded(self, db):
+        other = await FollowupScheduler(db, flush_interval=0.02, planner=Planner()).start()
+        this = await FollowupScheduler(db, flush_interval=0.02, planner=Planner()).start()
+        other.schedule("H", time.time() + 3600, {"zoho_id": "H"})
+        await other.close()
+        assert not this.cancel("H")
+        await this.close()
+        restarted = await FollowupScheduler(db, planner=Planner()).start()
+        assert restarted.due_at("H") is None
+        await restarted.close()
+
+    async def test_plans_are_precomputed_before_due(self, db):
+        planner = Planner()
+        scheduler = await FollowupScheduler(db, precompute_seconds=0.2, flush_interval=0.02, planner=planner).start()
+        scheduler.schedule("P", time.time() + 0.3, {"zoho_id": "P"})
+        await wait_for(lambda: planner.calls == ["P"])
+        assert scheduler.ready == 0  # planned, not yet due
+        await wait_for(lambda: scheduler.ready == 1)
+        assert scheduler.take_ready()[0]["plan"]["metadata"]["ai_notes"] == "nudge P"
+        assert planner.calls == ["P"]  # firing reused the stored plan
+        await scheduler.close()
+
+    async def test_webhook_batches_and_retries(self, db):
+        batches, fail = [], [True]
+
+        async def sink(items):
+            if fail[0]:
+                fail[0] = False
+                raise httpx.ConnectError("receiver down")
+            batches.append([i["zoho_id"] for i in items])
+
+        scheduler = await FollowupScheduler(db, precompute_seconds=0, batch_size=3, flush_interval=0.02, planner=Planner(), sink=sink).start()
+        now = time.time()
+        for i in range(5):
+            scheduler.schedule(f"W{i}", now - 1 + i * 0.001, {"zoho_id": f"W{i}"})
+        await wait_for(lambda: len(scheduler) == 3 and scheduler.delivery_failures == 0 and batches)
+        # the first batch failed and was rescheduled with backoff; the rest went out in one batch
+        assert batches == [["W3", "W4"]]
+        assert all(scheduler.due_at(f"W{i}") > now + 1 for i in range(3))
+        await scheduler.close()
+
+
+async def test_planning_endpoints_schedule_follow_ups(db, monkeypatch):
+    scheduler = await FollowupScheduler(db, planner=Planner()).start()
+    monkeypatch.setattr(followups, "_scheduler", scheduler)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        started = time.time()
+        resp = await client.post("/api/v1/next_action", json={"lead": {"zoho_id": "F1", "source": "Website"}, "state": {}})
+        assert resp.status_code == 200
+        hours = resp.json()["metadata"].get("suggested_followup_in_hours") or resp.json()["metadata"]["suggested_follow_up_in_hours"]
+        assert scheduler.due_at("F1") == pytest.approx(started + float(hours) * 3600, abs=5)
+
+        resp = await client.post("/api/v1/respond", json={"zoho_id": "F1", "incoming_text": "please stop messaging me", "channel": "WhatsApp"})
+        assert resp.json()["action"] in ("stop", "handoff")
+        assert scheduler.due_at("F1") is None
+
+        assert (await client.get("/api/v1/followups/due")).json() == {"items": [], "pending": 0}
+        assert (await client.delete("/api/v1/followups/F1")).status_code == 404
+    await scheduler.close()
@@ -0,0 +1,122 @@
+"""
+Unit tests for idempotent planning requests
+"""
+
+import asyncio
+import itertools
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from src.api.idempotency import IdempotencyMiddleware
+from src.services.idempotency import MemoryIdempotencyStore, SqliteIdempotencyStore, StoredResponse
+
+
+def make_app(store, delay=0.0):
+    app = FastAPI()
+    counter = itertools.count(1)
+    app.state.calls = 0
+
+    @app.post("/api/v1/next_action")
+    async def plan(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        await asyncio.sleep(delay)
+        return {"plan_id": f"plan-{next(counter)}", "echo": body}
+
+    @app.post("/api/v1/lead")
+    async def lead():
+        app.state.calls += 1
+        return {"n": app.state.calls}
+
+    app.add_middleware(IdempotencyMiddleware, store=store)
+    return app
+
+
+def client_for(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+class TestIdempotencyMiddleware:
+    async def test_header_key_replays_byte_for_byte(self):
+        app = make_app(MemoryIdempotencyStore())
+        async with client_for(app) as client:
+            first = await client.post("/api/v1/next_action", json={"a": 1}, headers={"Idempotency-Key": "k1"})
+            second = await client.post("/api/v1/next_action", json={"a": 1}, headers={"Idempotency-Key": "k1"})
+        assert app.state.calls == 1
+        assert second.content == first.content
+        assert second.headers["idempotent-replayed"] == "true"
+
+    async def test_key_reuse_with_different_body_is_rejected(self):
+        app = make_app(MemoryIdempotencyStore())
+        async with client_for(app) as client:
+            await client.post("/api/v1/next_action", json={"a": 1}, headers={"Idempotency-Key": "k1"})
+            resp = await client.post("/api/v1/next_action", json={"a": 2}, headers={"Idempotency-Key": "k1"})
+        assert resp.status_code == 422
+
+    async def test_requests_without_a_key_are_not_deduplicated(self):
+        app = make_app(MemoryIdempotencyStore())
+        payload = {"lead": {"zoho_id": "Z1"}, "metadata": {"thread_key": "t-1"}}
+        async with client_for(app) as client:
+            first = await client.post("/api/v1/next_action", json=payload)
+            second = await client.post("/api/v1/next_action", json=payload)
+        assert second.json()["plan_id"] != first.json()["plan_id"]
+        assert "idempotent-replayed" not in second.headers
+        assert app.state.calls == 2
+
+    async def test_concurrent_duplicate_waits_for_inflight(self):
+        app = make_app(MemoryIdempotencyStore(), delay=0.05)
+        async with client_for(app) as client:
+            responses = await asyncio.gather(
+                *[client.post("/api/v1/next_action", json={"a": 1}, headers={"Idempotency-Key": "same"}) for _ in range(5)]
+            )
+        assert app.state.calls == 1
+        assert len({r.content for r in responses}) == 1
+
+    async def test_retry_during_a_slow_store_read_runs_once(self):
+        class SlowStore(MemoryIdempotencyStore):
+            async def get(self, key):
+                record = await super().get(key)
+                await asyncio.sleep(0.2)  # a shared store's reply is a round trip away
+                return record
+
+        app = make_app(SlowStore(), delay=0.2)
+        async with client_for(app) as client:
+            post = lambda: client.post("/api/v1/next_action", json={"a": 1}, headers={"Idempotency-Key": "slow"})  # noqa: E731
+            first = asyncio.ensure_future(post())
+            await asyncio.sleep(0.3)  # the first request is running; its record is not stored yet
+            retry = await post()
+            first = await first
+        assert app.state.calls == 1
+        assert retry.content == first.content
+
+    async def test_other_paths_untouched(self):
+        app = make_app(MemoryIdempotencyStore())
+        async with client_for(app) as client:
+            await client.post("/api/v1/lead", headers={"Idempotency-Key": "k"})
+            await client.post("/api/v1/lead", headers={"Idempotency-Key": "k"})
+        assert app.state.calls == 2
+
+
+class TestStores:
+    @pytest.fixture(params=["memory", "sqlite"])
+    def store(self, request, tmp_path):
+        if request.param == "memory":
+            return MemoryIdempotencyStore(ttl=60, max_entries=2)
+        return SqliteIdempotencyStore(str(tmp_path / "idem.db"), ttl=60, max_entries=2)
+
+    async def test_roundtrip(self, store):
+        record = StoredResponse(200, [(b"content-type", b"application/json")], b'{"a":1}', "f")
+        await store.put("k", record)
+        assert await store.get("k") == record
+        assert await store.get("missing") is None
+
+    async def test_memory_store_is_bounded_and_expires(self):
+        store = MemoryIdempotencyStore(ttl=0.01, max_entries=2)
+        for key in "abc":
+            await store.put(key, StoredResponse(200, [], b"", ""))
+        assert len(store) == 2
+        assert await store.get("a") is None
+        await asyncio.sleep(0.02)
+        assert await store.get("c") is None
@@ -0,0 +1,174 @@
+"""
+Unit tests for Zoho webhook ingestion (dedupe, debounce, bounded work queue)
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.main import app
+from src.api import agent
+from src.services.ingest import Deduper, WebhookIngestor, lead_from_webhook
+
+
+class Recorder:
+    def __init__(self, block: asyncio.Event = None):
+        self.payloads = []
+        self.block = block
+
+    async def __call__(self, payload):
+        if self.block is not None:
+            await self.block.wait()
+        self.payloads.append(dict(payload))
+
+
+async def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.005)
+
+
+def test_lead_from_zoho_record():
+    lead = lead_from_webhook({
+        "id": 4876876000001, "First_Name": "Ann", "Email": "ann@example.com", "Mobile": "+44 7700",
+        "Lead_Source": "Harrods", "Description": "", "Interests": "Cot; Mattress", "Modified_Time": "2026-01-01T10:00:00+00:00",
+    })
+    assert lead == {"zoho_id": "4876876000001", "first_name": "Ann", "email": "ann@example.com", "phone": "+44 7700",
+                    "source": "Harrods", "interests": ["Cot", "Mattress"]}
+    assert lead_from_webhook({"zoho_id": "Z1", "first_name": "Bo"}) == {"zoho_id": "Z1", "first_name": "Bo"}
+
+
+def test_deduper_is_bounded():
+    d = Deduper(max_size=3)
+    assert [d.seen(k) for k in "abca"] == [False, False, False, True]
+    d.seen("d")  # evicts "a"
+    assert len(d) == 3 and not d.seen("a") and d.seen("d")
+
+
+class TestIngestor:
+    async def test_duplicates_dropped_and_edits_coalesced(self):
+        rec = Recorder()
+        ing = WebhookIngestor(rec, debounce=0.05, max_delay=1.0).start()
+        edit = {"id": "Z1", "Modified_Time": "t1", "First_Name": "Ann"}
+        assert ing.accept(edit) == "accepted"
+        assert ing.accept(dict(edit)) == "duplicate"
+        assert ing.accept({"id": "Z1", "Modified_Time": "t2", "City": "London"}) == "coalesced"
+        assert ing.accept({"id": "Z2", "Modified_Time": "t1"}) == "accepted"
+        await wait_for(lambda: len(rec.payloads) == 2)
+        merged = next(p for p in rec.payloads if p["id"] == "Z1")
+        assert merged == {"id": "Z1", "Modified_Time": "t2", "First_Name": "Ann", "City": "London"}
+        assert ing.stats()["duplicate"] == 1 and ing.pending == 0
+        await ing.close()
+
+    async def test_max_delay_bounds_a_stream_of_edits(self):
+        rec = Recorder()
+        ing = WebhookIngestor(rec, debounce=0.05, max_delay=0.12).start()
+        for i in range(15):
+            ing.accept({"id": "Z1", "Modified_Time": str(i)})
+            await asyncio.sleep(0.02)
+        await wait_for(lambda: ing.pending == 0)
+        await wait_for(lambda: ing.queue.empty())
+        # planned every ~max_delay while edits keep coming, not once per edit nor only at the end
+        assert 2 <= len(rec.payloads) <= 4
+
+    async def test_bounded_queue_backpressure(self):
+        gate = asyncio.Event()
+        rec = Recorder(block=gate)
+        ing = WebhookIngestor(rec, debounce=0.01, workers=1, queue_size=1, max_pending=2).start()
+        assert ing.accept({"id": "A", "Modified_Time": "1"}) == "accepted"
+        await wait_for(lambda: ing.pending == 0)  # handed to the (blocked) worker
+        assert ing.accept({"id": "B", "Modified_Time": "1"}) == "accepted"
+        await wait_for(lambda: ing.queue.full())
+        assert ing.accept({"id": "C", "Modified_Time": "1"}) == "accepted"
+        assert ing.accept({"id": "D", "Modified_Time": "1"}) == "accepted"
+        assert ing.accept({"id": "E", "Modified_Time": "1"}) == "refused"
+        await wait_for(lambda: ing.counts["requeued"] >= 1)
+        gate.set()
+        await wait_for(lambda: len(rec.payloads) == 4)
+        assert sorted(p["id"] for p in rec.payloads) == ["A", "B", "C", "D"]
+        await ing.close()
+
+    async def test_refused_delivery_is_accepted_on_retry(self):
+        rec = Recorder()
+        ing = WebhookIngestor(rec, debounce=60, max_pending=1).start()
+        assert ing.accept({"id": "A", "Modified_Time": "1"}) == "accepted"
+        retry = {"id": "B", "Modified_Time": "1"}
+        assert ing.accept(retry) == "refused"
+        ing._release("A")  # capacity frees up
+        assert ing.accept(dict(retry)) == "accepted"
+        assert ing.accept(dict(retry)) == "duplicate"
+        await wait_for(lambda: [p["id"] for p in rec.payloads] == ["A"])
+        await ing.close()
+
+    async def test_accept_is_sub_millisecond(self):
+        ing = WebhookIngestor(Recorder(), debounce=60).start()
+        timings = []
+        for i in range(5000):
+            payload = {"id": f"Z{i % 500}", "Modified_Time": str(i), "First_Name": "Ann", "Email": "a@example.com"}
+            started = time.perf_counter()
+            ing.accept(payload)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        assert timings[int(len(timings) * 0.99)] < 0.001
+        await ing.close()
+
+
+class TestEndpoint:
+    async def test_acks_and_dedupes(self, monkeypatch):
+        rec = Recorder()
+        ing = WebhookIngestor(rec, debounce=0.02).start()
+        monkeypatch.setattr(agent, "_ingestor", ing)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            first = await client.post("/api/v1/zoho/webhook", json={"id": "Z9", "Modified_Time": "t1"})
+            again = await client.post("/api/v1/zoho/webhook", json={"id": "Z9", "Modified_Time": "t1"})
+            form = await client.post("/api/v1/zoho/webhook", data={"id": "Z8", "Email": "bo@example.com"})
+            batch = await client.post("/api/v1/zoho/webhook", json={"data": [{"id": "Z7"}, {"id": "Z6"}]})
+            bad = await client.post("/api/v1/zoho/webhook", json={"First_Name": "no id"})
+        assert (first.status_code, first.json()) == (202, {"status": "accepted"})
+        assert again.json() == {"status": "duplicate"}
+        assert form.status_code == 202 and batch.json() == {"status": ["accepted", "accepted"]}
+        assert bad.status_code == 400
+        await wait_for(lambda: len(rec.payloads) == 4)
+        await ing.close()
+
+    async def test_token_and_disabled(self, monkeypatch):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            assert (await client.post("/api/v1/zoho/webhook", json={"id": "Z1"})).status_code == 503
+            monkeypatch.setenv("ZOHO_WEBHOOK_TOKEN", "s3cret")
+            assert (await client.post("/api/v1/zoho/webhook", json={"id": "Z1"})).status_code == 401
+            monkeypatch.setattr(agent, "_ingestor", WebhookIngestor(Recorder()).start())
+            ok = await client.post("/api/v1/zoho/webhook?token=s3cret", json={"id": "Z1"})
+            assert ok.status_code == 202
+            await agent._ingestor.close()
+
+    async def test_webhook_edit_is_planned_and_pushed(self, monkeypatch):
+        pushed = []
+        monkeypatch.setattr(agent, "emit", lambda event_type, data: pushed.append((event_type, data)))
+        ing = WebhookIngestor(agent._plan_from_webhook, debounce=0.01).start()
+        monkeypatch.setattr(agent, "_ingestor", ing)
+        record = {"id": "P1", "First_Name": "Ann", "Email": "ann@example.com", "Lead_Source": "Website", "Modified_Time": "t"}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            assert (await client.post("/api/v1/zoho/webhook", json=record)).status_code == 202
+        await wait_for(lambda: pushed)
+        event_type, data = pushed[0]
+        assert event_type == "plan" and data["zoho_id"] == "P1"
+        assert data["thread_key"] == "ann@example.com-Website"
+        assert data["plan"]["action"] and data["plan"]["metadata"]["thread_key"] == "ann@example.com-Website"
+        await ing.close()
+
+    async def test_webhook_preferred_channel_reaches_the_planner(self, monkeypatch):
+        pushed = []
+        monkeypatch.setattr(agent, "emit", lambda event_type, data: pushed.append((event_type, data)))
+        ing = WebhookIngestor(agent._plan_from_webhook, debounce=0.01).start()
+        monkeypatch.setattr(agent, "_ingestor", ing)
+        record = {"id": "P2", "First_Name": "Mei", "Email": "mei@example.com", "Lead_Source": "Website",
+                  "Preferred_Channel": "WhatsApp", "Modified_Time": "t"}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            assert (await client.post("/api/v1/zoho/webhook", json=record)).status_code == 202
+        await wait_for(lambda: pushed)
+        assert pushed[0][1]["plan"]["channel"] == "WhatsApp"
+        await ing.close()
@@ -0,0 +1,135 @@
+"""
+Unit tests for the inbound intent classifier and the /respond short-circuit
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from src.api import agent
+from src.services.intent import classify, classify_inbound, classifier_stats, followup_hours
+
+
+class TestClassify:
+    @pytest.mark.parametrize(
+        ("text", "outcome"),
+        [
+            ("STOP", "opt_out"),
+            ("Please unsubscribe me", "opt_out"),
+            ("not interested, thanks", "opt_out"),
+            ("call me tomorrow", "wants_call"),
+            ("Can someone ring me after 5?", "wants_call"),
+            ("I'm busy right now", "busy"),
+            ("Not a good time, will get back to you", "busy"),
+            ("how much is the Balmoral cot", "asked_price"),
+            ("What's the price of the Windsor wardrobe?", "asked_price"),
+        ],
+    )
+    def test_confident_matches(self, text, outcome):
+        match = classify(text)
+        assert match.outcome == outcome
+        assert match.confident
+
+    def test_opt_out_takes_precedence(self):
+        assert classify("how much? actually stop messaging me").outcome == "opt_out"
+
+    def test_open_questions_fall_through(self):
+        assert not classify("Do you have the cot in sage green?").confident
+        assert not classify("maybe tomorrow").confident
+
+    @pytest.mark.parametrize("text", ["Please don't phone me again", "don't ring me", "Do not call me"])
+    def test_negated_call_requests_are_opt_outs(self, text):
+        assert classify(text).outcome == "opt_out"
+
+    def test_negated_call_is_not_a_call_request(self):
+        assert classify("no need to call me, email is fine").outcome != "wants_call"
+
+    @pytest.mark.parametrize(
+        ("text", "outcome"),
+        [
+            ("No thanks, how much is the Balmoral?", "asked_price"),
+            ("I already ordered the cot, when will it arrive?", None),
+            ("Can we talk about the price?", "asked_price"),
+        ],
+    )
+    def test_questions_are_not_opt_outs_or_call_requests(self, text, outcome):
+        assert classify(text).outcome == outcome
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "Don't call me until next week",
+            "Please don't email me, WhatsApp is better",
+            "Please don't call me, email instead",
+            "I'm not interested in the wardrobe but how much is the cot?",
+        ],
+    )
+    def test_deferrals_and_channel_preferences_are_not_opt_outs(self, text):
+        match = classify(text)
+        assert match.outcome != "opt_out"
+        assert not (match.outcome == "wants_call" and match.confident)
+
+    def test_plain_decline_still_opts_out(self):
+        assert classify("No thanks").outcome == "opt_out"
+        assert classify("Can we talk tomorrow?").outcome == "wants_call"
+
+    def test_followup_hours(self):
+        assert followup_hours("busy, try next week") == 168
+        assert followup_hours("busy") == 48
+
+    def test_coverage_counts(self):
+        before = classifier_stats()
+        classify_inbound("stop")
+        classify_inbound("tell me about your fabrics")
+        after = classifier_stats()
+        assert after["total"] == before["total"] + 2
+        assert after["confident"] == before["confident"] + 1
+
+
+class TestRespondShortCircuit:
+    def _respond(self, text):
+        with TestClient(app) as client:
+            return client.post("/api/v1/respond", json={"zoho_id": "Z1", "incoming_text": text, "channel": "WhatsApp"}).json()
+
+    @pytest.fixture(autouse=True)
+    def no_llm(self, monkeypatch):
+        async def fail(*args, **kwargs):
+            raise AssertionError("plan_next_action should not be called")
+
+        monkeypatch.setattr(agent, "plan_next_action", fail)
+
+    def test_stop(self):
+        plan = self._respond("STOP")
+        assert plan["action"] == "stop"
+        assert plan["message"] is None
+        assert plan["store"]["last_outcome"] == "opt_out"
+
+    def test_call_request_hands_off(self):
+        plan = self._respond("call me tomorrow please")
+        assert plan["action"] == "handoff"
+        assert plan["channel"] == "Phone"
+        assert plan["metadata"]["to_agent"] is True
+
+    def test_busy_schedules_followup(self):
+        plan = self._respond("busy this week, message me next week")
+        assert plan["action"] == "schedule_followup"
+        assert plan["metadata"]["suggested_followup_in_hours"] == 168
+
+    def test_busy_followup_uses_the_inbound_channel(self):
+        plan = self._respond("busy right now")
+        assert plan["action"] == "schedule_followup"
+        assert plan["channel"] == "WhatsApp"
+
+    def test_short_circuit_keeps_the_thread_key(self):
+        with TestClient(app) as client:
+            plan = client.post("/api/v1/respond", json={
+                "zoho_id": "Z1", "incoming_text": "STOP", "channel": "WhatsApp", "thread_key": "ann-web",
+            }).json()
+        assert plan["action"] == "stop"
+        assert plan["metadata"]["thread_key"] == "ann-web"
+
+    def test_price_question_gets_deterministic_reply(self):
+        plan = self._respond("how much is the Balmoral cot?")
+        assert plan["action"] == "send_message"
+        assert plan["metadata"]["last_outcome"] == "asked_price"
+        assert plan["metadata"]["to_agent"] is True
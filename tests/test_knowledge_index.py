@@ -0,0 +1,55 @@
+"""
+Unit tests for the BM25 knowledge index
+"""
+
+import json
+
+from src.services import packs
+from src.services.knowledge_index import KnowledgeIndex, analyze, search_knowledge
+from src.services.llm_service import _mock_action_plan
+
+DOCUMENTS = [
+    {"id": "balmoral", "title": "Balmoral Cot Bed", "text": "Solid beech cot bed that converts to a junior bed.", "price": "£1,450", "dimensions": "144 x 77 cm", "lead_time": "6-8 weeks"},
+    {"id": "windsor", "title": "Windsor Wardrobe", "text": "Double wardrobe with hanging rail and two drawers.", "price": "£2,100", "lead_time": "8-10 weeks"},
+    {"id": "delivery", "title": "Delivery", "text": "We deliver across the UK; white-glove assembly is included on all furniture."},
+]
+
+
+class TestAnalyze:
+    def test_stems_and_maps_synonyms(self):
+        assert analyze("Cribs and cots") == ["cot", "cot"]
+        assert analyze("How much is delivery pricing?") == ["price", "delivery", "price"]
+
+
+class TestKnowledgeIndex:
+    def test_ranks_relevant_document_first(self):
+        index = KnowledgeIndex(DOCUMENTS)
+        hits = index.search("how much is the balmoral crib", k=2)
+        assert hits[0]["id"] == "balmoral"
+        assert hits[0]["price"] == "£1,450"
+        assert hits[0]["lead_time"] == "6-8 weeks"
+
+    def test_unknown_terms_return_nothing(self):
+        assert KnowledgeIndex(DOCUMENTS).search("zzz qqq") == []
+
+    def test_postings_are_impact_ordered_arrays(self):
+        index = KnowledgeIndex(DOCUMENTS)
+        weights = index.post_weights[index.term_ids["cot"]]
+        assert weights.typecode == "f"
+        assert list(weights) == sorted(weights, reverse=True)
+
+
+class TestPlannerGrounding:
+    def test_plan_metadata_carries_snippets(self, tmp_path, monkeypatch):
+        src = tmp_path / "knowledge.json"
+        src.write_text(json.dumps({"documents": DOCUMENTS}))
+        loader = packs.PackLoader({"knowledge": str(src)}, ttl=600, cache_dir=str(tmp_path / "cache"))
+        loader.refresh("knowledge")
+        monkeypatch.setattr(packs, "_loader", loader)
+
+        assert search_knowledge("windsor wardrobe lead time")[0]["id"] == "windsor"
+        plan = _mock_action_plan(
+            {"zoho_id": "1", "name": "Ann", "email": "a@b.com", "source": "Website"},
+            {"history": [{"role": "customer", "text": "How big is the Balmoral cot bed?"}]},
+        )
+        assert plan["metadata"]["knowledge"][0]["dimensions"] == "144 x 77 cm"
@@ -0,0 +1,110 @@
+"""
+Unit tests for the metrics registry, request middleware and /metrics endpoint
+"""
+
+import re
+from time import perf_counter
+from types import SimpleNamespace
+
+import httpx
+
+from app.main import app
+from src.services import metrics
+from src.services.metrics import Registry
+
+
+def sample(text: str, name: str, **labels) -> float:
+    """Value of one exposition line, matching a subset of its labels."""
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            if all(f'{k}="{v}"' in line for k, v in labels.items()):
+                return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"no sample {name} {labels}")
+
+
+def test_counter_and_histogram_exposition():
+    reg = Registry(prefix="t_")
+    c = reg.counter("things_total", "Things", ("kind",))
+    c.labels("a").inc()
+    c.labels("a").inc(2)
+    c.labels('q"uote').inc()
+    h = reg.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v)
+    text = reg.render().decode()
+    assert "# TYPE t_things_total counter" in text
+    assert 't_things_total{kind="a"} 3' in text
+    assert 't_things_total{kind="q\\"uote"} 1' in text
+    assert "# TYPE t_latency_seconds histogram" in text
+    assert 't_latency_seconds_bucket{le="0.1"} 2' in text  # le is inclusive
+    assert 't_latency_seconds_bucket{le="1"} 3' in text
+    assert 't_latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "t_latency_seconds_count 4" in text and "t_latency_seconds_sum 3.65" in text
+
+
+def test_collectors_are_read_at_scrape_time_and_isolated():
+    reg = Registry()
+    depth = {"value": 1}
+    reg.collector(lambda: [("depth", "gauge", "Depth", [({"queue": "q"}, depth["value"])])])
+    reg.collector(lambda: 1 / 0)
+    depth["value"] = 7
+    text = reg.render().decode()
+    assert 'depth{queue="q"} 7' in text
+    assert "# collector <lambda> failed: division by zero" in text
+
+
+def test_llm_calls_record_latency_and_tokens():
+    before = metrics.LLM_TOKENS.labels("test_call", "prompt").value
+    metrics.record_llm_call("test_call", perf_counter(), SimpleNamespace(usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30)))
+    metrics.record_llm_call("test_call", perf_counter())
+    assert metrics.LLM_TOKENS.labels("test_call", "prompt").value == before + 120
+    assert sum(metrics.LLM_REQUESTS.labels("test_call", "error").counts) == 1
+
+
+async def test_endpoint_reports_routes_stages_and_queues():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        body = {"lead": {"zoho_id": "M1", "first_name": "Ann", "email": "ann@example.com", "source": "Website"}, "metadata": {"thread_key": "m-1"}}
+        assert (await client.post("/api/v1/next_action", json=body, headers={"Idempotency-Key": "m1"})).status_code == 200
+        await client.post("/api/v1/next_action", json=body, headers={"Idempotency-Key": "m1"})
+        await client.post("/api/v1/respond", json={"zoho_id": "M1", "incoming_text": "STOP", "channel": "WhatsApp"})
+        await client.get("/api/v1/leads/Z123/decisions")
+        await client.get("/api/v1/nope")
+        resp = await client.get("/metrics")
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = resp.text
+
+    name = "lead_agent_http_request_duration_seconds_count"
+    assert sample(text, name, route="/api/v1/next_action", method="POST", status="200") >= 2
+    assert sample(text, name, route="/api/v1/leads/{zoho_id}/decisions", method="GET") >= 1
+    assert sample(text, name, route="unmatched", status="404") >= 1
+    assert "Z123" not in text  # ids never become label values
+
+    for stage in ("parse", "conversation", "mock_plan", "record", "serialize"):
+        assert sample(text, "lead_agent_planner_stage_duration_seconds_count", stage=stage) >= 1
+    assert sample(text, "lead_agent_cache_requests_total", cache="idempotency", result="hit") >= 1
+    assert sample(text, "lead_agent_queue_depth", queue="admission", field="max_queue") > 0
+    assert sample(text, "lead_agent_intent_messages_total") >= 1
+    assert sample(text, "lead_agent_intent_short_circuits_total", outcome="opt_out") >= 1
+    assert 0 < sample(text, "lead_agent_intent_coverage_ratio") <= 1
+    assert re.search(r'lead_agent_lru_cache_requests_total\{cache="knowledge_stem",result="hit"\} \d+', text)
+
+
+async def test_shed_requests_are_labelled_by_path():
+    inner = metrics.HTTP_REQUESTS.labels("/api/v1/respond", "POST", "503")
+    before = sum(inner.counts)
+
+    async def shed(scope, receive, send):  # what AdmissionMiddleware does before routing
+        await send({"type": "http.response.start", "status": 503, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    from src.api.metrics import MetricsMiddleware
+
+    mw = MetricsMiddleware(shed, enabled=True)
+    scope = {"type": "http", "method": "POST", "path": "/api/v1/respond", "app": app}
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await mw(scope, None, send)
+    assert sum(inner.counts) == before + 1 and sent[0]["status"] == 503
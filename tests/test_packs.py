@@ -0,0 +1,81 @@
+"""
+Unit tests for the brand/knowledge pack loader
+"""
+
+import json
+import os
+import time
+
+import httpx
+
+from src.services.packs import PackLoader
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestPackLoader:
+    def test_get_never_blocks_and_loads_in_background(self, tmp_path):
+        src = tmp_path / "brand.json"
+        src.write_text(json.dumps({"signoff": {"name": "Ava"}}))
+        loader = PackLoader({"brand": str(src)}, ttl=60, cache_dir=str(tmp_path / "cache"))
+
+        assert loader.get("brand") is None
+        assert _wait_for(lambda: loader.get("brand") is not None)
+        assert loader.get("brand").get("signoff.name") == "Ava"
+
+    def test_stale_pack_is_served_while_revalidating(self, tmp_path):
+        src = tmp_path / "brand.json"
+        src.write_text(json.dumps({"v": 1}))
+        loader = PackLoader({"brand": str(src)}, ttl=0.05, cache_dir=str(tmp_path / "cache"))
+        loader.refresh("brand")
+
+        src.write_text(json.dumps({"v": 2}))
+        os.utime(src, ns=(time.time_ns(), time.time_ns() + 10**9))
+        time.sleep(0.06)
+
+        assert loader.get("brand").get("v") == 1
+        assert _wait_for(lambda: loader.get("brand").get("v") == 2)
+
+    def test_conditional_get_uses_etag(self, tmp_path):
+        seen = []
+
+        def handler(request):
+            seen.append(request.headers.get("if-none-match"))
+            if request.headers.get("if-none-match") == '"abc"':
+                return httpx.Response(304)
+            return httpx.Response(200, json={"documents": []}, headers={"ETag": '"abc"'})
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        loader = PackLoader({"knowledge": "https://packs.test/knowledge.json"}, ttl=0, cache_dir=str(tmp_path), client=client)
+
+        first = loader.refresh("knowledge")
+        second = loader.refresh("knowledge")
+
+        assert seen == [None, '"abc"']
+        assert second is first
+        assert second.fetched_at >= first.fetched_at
+
+    def test_workers_share_the_disk_copy(self, tmp_path):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url)
+            return httpx.Response(200, json={"signoff": {"name": "Ava"}})
+
+        cache = str(tmp_path / "cache")
+        sources = {"brand": "https://packs.test/brand.json"}
+        worker_a = PackLoader(sources, ttl=60, cache_dir=cache, client=httpx.Client(transport=httpx.MockTransport(handler)))
+        worker_b = PackLoader(sources, ttl=60, cache_dir=cache, client=httpx.Client(transport=httpx.MockTransport(handler)))
+
+        worker_a.refresh("brand")
+        pack = worker_b.refresh("brand")
+
+        assert len(calls) == 1
+        assert pack.get("signoff.name") == "Ava"
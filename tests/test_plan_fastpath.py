@@ -0,0 +1,45 @@
+"""
+Unit tests for the trusted ActionPlan fast path
+"""
+
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from src.api.agent import ActionPlan
+from src.services.llm_service import _mock_action_plan
+
+LEAD = {"zoho_id": "Z1", "name": "Ann Lee", "email": "ann@example.com", "source": "Website", "interests": ["cot bed"]}
+
+
+class TestTrustedPlan:
+    def test_matches_validated_model(self):
+        plan = _mock_action_plan(LEAD, {"preferred_channel": "WhatsApp"}, {"thread_key": "t-1"})
+        assert ActionPlan.trusted(plan).model_dump() == ActionPlan(**plan).model_dump()
+
+    def test_plan_without_message(self):
+        trusted = ActionPlan.trusted({"plan_id": "p", "action": "wait_for_update", "message": None, "metadata": {"priority": 5}})
+        assert trusted.message is None
+        assert trusted.model_dump() == ActionPlan(plan_id="p", action="wait_for_update", metadata={"priority": 5}).model_dump()
+
+    def test_string_message_becomes_body(self):
+        trusted = ActionPlan.trusted({"plan_id": "p", "action": "send_message", "message": "hello"})
+        assert trusted.message.body == "hello"
+        assert json.loads(trusted.model_dump_json())["message"] == {"subject": None, "body": "hello", "whatsapp_text": None}
+
+
+class TestEndpoints:
+    def test_next_action_response_shape(self):
+        with TestClient(app) as client:
+            resp = client.post("/api/v1/next_action", json={"lead": LEAD, "metadata": {"thread_key": "t-1"}})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "application/json"
+        body = resp.json()
+        assert ActionPlan(**body).model_dump() == body
+        assert body["metadata"]["thread_key"] == "t-1"
+
+    def test_invalid_request_still_validated(self):
+        with TestClient(app) as client:
+            resp = client.post("/api/v1/next_action", json={"lead": {"name": "no id"}})
+        assert resp.status_code == 422
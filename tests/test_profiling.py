@@ -0,0 +1,97 @@
+"""
+Unit tests for header-triggered request profiling
+"""
+
+import json
+import time
+
+import httpx
+import pytest
+
+from app.main import app
+from src.api.profiling import ProfilingMiddleware
+from src.services import profiling
+from src.services.profiling import RequestProfiler
+
+SECRET = "prof-s3cret"
+LEAD = {"lead": {"zoho_id": "P1", "first_name": "Ann", "email": "ann@example.com", "source": "Website"}}
+
+
+@pytest.fixture
+def profiler(monkeypatch, tmp_path):
+    p = RequestProfiler(SECRET, str(tmp_path / "profiles"), min_interval=0)
+    monkeypatch.setattr(profiling, "_profiler", p)
+    return p
+
+
+def busy_planner(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(i * i for i in range(200))
+
+
+async def slow_app(scope, receive, send):
+    busy_planner(0.08)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def call(mw, token=None):
+    headers = [(b"x-profile-token", token.encode())] if token else []
+    scope = {"type": "http", "method": "POST", "path": "/api/v1/next_action", "headers": headers}
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await mw(scope, None, send)
+    return dict(sent[0]["headers"])
+
+
+async def test_profiles_only_with_the_secret(profiler):
+    mw = ProfilingMiddleware(slow_app, profiler)
+    assert b"x-profile" not in await call(mw)
+    assert b"x-profile" not in await call(mw, "wrong")
+    link = (await call(mw, SECRET))[b"x-profile"].decode()
+    assert link.startswith("/api/v1/profiles/") and link.endswith(".speedscope.json")
+
+    path = profiler.path_for(link.rsplit("/", 1)[1])
+    with open(path) as f:
+        doc = json.load(f)
+    frames = [fr["name"] for fr in doc["shared"]["frames"]]
+    sampled = doc["profiles"][0]
+    assert "busy_planner" in frames
+    assert len(sampled["samples"]) == len(sampled["weights"]) and sampled["endValue"] > 0.02
+
+
+async def test_collapsed_format(tmp_path):
+    p = RequestProfiler(SECRET, str(tmp_path), fmt="collapsed", min_interval=0)
+    link = (await call(ProfilingMiddleware(slow_app, p), SECRET))[b"x-profile"].decode()
+    with open(p.path_for(link.rsplit("/", 1)[1])) as f:
+        lines = f.read().splitlines()
+    assert any("slow_app (tests/test_profiling.py" in line and "busy_planner" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+async def test_rate_limited(tmp_path):
+    p = RequestProfiler(SECRET, str(tmp_path), min_interval=60)
+    mw = ProfilingMiddleware(slow_app, p)
+    assert (await call(mw, SECRET))[b"x-profile"].startswith(b"/api/v1/profiles/")
+    assert (await call(mw, SECRET))[b"x-profile"] == b"rate-limited"
+    assert p.profiles == 1 and p.limited == 1
+
+
+def test_disabled_without_secret(tmp_path):
+    p = RequestProfiler(None, str(tmp_path))
+    assert not p.enabled and not p.authorized("")
+
+
+async def test_endpoint_profile_download(profiler):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.post("/api/v1/next_action", json=LEAD, headers={"x-profile-token": SECRET})
+        assert resp.status_code == 200
+        link = resp.headers["x-profile"]
+        assert (await client.get(link)).status_code == 403
+        assert (await client.get("/api/v1/profiles/..%2Fsecrets", headers={"x-profile-token": SECRET})).status_code == 404
+        profile = await client.get(link, headers={"x-profile-token": SECRET})
+    assert profile.status_code == 200 and profile.json()["profiles"][0]["type"] == "sampled"
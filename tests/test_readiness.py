@@ -0,0 +1,136 @@
+"""
+Unit tests for the LLM circuit breaker and the cached readiness endpoint
+"""
+
+import json
+import time
+
+import httpx
+import pytest
+
+from app.main import app
+from src.services import admission, llm_breaker
+from src.services.llm_breaker import LLMBreaker
+from src.services.readiness import ReadinessProbe
+
+
+@pytest.fixture
+def probe(monkeypatch, tmp_path):
+    monkeypatch.delenv("MOCK_LLM", raising=False)
+    p = ReadinessProbe(interval=60, decisions_db=str(tmp_path / "decisions.db"))
+    monkeypatch.setattr("src.services.readiness._probe", p)
+    return p
+
+
+async def get_ready():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.get("/api/v1/ready")
+    return resp.status_code, resp.json()
+
+
+class TestBreaker:
+    def test_consecutive_failures_open_then_half_open_trial(self):
+        b = LLMBreaker(failures=3, cooldown=0.05)
+        for _ in range(3):
+            assert b.allow()
+            b.record(False)
+        assert b.state == "open" and not b.allow() and b.skipped == 1
+        time.sleep(0.06)
+        assert b.allow() and b.state == "half_open"
+        assert not b.allow()  # only one trial in flight
+        b.record(False)
+        assert b.state == "open" and b.opened == 2
+        time.sleep(0.06)
+        assert b.allow()
+        b.record(True)
+        assert b.state == "closed" and b.allow()
+
+    def test_error_rate_trips_without_consecutive_run(self):
+        b = LLMBreaker(failures=100, error_rate=0.5, min_calls=10)
+        for i in range(9):
+            b.record(i % 2 == 0)
+        assert b.state == "closed"  # below min_calls
+        b.record(False)
+        assert b.state == "open" and b.error_rate() == 0.5
+
+    async def test_open_breaker_skips_openai(self, monkeypatch):
+        from src.services import llm_service
+
+        monkeypatch.delenv("MOCK_LLM", raising=False)
+        b = LLMBreaker(failures=1, cooldown=60)
+        b.record(False)
+        monkeypatch.setattr(llm_breaker, "_breaker", b)
+        monkeypatch.setattr(llm_service, "_openai_response", lambda lead: pytest.fail("OpenAI called with the breaker open"))
+        result = await llm_service.analyze_lead({"zoho_id": "1", "first_name": "Ann"})
+        assert result["channel"] and b.skipped == 1
+
+
+class TestReadiness:
+    async def test_ready_when_healthy(self, probe):
+        status, body = await get_ready()
+        assert status == 200 and body["ready"] and body["failing"] == []
+        checks = body["checks"]
+        assert checks["llm"]["state"] == "closed"
+        assert checks["storage"]["decisions_db"]["ok"] and checks["storage"]["conversations"]["ok"]
+        assert "lag_ms" in checks["loop"]
+
+    async def test_open_breaker_is_not_ready(self, probe, monkeypatch):
+        b = LLMBreaker(failures=1, cooldown=60)
+        b.record(False)
+        monkeypatch.setattr(llm_breaker, "_breaker", b)
+        status, body = await get_ready()
+        assert status == 503 and body["failing"] == ["llm"]
+        assert body["checks"]["llm"]["state"] == "open" and body["checks"]["llm"]["error_rate"] == 1.0
+
+        monkeypatch.setenv("MOCK_LLM", "true")
+        await probe.refresh()
+        assert (await get_ready())[0] == 200
+
+    async def test_loop_lag_is_not_ready(self, probe, monkeypatch):
+        ctl = admission.AdmissionController(max_loop_lag=0.1)
+        ctl.monitor.lag = 0.5
+        monkeypatch.setattr(admission, "_controller", ctl)
+        status, body = await get_ready()
+        assert status == 503 and "loop" in body["failing"]
+        assert body["checks"]["loop"]["lag_ms"] == 500.0
+
+    async def test_storage_failure_is_not_ready(self, probe, tmp_path):
+        probe.decisions_db = str(tmp_path / "missing" / "decisions.db")
+        status, body = await get_ready()
+        assert status == 503 and body["failing"] == ["storage"]
+        assert "error" in body["checks"]["storage"]["decisions_db"]
+
+    async def test_stale_pack_is_degraded_not_failing(self, probe, monkeypatch):
+        from src.services import packs
+
+        loader = packs.PackLoader(sources={"faq": "https://packs.invalid/faq.json"}, ttl=60)
+        monkeypatch.setattr(loader, "get", lambda name: None)
+        monkeypatch.setattr(packs, "_loader", loader)
+        status, body = await get_ready()
+        assert status == 200
+        assert body["checks"]["packs"] == {"packs": {"faq": {"status": "missing"}}, "degraded": True}
+
+    async def test_registered_queues_are_reported(self, probe):
+        probe.register_queue("ingest", lambda: {"pending": 3})
+        status, body = await get_ready()
+        assert body["checks"]["queues"]["ingest"] == {"pending": 3}
+
+    async def test_cached_snapshot_is_cheap(self, probe):
+        await probe.refresh()
+        probes = probe.probes
+        started = time.perf_counter()
+        for _ in range(10_000):
+            ready, body = await probe.current()
+        per_call = (time.perf_counter() - started) / 10_000
+        assert ready and json.loads(body)["ready"]
+        assert probe.probes == probes  # nothing re-probed
+        assert per_call < 50e-6
+
+    async def test_stuck_probe_task_is_not_ready(self, probe):
+        probe.start()
+        await probe.refresh()
+        taken, ready, body = probe._snapshot
+        probe._snapshot = (taken - 181, ready, body)
+        ready, body = await probe.current()
+        assert not ready and json.loads(body)["failing"] == ["probe_stale"]
+        await probe.stop()
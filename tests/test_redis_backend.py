@@ -0,0 +1,97 @@
+"""
+Unit tests for the Redis backends, run against the in-process RESP server
+"""
+
+import asyncio
+
+import pytest
+import redis.asyncio as aioredis
+
+from resp_server import RespServer
+from src.services.idempotency import StoredResponse
+from src.services.redis_backend import RedisConversationStore, RedisIdempotencyStore
+
+
+def turn(text, ts=None):
+    return {"role": "customer", "text": text, "channel": "WhatsApp", "ts": ts}
+
+
+@pytest.fixture
+async def server():
+    server = await RespServer().start()
+    yield server
+    await server.stop()
+
+
+@pytest.fixture
+async def client(server):
+    client = aioredis.Redis(connection_pool=aioredis.ConnectionPool.from_url(server.url, max_connections=4))
+    yield client
+    await client.aclose()
+
+
+class TestRedisConversationStore:
+    async def test_merge_matches_memory_semantics(self, client):
+        store = RedisConversationStore(client, max_turns=3, prefix="t:")
+        await store.merge("t", {"intent": "interior_design", "history": [turn("hi", "1")]})
+        conv = await store.merge("t", {"last_outcome": "busy", "history": [turn("hi", "1"), turn("price?", "2")]})
+        assert [t["text"] for t in conv.history] == ["hi", "price?"]
+        assert conv.state == {"intent": "interior_design", "last_outcome": "busy"}
+
+        conv = await store.merge("t", new_turns=[turn("a"), turn("b")])
+        assert [t["text"] for t in conv.history] == ["price?", "a", "b"]
+        assert conv.summary() == (4, "b")
+
+        fetched = await store.get("t")
+        assert fetched.history == conv.history
+        assert await store.get("missing") is None
+
+    async def test_merge_is_one_round_trip_without_resent_history(self, client, server):
+        store = RedisConversationStore(client, prefix="t:")
+        await store.merge("t", new_turns=[turn("warm up", "1")])
+        before = server.commands
+        await store.merge("t", {"intent": "general"}, [turn("hello", "2")])
+        # HSET, 2x RPUSH, HINCRBY, 2x LTRIM, LRANGE, HGETALL, 3x EXPIRE inside one MULTI/EXEC
+        assert server.commands - before == 11
+
+    async def test_turn_keys_follow_the_retained_history(self, client):
+        store = RedisConversationStore(client, max_turns=3, prefix="t:")
+        resent = [turn("ok"), turn("ok"), turn("price?", "3"), turn("ok"), turn("thanks", "5")]
+        conv = await store.merge("t", {"history": resent})
+        assert [t["text"] for t in conv.history] == ["price?", "ok", "thanks"]
+        assert await client.llen("t:conv:t:k") == 3
+        conv = await store.merge("t", {"history": resent + [turn("ok")]})
+        assert [t["text"] for t in conv.history] == ["ok", "thanks", "ok"] and conv.seen == 6
+
+    async def test_new_turns_only_in_sent_history(self, client):
+        store = RedisConversationStore(client, prefix="t:")
+        for _ in range(3):
+            conv = await store.merge("t", {"history": [turn("ok")]})
+        assert conv.summary() == (3, "ok")
+        conv = await store.merge("t", {"history": [turn("ok")] * 3})
+        assert conv.seen == 3
+
+    async def test_workers_share_state(self, server):
+        clients = [aioredis.Redis.from_url(server.url) for _ in range(2)]
+        stores = [RedisConversationStore(c, prefix="t:") for c in clients]
+        await asyncio.gather(*[stores[i % 2].merge("shared", new_turns=[turn(str(i))]) for i in range(10)])
+        conv = await stores[0].get("shared")
+        assert conv.seen == 10
+        for c in clients:
+            await c.aclose()
+
+    async def test_keys_expire(self, client, server):
+        store = RedisConversationStore(client, ttl=1, prefix="t:")
+        await store.merge("t", new_turns=[turn("hi")])
+        for key in server.expires:
+            server.expires[key] = 0
+        assert await store.get("t") is None
+
+
+class TestRedisIdempotencyStore:
+    async def test_roundtrip(self, client):
+        store = RedisIdempotencyStore(client, ttl=60, prefix="t:")
+        record = StoredResponse(200, [(b"content-type", b"application/json")], b'{"a":1}', "f")
+        await store.put("k", record)
+        assert await store.get("k") == record
+        assert await store.get("missing") is None
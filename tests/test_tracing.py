@@ -0,0 +1,131 @@
+"""
+Unit tests for request tracing: propagation, head sampling, stage spans and OTLP export
+"""
+
+import json
+
+import httpx
+import pytest
+
+from app.main import app
+from src.services import tracing
+from src.services.metrics import stage
+from src.services.tracing import SpanExporter, Tracer, parse_traceparent, span
+
+UPSTREAM_TRACE = "4bf92f3577b34da6a3ce929d0e0e4736"
+UPSTREAM = f"00-{UPSTREAM_TRACE}-00f067aa0ba902b7-01"
+
+
+@pytest.fixture
+def traced(monkeypatch, tmp_path):
+    tracer = Tracer(SpanExporter(path=str(tmp_path / "traces.jsonl")), sample_rate=1.0)
+    monkeypatch.setattr(tracing, "_tracer", tracer)
+    return tracer
+
+
+def exported_spans(path):
+    spans = []
+    with open(path) as f:
+        for line in f:
+            for resource in json.loads(line)["resourceSpans"]:
+                for scope in resource["scopeSpans"]:
+                    spans.extend(scope["spans"])
+    return spans
+
+
+def attrs(span_json):
+    return {a["key"]: next(iter(a["value"].values())) for a in span_json["attributes"]}
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(UPSTREAM) == (UPSTREAM_TRACE, "00f067aa0ba902b7", True)
+    assert parse_traceparent(UPSTREAM[:-2] + "00")[2] is False
+    assert parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+    assert parse_traceparent("garbage") is None and parse_traceparent(None) is None
+
+
+def test_head_sampling():
+    exporter = SpanExporter(path="unused")
+    never = Tracer(exporter, sample_rate=0.0)
+    assert never.start_trace("GET /") is None
+    root = never.start_trace("GET /", traceparent=UPSTREAM)  # upstream sampled flag wins
+    assert root is not None and root.trace_id == UPSTREAM_TRACE and root.parent_id == "00f067aa0ba902b7"
+    never.end_trace(root)
+    assert Tracer(exporter, sample_rate=1.0).start_trace("GET /", traceparent=UPSTREAM[:-2] + "00") is None
+    assert Tracer(None, sample_rate=1.0).start_trace("GET /") is None  # no exporter, no tracing
+    assert exporter.pending == 1
+
+
+def test_stages_are_spans_only_inside_a_sampled_trace(traced):
+    with stage("mock_plan"):
+        pass
+    assert traced.exporter.pending == 0
+    root = traced.start_trace("job")
+    with stage("mock_plan"):
+        with span("openai.chat_completion", call="x"):
+            pass
+    with pytest.raises(ValueError):
+        with span("broken"):
+            raise ValueError("boom")
+    traced.end_trace(root)
+    spans = {s.name: s for s in traced.exporter._queue}
+    assert set(spans) == {"job", "planner.mock_plan", "openai.chat_completion", "broken"}
+    assert spans["openai.chat_completion"].parent_id == spans["planner.mock_plan"].span_id
+    assert spans["planner.mock_plan"].parent_id == root.span_id
+    assert spans["broken"].error == "ValueError: boom"
+    assert tracing.current_span() is None
+
+
+async def test_next_action_trace_is_exported_with_stage_spans(traced, tmp_path):
+    body = {"lead": {"zoho_id": "T1", "first_name": "Ann", "email": "ann@example.com", "source": "Website"}, "metadata": {"thread_key": "tk-trace"}}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.post("/api/v1/next_action", json=body, headers={"traceparent": UPSTREAM})
+    assert resp.status_code == 200
+    assert resp.headers["x-trace-id"] == UPSTREAM_TRACE
+    assert resp.headers["traceparent"].startswith(f"00-{UPSTREAM_TRACE}-")
+    assert await traced.exporter.flush() > 0
+
+    spans = exported_spans(tmp_path / "traces.jsonl")
+    assert {s["traceId"] for s in spans} == {UPSTREAM_TRACE}
+    root = next(s for s in spans if s["name"] == "POST /api/v1/next_action")
+    assert root["parentSpanId"] == "00f067aa0ba902b7" and root["kind"] == tracing.SPAN_KIND_SERVER
+    root_attrs = attrs(root)
+    assert root_attrs["thread_key"] == "tk-trace" and root_attrs["zoho_id"] == "T1"
+    assert root_attrs["http.status_code"] == "200" and root_attrs["http.route"] == "/api/v1/next_action"
+    children = {s["name"]: s for s in spans if s.get("parentSpanId") == root["spanId"]}
+    for name in ("planner.parse", "planner.conversation", "planner.mock_plan", "planner.record", "planner.serialize"):
+        assert name in children
+        assert int(children[name]["startTimeUnixNano"]) >= int(root["startTimeUnixNano"])
+        assert int(children[name]["endTimeUnixNano"]) <= int(root["endTimeUnixNano"])
+
+
+async def test_unsampled_requests_get_no_trace_headers(monkeypatch, tmp_path):
+    monkeypatch.setattr(tracing, "_tracer", Tracer(SpanExporter(path=str(tmp_path / "t.jsonl")), sample_rate=0.0))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.get("/api/v1/health")
+    assert "x-trace-id" not in resp.headers and tracing.get_tracer().exporter.pending == 0
+
+
+async def test_otlp_exporter_posts_to_collector():
+    received = []
+
+    def collector(request: httpx.Request) -> httpx.Response:
+        received.append((request.url.path, json.loads(request.content)))
+        return httpx.Response(200, json={})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(collector))
+    exporter = SpanExporter(endpoint="http://collector:4318/v1/traces", batch_size=2, interval=0.01, client=client).start()
+    tracer = Tracer(exporter, sample_rate=1.0)
+    for _ in range(3):
+        root = tracer.start_trace("job")
+        with span("step", lead=7, hot=True):
+            pass
+        tracer.end_trace(root)
+    await exporter.close()
+    await client.aclose()
+    assert exporter.exported == 6 and exporter.dropped == 0
+    assert all(path == "/v1/traces" for path, _ in received)
+    resource = received[0][1]["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0] == {"key": "service.name", "value": {"stringValue": "lead-followup-agent"}}
+    step = next(s for s in resource["scopeSpans"][0]["spans"] if s["name"] == "step")
+    assert attrs(step) == {"lead": "7", "hot": True}
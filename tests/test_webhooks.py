@@ -0,0 +1,170 @@
+"""
+Unit tests for the outbound webhook dispatcher, against a local HTTP receiver
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from app.main import app
+from src.services import webhooks
+from src.services.webhooks import WebhookDispatcher, WebhookError, parse_routes
+
+
+class Receiver:
+    """Minimal HTTP/1.1 keep-alive server recording the JSON bodies it is sent."""
+
+    def __init__(self):
+        self.requests = []  # (path, body, connection number)
+        self.statuses = []  # scripted responses, 200 once exhausted
+        self.delay = 0.0
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self._server = None
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.base = f"http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def events(self):
+        return [e for _, body, _ in self.requests for e in body.get("events", [])]
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        conn = self.connections
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode().split("\r\n")
+                path = lines[0].split()[1]
+                headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+                body = await reader.readexactly(int(headers.get("content-length", headers.get("Content-Length", 0))))
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                await asyncio.sleep(self.delay)
+                self.active -= 1
+                status = self.statuses.pop(0) if self.statuses else 200
+                self.requests.append((path, json.loads(body), conn))
+                extra = "Retry-After: 0\r\n" if status == 429 else ""
+                writer.write(f"HTTP/1.1 {status} X\r\nContent-Length: 2\r\n{extra}Connection: keep-alive\r\n\r\n{{}}".encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def dlq(tmp_path):
+    return str(tmp_path / "dlq.db")
+
+
+def dispatcher(url, dlq, **kwargs):
+    kwargs.setdefault("backoff", 0.01)
+    return WebhookDispatcher(default_url=url, dlq_path=dlq, **kwargs).start()
+
+
+def test_parse_routes():
+    assert parse_routes("handoff=http://a/x, lead.analyzed=http://b,bogus") == {"handoff": "http://a/x", "lead.analyzed": "http://b"}
+
+
+async def test_batches_over_pooled_connections(dlq):
+    async with Receiver() as rx:
+        d = dispatcher(rx.base + "/hook", dlq, batch_size=50, batch_wait=0.05, concurrency=4)
+        for i in range(200):
+            assert d.emit("handoff", {"i": i})
+        await wait_for(lambda: len(rx.events) == 200)
+        await d.close()
+    assert sorted(e["data"]["i"] for e in rx.events) == list(range(200))
+    assert all(len(body["events"]) <= 50 for _, body, _ in rx.requests)
+    assert len(rx.requests) <= 8
+    assert rx.connections <= 4  # kept alive and reused, never more than the concurrency limit
+
+
+async def test_per_destination_concurrency_limit(dlq):
+    async with Receiver() as rx:
+        rx.delay = 0.05
+        d = dispatcher(rx.base, dlq, batch_size=1, batch_wait=0, concurrency=2)
+        for i in range(8):
+            d.emit("handoff", {"i": i})
+        await wait_for(lambda: len(rx.requests) == 8)
+        await d.close()
+    assert rx.max_active == 2
+
+
+async def test_routes_by_event_type(dlq):
+    async with Receiver() as rx:
+        d = WebhookDispatcher(routes={"handoff": rx.base + "/handoffs"}, default_url=rx.base + "/all", dlq_path=dlq, batch_wait=0).start()
+        d.emit("handoff", {"n": 1})
+        d.emit("lead.analyzed", {"n": 2})
+        await wait_for(lambda: len(rx.requests) == 2)
+        await d.close()
+    assert {(path, body["events"][0]["type"]) for path, body, _ in rx.requests} == {("/handoffs", "handoff"), ("/all", "lead.analyzed")}
+
+
+async def test_retries_transient_failures(dlq):
+    async with Receiver() as rx:
+        rx.statuses = [503, 429, 200]
+        d = dispatcher(rx.base, dlq, batch_wait=0, max_attempts=5)
+        d.emit("handoff", {"n": 1})
+        await wait_for(lambda: len(rx.requests) == 3)
+        await d.close()
+    assert d.dlq.list() == []
+
+
+async def test_dead_letters_and_replay(dlq):
+    async with Receiver() as rx:
+        rx.statuses = [400] + [500] * 3
+        d = dispatcher(rx.base, dlq, batch_size=1, batch_wait=0, concurrency=1, max_attempts=3)
+        d.emit("handoff", {"n": "rejected"})
+        d.emit("handoff", {"n": "exhausted"})
+        await wait_for(lambda: len(rx.requests) == 4)
+        await wait_for(lambda: len(d.dlq.list()) == 2)
+        letters = d.dlq.list()
+        assert [(l["events"][0]["data"]["n"], l["attempts"]) for l in letters] == [("rejected", 1), ("exhausted", 3)]
+        assert "HTTP 400" in letters[0]["error"]
+
+        assert await d.replay() == 2
+        await wait_for(lambda: len(rx.requests) == 6)
+        await d.close()
+    assert d.dlq.list() == []
+    assert [body["events"][0]["data"]["n"] for _, body, _ in rx.requests[-2:]] == ["rejected", "exhausted"]
+
+
+async def test_unreachable_destination_is_dead_lettered_on_close(dlq):
+    d = dispatcher("http://127.0.0.1:9/unreachable", dlq, max_attempts=2)
+    with pytest.raises(WebhookError):
+        await d.deliver(d.default_url, {"events": []})
+    d.emit("handoff", {"n": 1})
+    await d.close(drain_timeout=2)
+    assert len(d.dlq.list()) == 1
+
+
+async def test_lead_endpoint_pushes_analysis(dlq, monkeypatch):
+    async with Receiver() as rx:
+        d = WebhookDispatcher(routes={"lead.analyzed": rx.base + "/analyzed"}, dlq_path=dlq, batch_wait=0).start()
+        monkeypatch.setattr(webhooks, "_dispatcher", d)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            resp = await client.post("/api/v1/lead", json={"zoho_id": "W1", "email": "ann@example.com", "source": "Website"})
+        assert resp.status_code == 200
+        await wait_for(lambda: len(rx.events) == 1)
+        await d.close()
+    assert rx.events[0]["type"] == "lead.analyzed" and rx.events[0]["data"]["zoho_id"] == "W1"
@@ -0,0 +1,167 @@
+"""
+Unit tests for the Zoho bulk write-back client, against the in-process mock Zoho server
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.main import app
+from src.services import zoho_writeback
+from src.services.zoho_writeback import ZohoAuth, ZohoWriteback, parse_field_map, zoho_field
+from zoho_server import ZohoServer
+
+
+@pytest.fixture
+async def zoho():
+    server = await ZohoServer().start()
+    yield server
+    await server.stop()
+
+
+def client_for(server, **kwargs):
+    auth = ZohoAuth(server.url, client_id="cid", client_secret="secret", refresh_token="refresh")
+    kwargs.setdefault("backoff", 0.01)
+    return ZohoWriteback(api_base=server.url, auth=auth, **kwargs)
+
+
+async def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+def test_field_names():
+    assert zoho_field("decision_channel") == "Decision_Channel"
+    assert zoho_field("ai_notes", parse_field_map("ai_notes=AI_Notes, bogus")) == "AI_Notes"
+
+
+async def test_coalesces_per_lead_and_batches_by_100(zoho):
+    wb = client_for(zoho)
+    for i in range(250):
+        wb.submit(f"Z{i}", {"decision_channel": "Email", "ai_notes": "first", "zoho_id": f"Z{i}"})
+    for i in range(250):
+        wb.submit(f"Z{i}", {"ai_notes": f"last {i}", "email": "", "thread_key": None})
+    assert wb.pending == 250
+    await wb.flush()
+    assert zoho.calls == [100, 100, 50]
+    assert zoho.records["Z7"] == {"id": "Z7", "Decision_Channel": "Email", "Ai_Notes": "last 7"}
+    assert wb.written == 250 and wb.pending == 0
+    assert zoho.refreshes == 1
+    await wb.close()
+
+
+async def test_background_loop_reuses_pooled_connections(zoho):
+    wb = client_for(zoho, flush_interval=0.02, concurrency=2).start()
+    for round_ in range(5):
+        for i in range(30):
+            wb.submit(f"Z{i}", {"decision_priority": round_})
+        await wait_for(lambda: wb.pending == 0)
+    await wait_for(lambda: wb.written == 150)
+    assert zoho.records["Z3"]["Decision_Priority"] == 4
+    assert zoho.connections <= 3  # token + upserts over kept-alive connections
+    await wb.close()
+
+
+async def test_quota_backoff_requeues_under_newer_writes(zoho):
+    zoho.script = [429, 429]
+    zoho.retry_after = "0.1"
+    wb = client_for(zoho, flush_interval=0.01).start()
+    wb.submit("Q1", {"ai_notes": "old", "decision_channel": "Email"})
+    await wait_for(lambda: wb.quota_pauses == 1)
+    wb.submit("Q1", {"ai_notes": "new"})
+    started = time.monotonic()
+    await wait_for(lambda: wb.written == 1)
+    assert time.monotonic() - started >= 0.1  # waited out Retry-After twice
+    assert wb.quota_pauses == 2
+    assert zoho.records["Q1"] == {"id": "Q1", "Ai_Notes": "new", "Decision_Channel": "Email"}
+    assert zoho.calls == [1]
+    await wb.close()
+
+
+async def test_server_errors_are_retried(zoho):
+    zoho.script = [500]
+    wb = client_for(zoho)
+    wb.submit("E1", {"ai_notes": "x"})
+    await wb.flush()
+    assert wb.written == 1 and zoho.rejected_calls == 1
+    await wb.close()
+
+
+async def test_bad_request_is_not_retried(zoho):
+    zoho.script = [400]
+    wb = client_for(zoho)
+    wb.submit("B1", {"ai_notes": "x"})
+    await wb.flush()
+    assert wb.pending == 0 and wb.failed == 1 and len(zoho.calls) == 0
+    assert list(wb.dead_letters) == [{"id": "B1", "Ai_Notes": "x"}]
+    wb.submit("B2", {"ai_notes": "y"})  # later writes are not held up
+    await wb.flush()
+    assert wb.written == 1 and zoho.rejected_calls == 1
+    await wb.close()
+
+
+async def test_unexpected_errors_back_off_exponentially(zoho, monkeypatch):
+    wb = client_for(zoho, backoff=1.0)
+
+    async def broken(batch):
+        raise ValueError("boom")
+
+    monkeypatch.setattr(wb, "_upsert", broken)
+    wb._slots = asyncio.Semaphore(1)
+    wb.submit("U1", {"ai_notes": "x"})
+    for expected in (1.0, 2.0, 4.0):
+        await wb._slots.acquire()
+        started = time.monotonic()
+        await wb._send_batch(wb._take())
+        assert 0.5 * expected <= wb._paused_until - started <= expected + 0.01
+        assert wb.pending == 1  # re-queued, not dropped
+    await wb.close()
+
+
+async def test_expired_token_is_refreshed_once(zoho):
+    wb = client_for(zoho)
+    wb.submit("T1", {"ai_notes": "x"})
+    await wb.flush()
+    zoho.expire_tokens()
+    wb.submit("T2", {"ai_notes": "y"})
+    await wb.flush()
+    assert zoho.refreshes == 2 and wb.written == 2
+    await wb.close()
+
+
+async def test_rejected_records_are_dropped(zoho):
+    zoho.invalid.add("BAD")
+    wb = client_for(zoho)
+    for zoho_id in ("OK1", "BAD", "OK2"):
+        wb.submit(zoho_id, {"ai_notes": "x"})
+    await wb.flush()
+    assert wb.written == 2 and wb.rejected == 1 and wb.pending == 0
+    assert "BAD" not in zoho.records
+    await wb.close()
+
+
+async def test_close_flushes_pending(zoho):
+    wb = client_for(zoho, flush_interval=60).start()
+    wb.submit("C1", {"ai_notes": "x"})
+    await wb.close()
+    assert "C1" in zoho.records
+
+
+async def test_plans_queue_their_store(zoho, monkeypatch):
+    wb = client_for(zoho, flush_interval=60).start()
+    monkeypatch.setattr(zoho_writeback, "_writeback", wb)
+    body = {"zoho_id": "P1", "first_name": "Ann", "email": "ann@example.com", "thread_key": "tk-1"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.post("/api/v1/next_action_flex", json=body)
+    assert resp.status_code == 200
+    assert wb.pending == 1
+    await wb.flush()
+    record = zoho.records["P1"]
+    assert record["Decision_Channel"] == resp.json()["store"]["decision_channel"]
+    assert record["Thread_Key"] == "tk-1" and "Zoho_Id" not in record
+    await wb.close()
@@ -0,0 +1,135 @@
+"""
+In-process mock of the Zoho CRM API for tests and benchmarks
+
+Serves HTTP/1.1 (keep-alive) on localhost with the two endpoints the
+write-back client uses: the OAuth refresh-token grant and the v6 bulk upsert.
+Records are kept in memory; tests can script quota errors (429), expire
+tokens and mark records as invalid.
+
+    server = await ZohoServer().start()
+    writeback = ZohoWriteback(api_base=server.url, auth=ZohoAuth(server.url, "id", "secret", "refresh"))
+"""
+
+import asyncio
+import json
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+UPSERT_PATH = re.compile(r"^/crm/v\d+/(\w+)/upsert$")
+
+
+class ZohoServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.invalid: set = set()  # record ids answered with INVALID_DATA
+        self.script: List[int] = []  # statuses for the next upsert calls (429, 500, ...)
+        self.retry_after: Optional[str] = "0"
+        self.tokens: set = set()
+        self.refreshes = 0
+        self.calls: List[int] = []  # records per accepted upsert call
+        self.rejected_calls = 0
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.0
+        self._handlers: set = set()
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> "ZohoServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._handlers):
+                task.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+
+    def expire_tokens(self) -> None:
+        self.tokens.clear()
+
+    # ---- HTTP ----
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ": " in line:
+                        name, value = line.split(": ", 1)
+                        headers[name.lower()] = value
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                try:
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    status, extra, payload = self._route(method, target, headers, body)
+                finally:
+                    self.active -= 1
+                data = json.dumps(payload).encode()
+                head_out = f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                head_out += "".join(f"{k}: {v}\r\n" for k, v in extra.items())
+                writer.write(head_out.encode() + b"\r\n" + data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            self._handlers.discard(task)
+
+    def _route(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        url = urlsplit(target)
+        if method == "POST" and url.path == "/oauth/v2/token":
+            params = parse_qs(url.query)
+            if params.get("grant_type") != ["refresh_token"] or not params.get("refresh_token"):
+                return 400, {}, {"error": "invalid_code"}
+            self.refreshes += 1
+            token = f"tok-{self.refreshes}"
+            self.tokens.add(token)
+            return 200, {}, {"access_token": token, "expires_in": 3600, "token_type": "Bearer"}
+        match = UPSERT_PATH.match(url.path)
+        if method == "POST" and match:
+            return self._upsert(headers, json.loads(body or b"{}"))
+        return 404, {}, {"code": "INVALID_URL_PATTERN"}
+
+    def _upsert(self, headers: Dict[str, str], body: Dict[str, Any]):
+        token = headers.get("authorization", "").removeprefix("Zoho-oauthtoken ")
+        if token not in self.tokens:
+            self.rejected_calls += 1
+            return 401, {}, {"code": "INVALID_TOKEN", "message": "invalid oauth token", "status": "error"}
+        if self.script:
+            status = self.script.pop(0)
+            self.rejected_calls += 1
+            extra = {"Retry-After": self.retry_after} if status == 429 and self.retry_after is not None else {}
+            code = "TOO_MANY_REQUESTS" if status == 429 else "INTERNAL_ERROR"
+            return status, extra, {"code": code, "message": "scripted failure", "status": "error"}
+        records = body.get("data") or []
+        if len(records) > 100:
+            self.rejected_calls += 1
+            return 400, {}, {"code": "LIMIT_EXCEEDED", "message": "more than 100 records", "status": "error"}
+        self.calls.append(len(records))
+        results = []
+        for record in records:
+            record_id = record.get("id")
+            if record_id in self.invalid:
+                results.append({"code": "INVALID_DATA", "details": {"id": record_id}, "message": "invalid data", "status": "error"})
+                continue
+            self.records.setdefault(record_id, {}).update(record)
+            results.append({"code": "SUCCESS", "action": "update", "details": {"id": record_id}, "message": "record updated", "status": "success"})
+        return 200, {}, {"data": results}